@@ -14,6 +14,7 @@ import (
 	"path/filepath"
 	"reflect"
 	"strings"
+	"sync"
 	"syscall"
 	"time"
 
@@ -408,8 +409,67 @@ func extractMediaInfo(msg *waProto.Message) (mediaType string, filename string,
 	return "", "", "", nil, nil, nil, 0
 }
 
+// MessageEvent is pushed to /api/events subscribers after a message is stored
+type MessageEvent struct {
+	ID        string    `json:"id"`
+	ChatJID   string    `json:"chat_jid"`
+	ChatName  string    `json:"chat_name"`
+	Sender    string    `json:"sender"`
+	Content   string    `json:"content"`
+	Timestamp time.Time `json:"timestamp"`
+	IsFromMe  bool      `json:"is_from_me"`
+	MediaType string    `json:"media_type,omitempty"`
+	Filename  string    `json:"filename,omitempty"`
+}
+
+// EventHub fans stored messages out to the connected event stream subscribers
+type EventHub struct {
+	mu          sync.Mutex
+	subscribers map[chan MessageEvent]struct{}
+}
+
+// NewEventHub creates an empty event hub
+func NewEventHub() *EventHub {
+	return &EventHub{subscribers: make(map[chan MessageEvent]struct{})}
+}
+
+// Subscribe registers a new subscriber and returns its event channel
+func (hub *EventHub) Subscribe() chan MessageEvent {
+	ch := make(chan MessageEvent, 256)
+	hub.mu.Lock()
+	hub.subscribers[ch] = struct{}{}
+	hub.mu.Unlock()
+	return ch
+}
+
+// Unsubscribe removes a subscriber and closes its channel (safe to call twice)
+func (hub *EventHub) Unsubscribe(ch chan MessageEvent) {
+	hub.mu.Lock()
+	defer hub.mu.Unlock()
+	if _, ok := hub.subscribers[ch]; ok {
+		delete(hub.subscribers, ch)
+		close(ch)
+	}
+}
+
+// Publish delivers an event to every subscriber without blocking message handling.
+// A subscriber that can't keep up is disconnected rather than silently skipped,
+// so it knows to catch up from the database.
+func (hub *EventHub) Publish(evt MessageEvent) {
+	hub.mu.Lock()
+	defer hub.mu.Unlock()
+	for ch := range hub.subscribers {
+		select {
+		case ch <- evt:
+		default:
+			delete(hub.subscribers, ch)
+			close(ch)
+		}
+	}
+}
+
 // Handle regular incoming messages with media support
-func handleMessage(client *whatsmeow.Client, messageStore *MessageStore, msg *events.Message, logger waLog.Logger) {
+func handleMessage(client *whatsmeow.Client, messageStore *MessageStore, eventHub *EventHub, msg *events.Message, logger waLog.Logger) {
 	// Save message to database
 	chatJID := msg.Info.Chat.String()
 	sender := msg.Info.Sender.User
@@ -467,6 +527,19 @@ func handleMessage(client *whatsmeow.Client, messageStore *MessageStore, msg *ev
 		} else if content != "" {
 			fmt.Printf("[%s] %s %s: %s\n", timestamp, direction, sender, content)
 		}
+
+		// Notify event stream subscribers now that the message is readable from the database
+		eventHub.Publish(MessageEvent{
+			ID:        msg.Info.ID,
+			ChatJID:   chatJID,
+			ChatName:  name,
+			Sender:    sender,
+			Content:   content,
+			Timestamp: msg.Info.Timestamp,
+			IsFromMe:  msg.Info.IsFromMe,
+			MediaType: mediaType,
+			Filename:  filename,
+		})
 	}
 }
 
@@ -676,7 +749,7 @@ func extractDirectPathFromURL(url string) string {
 }
 
 // Start a REST API server to expose the WhatsApp client functionality
-func startRESTServer(client *whatsmeow.Client, messageStore *MessageStore, port int) {
+func startRESTServer(client *whatsmeow.Client, messageStore *MessageStore, eventHub *EventHub, port int) {
 	// Handler for sending messages
 	http.HandleFunc("/api/send", func(w http.ResponseWriter, r *http.Request) {
 		// Only allow POST requests
@@ -774,6 +847,56 @@ func startRESTServer(client *whatsmeow.Client, messageStore *MessageStore, port
 		})
 	})
 
+	// Handler for streaming newly stored messages as server-sent events
+	http.HandleFunc("/api/events", func(w http.ResponseWriter, r *http.Request) {
+		// Only allow GET requests
+		if r.Method != http.MethodGet {
+			http.Error(w, "Method not allowed", http.StatusMethodNotAllowed)
+			return
+		}
+
+		flusher, ok := w.(http.Flusher)
+		if !ok {
+			http.Error(w, "Streaming unsupported", http.StatusInternalServerError)
+			return
+		}
+
+		stream := eventHub.Subscribe()
+		defer eventHub.Unsubscribe(stream)
+
+		// Set response headers
+		w.Header().Set("Content-Type", "text/event-stream")
+		w.Header().Set("Cache-Control", "no-cache")
+		w.Header().Set("Connection", "keep-alive")
+		fmt.Fprint(w, ": connected\n\n")
+		flusher.Flush()
+
+		// Comments keep idle connections alive and let clients detect a dead bridge
+		heartbeat := time.NewTicker(15 * time.Second)
+		defer heartbeat.Stop()
+
+		for {
+			select {
+			case <-r.Context().Done():
+				return
+			case evt, ok := <-stream:
+				if !ok {
+					// Dropped for falling behind
+					return
+				}
+				data, err := json.Marshal(evt)
+				if err != nil {
+					continue
+				}
+				fmt.Fprintf(w, "event: message\nid: %s\ndata: %s\n\n", evt.ID, data)
+				flusher.Flush()
+			case <-heartbeat.C:
+				fmt.Fprint(w, ": ping\n\n")
+				flusher.Flush()
+			}
+		}
+	})
+
 	// Start the server
 	serverAddr := fmt.Sprintf(":%d", port)
 	fmt.Printf("Starting REST API server on %s...\n", serverAddr)
@@ -834,12 +957,15 @@ func main() {
 	}
 	defer messageStore.Close()
 
+	// Stored messages are pushed to /api/events subscribers
+	eventHub := NewEventHub()
+
 	// Setup event handling for messages and history sync
 	client.AddEventHandler(func(evt interface{}) {
 		switch v := evt.(type) {
 		case *events.Message:
 			// Process regular messages
-			handleMessage(client, messageStore, v, logger)
+			handleMessage(client, messageStore, eventHub, v, logger)
 
 		case *events.HistorySync:
 			// Process history sync events
@@ -906,7 +1032,7 @@ func main() {
 	fmt.Println("\n✓ Connected to WhatsApp! Type 'help' for commands.")
 
 	// Start REST API server
-	startRESTServer(client, messageStore, 8080)
+	startRESTServer(client, messageStore, eventHub, 8080)
 
 	// Create a channel to keep the main goroutine alive
 	exitChan := make(chan os.Signal, 1)
@@ -0,0 +1,124 @@
+"""Compare bare ``requests.post`` calls with the pooled bridge client.
+
+Sends messages to a local FakeBridge both ways, sequentially and from a few
+threads at once, and reports throughput and latency percentiles. The bare
+calls open a new TCP connection per message; BridgeClient reuses them.
+
+It then checks the failure handling: downloads that get 503s are retried
+until they succeed, and a send to a bridge that never answers gives up after
+the timeout instead of hanging.
+
+Usage:
+    python benchmarks/bench_bridge.py
+    python benchmarks/bench_bridge.py --requests 5000 --threads 8 --latency 0.002
+"""
+import argparse
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import bridge  # noqa: E402
+from fake_bridge import FakeBridge  # noqa: E402
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(name: str, send: Callable[[int], None], count: int, threads: int) -> dict:
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def one(i: int) -> None:
+        started = time.perf_counter()
+        send(i)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    if threads == 1:
+        for i in range(count):
+            one(i)
+    else:
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(one, range(count)))
+    total = time.perf_counter() - started
+    return {
+        "name": name,
+        "per_second": count / total,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark bridge HTTP clients against a fake bridge")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the fake bridge waits per request")
+    args = parser.parse_args()
+
+    fake = FakeBridge().start()
+    fake.latency = args.latency
+    url = f"{fake.base_url}/send"
+    client = bridge.BridgeClient()
+
+    def bare(i: int) -> None:
+        requests.post(url, json={"recipient": "123@s.whatsapp.net", "message": f"m{i}"}).raise_for_status()
+
+    def pooled(i: int) -> None:
+        client.post(url, {"recipient": "123@s.whatsapp.net", "message": f"m{i}"}, timeout=bridge.SEND_TIMEOUT).raise_for_status()
+
+    try:
+        results = []
+        for threads in sorted({1, args.threads}):
+            results.append(run(f"requests.post x{threads}", bare, args.requests, threads))
+            results.append(run(f"BridgeClient x{threads}", pooled, args.requests, threads))
+
+        print(f"{args.requests} sends per run, fake bridge latency {args.latency * 1000:.1f}ms\n")
+        print(f"{'client':<22} {'sends/s':>9} {'p50':>9} {'p99':>9}")
+        for result in results:
+            print(f"{result['name']:<22} {result['per_second']:>9,.0f} {result['p50_ms']:>7.2f}ms {result['p99_ms']:>7.2f}ms")
+
+        fake.download_failures = 2
+        fake.latency = 0.0
+        response = client.post(
+            f"{fake.base_url}/download", {"message_id": "m1", "chat_jid": "123@s.whatsapp.net"},
+            timeout=bridge.DOWNLOAD_TIMEOUT, idempotent=True
+        )
+        print(f"\ndownload after 2 injected 503s: HTTP {response.status_code}")
+
+        # A listener that accepts connections but never answers, like a hung bridge
+        hung = socket.socket()
+        hung.bind(("127.0.0.1", 0))
+        hung.listen()
+        started = time.perf_counter()
+        try:
+            client.post(f"http://127.0.0.1:{hung.getsockname()[1]}/api/send", {"recipient": "x"}, timeout=1.0)
+        except requests.Timeout:
+            print(f"send to a hung bridge timed out after {time.perf_counter() - started:.1f}s")
+        finally:
+            hung.close()
+
+        print("\nclient stats:")
+        for endpoint, stats in client.stats().items():
+            print(f"  {endpoint}: {stats['count']} calls, p50 {stats['p50_ms']}ms, p99 {stats['p99_ms']}ms, "
+                  f"retries {stats.get('retries', 0)}, errors {stats.get('errors', 0) + stats.get('http_errors', 0)}")
+    finally:
+        client.close()
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Measure the bot's reply throughput against a fake bridge and a fake OpenAI.
+
+Injects a few messages into each of a number of chats and hands them to the
+bot's ``handle_message`` as the event listener would, then waits until every
+reply has gone out through the fake bridge. This is repeated for several
+worker counts. Every completion takes ``--latency`` seconds, so throughput
+should grow with the number of workers until there are more workers than
+chats.
+
+The messages of a chat arrive in a burst, so with ``--debounce`` above zero
+each chat gets one completion and one reply covering all of them. Checks on
+the way that every message was answered once, and in order.
+
+With ``--cold-tone`` the chats start without tone profiles. They are then
+generated by the bot's background refresher, so the first replies use the
+default tone instead of waiting for an extra completion. ``--sync-tone``
+generates them inline the way the bot used to, for comparison.
+
+Usage:
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --chats 50 --per-chat 4 --latency 0.3 --workers 1 4 16
+    python benchmarks/bench_pipeline.py --debounce 0.5   # one completion per chat
+"""
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fake_bridge import FakeBridge  # noqa: E402
+from fake_openai import FakeOpenAI  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the bot's reply pipeline")
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--per-chat", type=int, default=3, help="Messages injected into each chat")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds each completion takes")
+    parser.add_argument("--delay", type=float, default=0.1, help="The bot's RESPONSE_DELAY")
+    parser.add_argument("--debounce", type=float, default=0.0,
+                        help="The bot's DEBOUNCE_WINDOW (0 replies to every message separately)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    tone = parser.add_mutually_exclusive_group()
+    tone.add_argument("--cold-tone", action="store_true", help="Start without tone profiles, refresh in the background")
+    tone.add_argument("--sync-tone", action="store_true", help="Start without tone profiles, generate them inline")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-pipeline-")
+    fake_openai = FakeOpenAI(latency=args.latency).start()
+    fake_bridge = FakeBridge(os.path.join(workdir, "messages.db")).start()
+    os.environ["OPENAI_BASE_URL"] = fake_openai.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    # The bot keeps its state files relative to the working directory
+    os.chdir(workdir)
+
+    import whatsapp
+    import whatsapp_ai_double as bot
+    from events import parse_message
+    from functools import partial
+    from scheduler import BackgroundRefresher, Debouncer, ReplyScheduler
+    from seen_store import SeenStore
+
+    whatsapp.MESSAGES_DB_PATH = fake_bridge.db_path
+    whatsapp.WHATSAPP_API_BASE_URL = fake_bridge.base_url
+    bot.RESPONSE_DELAY = args.delay
+    seen = SeenStore(os.path.join(workdir, "seen.db"), legacy_path=None)
+
+    results = []
+    try:
+        for run, workers in enumerate(args.workers):
+            jids = [f"9199{run:02d}{i:06d}@s.whatsapp.net" for i in range(args.chats)]
+            for jid in jids:
+                # Measure replies, not history bootstrapping
+                if args.cold_tone or args.sync_tone:
+                    # Something of yours for the tone analysis to read
+                    for n in range(5):
+                        fake_bridge.inject(jid, f"my earlier message {n}", is_from_me=True)
+                else:
+                    bot.tone_map.set(jid, {"prompt": "Reply briefly.", "count": 0})
+                bot.conversation_memory.set(jid, [])
+            events = [
+                fake_bridge.inject(jid, f"message {n}")
+                for n in range(args.per_chat) for jid in jids
+            ]
+            scheduler = ReplyScheduler(workers)
+            refresher = None
+            if args.cold_tone:
+                refresher = BackgroundRefresher(
+                    bot.generate_tone_prompt,
+                    lambda jid, prompt, scheduler=scheduler: scheduler.submit(
+                        jid, bot.store_tone, jid, prompt, refresher),
+                    bot.TONE_WORKERS,
+                    release_on_result=False
+                )
+            debouncer = Debouncer(scheduler, partial(bot.reply_to_burst, scheduler, refresher), args.debounce)
+            fake_openai.max_in_flight = 0
+            completions_before = len(fake_openai.requests)
+            sent_before = len(fake_bridge.sent)
+            started = time.perf_counter()
+            # The bot prints every message and reply
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                for event in events:
+                    bot.handle_message(parse_message(event), event["chat_jid"], seen, debouncer)
+                scheduler.wait_idle()
+                if refresher is not None:
+                    # Replies request profiles as they go; store the last ones before stopping
+                    refresher.close()
+                scheduler.close()
+            elapsed = time.perf_counter() - started
+
+            sent = fake_bridge.sent[sent_before:]
+            # Each reply quotes the message(s) it answers, one per line
+            in_order = all(
+                [line for p in sent if p["recipient"] == jid for line in p["message"][len("Reply to: "):].split("\n")]
+                == [f"message {n}" for n in range(args.per_chat)]
+                for jid in jids
+            )
+            completions = len(fake_openai.requests) - completions_before
+            results.append((workers, len(events), completions, elapsed, fake_openai.max_in_flight, in_order))
+    finally:
+        bot.conversation_memory.close()
+        bot.tone_map.close()
+        seen.close()
+        fake_bridge.stop()
+        fake_openai.stop()
+
+    print(f"{args.chats} chats x {args.per_chat} messages, completion latency {args.latency * 1000:.0f}ms, "
+          f"response delay {args.delay * 1000:.0f}ms, debounce window {args.debounce * 1000:.0f}ms\n")
+    print(f"{'workers':>7} {'messages':>9} {'LLM calls':>10} {'seconds':>8} {'answered/s':>11} {'speedup':>8} "
+          f"{'parallel':>9} {'ordered':>8}")
+    baseline = results[0][1] / results[0][3] if results else 0
+    for workers, messages, completions, elapsed, parallel, in_order in results:
+        rate = messages / elapsed
+        print(f"{workers:>7} {messages:>9} {completions:>10} {elapsed:>8.2f} {rate:>11.1f} {rate / baseline:>7.1f}x "
+              f"{parallel:>9} {'yes' if in_order else 'NO':>8}")
+
+
+if __name__ == "__main__":
+    main()
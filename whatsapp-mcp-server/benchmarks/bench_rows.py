@@ -0,0 +1,153 @@
+"""Compare the cost of turning message rows into Python objects.
+
+Measures construction time and retained memory per row for:
+
+- ``dataclass``: the previous representation, a regular dataclass with the
+  timestamp parsed eagerly for every row
+- ``Message.from_row``: the slotted record with lazy timestamp parsing
+- ``MessageBatch``: the columnar form
+
+Usage:
+    python benchmarks/bench_rows.py                  # 200k synthetic rows
+    python benchmarks/bench_rows.py --rows 1000000
+    python benchmarks/bench_rows.py --db ../whatsapp-bridge/store/messages.db
+"""
+import argparse
+import gc
+import os
+import sqlite3
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, List, Optional, Sequence
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from whatsapp import Message, MessageBatch  # noqa: E402
+
+
+@dataclass
+class DataclassMessage:
+    timestamp: datetime
+    sender: str
+    content: str
+    is_from_me: bool
+    chat_jid: str
+    id: str
+    chat_name: Optional[str] = None
+    media_type: Optional[str] = None
+
+
+def build_dataclasses(rows: Sequence[Sequence[Any]]) -> List[DataclassMessage]:
+    return [
+        DataclassMessage(
+            timestamp=datetime.fromisoformat(row[0]),
+            sender=row[1],
+            chat_name=row[2],
+            content=row[3],
+            is_from_me=row[4],
+            chat_jid=row[5],
+            id=row[6],
+            media_type=row[7]
+        )
+        for row in rows
+    ]
+
+
+def build_records(rows: Sequence[Sequence[Any]]) -> List[Message]:
+    return [Message.from_row(row) for row in rows]
+
+
+def build_batch(rows: Sequence[Sequence[Any]]) -> MessageBatch:
+    return MessageBatch.from_rows(rows)
+
+
+def synthetic_rows(count: int) -> List[tuple]:
+    start = datetime(2025, 1, 1, tzinfo=timezone(timedelta(hours=5, minutes=30)))
+    return [
+        (
+            (start + timedelta(seconds=i * 7)).isoformat(sep=" "),
+            f"9180{i % 5000:06d}",
+            f"Chat {i % 300}",
+            f"message number {i} with a little bit of text",
+            i % 3 == 0,
+            f"9180{i % 300:06d}@s.whatsapp.net",
+            f"3EB0{i:016X}",
+            "" if i % 20 else "image",
+        )
+        for i in range(count)
+    ]
+
+
+def database_rows(db_path: str, count: int) -> List[tuple]:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return conn.execute("""
+            SELECT messages.timestamp, messages.sender, chats.name, messages.content, messages.is_from_me,
+                chats.jid, messages.id, messages.media_type
+            FROM messages
+            JOIN chats ON messages.chat_jid = chats.jid
+            ORDER BY messages.timestamp DESC
+            LIMIT ?
+        """, (count,)).fetchall()
+    finally:
+        conn.close()
+
+
+def measure(name: str, build: Callable[[Sequence[Sequence[Any]]], Any], rows: Sequence[Sequence[Any]], repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = build(rows)
+        timings.append(time.perf_counter() - started)
+        del result
+
+    gc.collect()
+    tracemalloc.start()
+    result = build(rows)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    best = min(timings)
+    return {
+        "name": name,
+        "seconds": best,
+        "rows_per_second": len(rows) / best if best else float("inf"),
+        "bytes_per_row": retained / len(rows),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark message row representations")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--db", help="Read rows from this messages.db instead of generating them")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = database_rows(args.db, args.rows) if args.db else synthetic_rows(args.rows)
+    if not rows:
+        print("No rows to benchmark")
+        return
+    print(f"{len(rows)} rows, best of {args.repeat}\n")
+
+    results = [
+        measure("dataclass (eager timestamps)", build_dataclasses, rows, args.repeat),
+        measure("Message.from_row (lazy)", build_records, rows, args.repeat),
+        measure("MessageBatch (columnar)", build_batch, rows, args.repeat),
+    ]
+    baseline = results[0]
+    print(f"{'representation':<30} {'time':>9} {'rows/s':>12} {'bytes/row':>10} {'speedup':>8} {'memory':>7}")
+    for result in results:
+        print(
+            f"{result['name']:<30} {result['seconds'] * 1000:>7.1f}ms {result['rows_per_second']:>12,.0f} "
+            f"{result['bytes_per_row']:>10.0f} {baseline['seconds'] / result['seconds']:>7.1f}x "
+            f"{result['bytes_per_row'] / baseline['bytes_per_row']:>6.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
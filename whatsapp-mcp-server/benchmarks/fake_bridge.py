@@ -0,0 +1,311 @@
+"""A stand-in for the Go bridge, for exercising the bot and tools locally.
+
+Serves the bridge's REST API (``/api/send``, ``/api/download`` and the
+``/api/events`` stream) on localhost and writes injected messages into a
+messages.db with the bridge's schema, so everything that reads the database
+or talks to the API works against it unchanged.
+
+Usage:
+    python benchmarks/fake_bridge.py --db /tmp/messages.db --chat 123@s.whatsapp.net --every 10
+
+injects a message into the chat every 10 seconds and reports, on exit, how
+long each one took to get a reply through ``/api/send``. Point the bot at the
+same database (``whatsapp.MESSAGES_DB_PATH``) to measure receive-to-reply
+latency without a phone.
+"""
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import statistics
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# Same tables the bridge creates in NewMessageStore (main.go)
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS chats (
+        jid TEXT PRIMARY KEY,
+        name TEXT,
+        last_message_time TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS messages (
+        id TEXT,
+        chat_jid TEXT,
+        sender TEXT,
+        content TEXT,
+        timestamp TIMESTAMP,
+        is_from_me BOOLEAN,
+        media_type TEXT,
+        filename TEXT,
+        url TEXT,
+        media_key BLOB,
+        file_sha256 BLOB,
+        file_enc_sha256 BLOB,
+        file_length INTEGER,
+        PRIMARY KEY (id, chat_jid),
+        FOREIGN KEY (chat_jid) REFERENCES chats(jid)
+    );
+"""
+
+HEARTBEAT_INTERVAL = 15
+
+
+class FakeBridge:
+    """In-process fake of the bridge's REST server and message store."""
+
+    def __init__(self, db_path: Optional[str] = None, host: str = "127.0.0.1", port: int = 0):
+        self.db_path = db_path
+        self.sent: List[Dict[str, Any]] = []
+        self.downloads: List[Dict[str, Any]] = []
+        # chat_jid -> monotonic time of the last injected inbound message
+        self.injected_at: Dict[str, float] = {}
+        self.reply_latencies: List[float] = []
+        # Seconds each POST waits before answering, to stand in for WhatsApp round trips
+        self.latency = 0.0
+        # How many upcoming downloads answer 503, to exercise client retries
+        self.download_failures = 0
+        self._subscribers: List["queue.Queue[Optional[bytes]]"] = []
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        if db_path:
+            conn = sqlite3.connect(db_path)
+            try:
+                conn.executescript(SCHEMA)
+            finally:
+                conn.close()
+        self.server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+    def start(self) -> "FakeBridge":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-bridge", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.disconnect_subscribers()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def inject(
+        self,
+        chat_jid: str,
+        content: str,
+        sender: Optional[str] = None,
+        is_from_me: bool = False,
+        chat_name: Optional[str] = None,
+        timestamp: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """Store a message the way handleMessage does, then publish its event."""
+        timestamp = timestamp or datetime.now(timezone.utc).astimezone()
+        sender = sender or chat_jid.split("@")[0]
+        event = {
+            "id": uuid.uuid4().hex[:20].upper(),
+            "chat_jid": chat_jid,
+            "chat_name": chat_name or sender,
+            "sender": sender,
+            "content": content,
+            "timestamp": timestamp.isoformat(),
+            "is_from_me": is_from_me,
+        }
+        if self.db_path:
+            with self._db_lock:
+                conn = sqlite3.connect(self.db_path, timeout=30)
+                try:
+                    with conn:
+                        stored_time = timestamp.isoformat(sep=" ")
+                        conn.execute(
+                            "INSERT OR REPLACE INTO chats (jid, name, last_message_time) VALUES (?, ?, ?)",
+                            (chat_jid, event["chat_name"], stored_time),
+                        )
+                        conn.execute(
+                            """INSERT OR REPLACE INTO messages
+                            (id, chat_jid, sender, content, timestamp, is_from_me, media_type, filename, url,
+                             media_key, file_sha256, file_enc_sha256, file_length)
+                            VALUES (?, ?, ?, ?, ?, ?, '', '', '', NULL, NULL, NULL, 0)""",
+                            (event["id"], chat_jid, sender, content, stored_time, is_from_me),
+                        )
+                finally:
+                    conn.close()
+        if not is_from_me:
+            with self._lock:
+                self.injected_at[chat_jid] = time.monotonic()
+        self.publish(event)
+        return event
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        frame = f"event: message\nid: {event['id']}\ndata: {json.dumps(event)}\n\n".encode()
+        with self._lock:
+            for subscriber in self._subscribers:
+                subscriber.put(frame)
+
+    def disconnect_subscribers(self) -> None:
+        """Close every open event stream, as a bridge restart would."""
+        with self._lock:
+            for subscriber in self._subscribers:
+                subscriber.put(None)
+            self._subscribers = []
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def _subscribe(self) -> "queue.Queue[Optional[bytes]]":
+        subscriber: "queue.Queue[Optional[bytes]]" = queue.Queue()
+        with self._lock:
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def _unsubscribe(self, subscriber: "queue.Queue[Optional[bytes]]") -> None:
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def _record_send(self, payload: Dict[str, Any]) -> None:
+        with self._lock:
+            self.sent.append(payload)
+            injected = self.injected_at.pop(payload.get("recipient", ""), None)
+            if injected is not None:
+                self.reply_latencies.append(time.monotonic() - injected)
+
+
+def _make_handler(bridge: FakeBridge):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; without this, Nagle plus
+        # delayed ACKs stall every response on a kept-alive connection by ~40ms
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _json(self, status: int, body: Dict[str, Any]) -> None:
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _read_json(self) -> Optional[Dict[str, Any]]:
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                return json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                return None
+
+        def do_POST(self):
+            payload = self._read_json()
+            if bridge.latency:
+                time.sleep(bridge.latency)
+            if payload is None:
+                self._json(400, {"success": False, "message": "Invalid request format"})
+            elif self.path == "/api/send":
+                if not payload.get("recipient"):
+                    self._json(400, {"success": False, "message": "Recipient is required"})
+                    return
+                bridge._record_send(payload)
+                self._json(200, {"success": True, "message": f"Message sent to {payload['recipient']}"})
+            elif self.path == "/api/download":
+                with bridge._lock:
+                    failing = bridge.download_failures > 0
+                    if failing:
+                        bridge.download_failures -= 1
+                    else:
+                        bridge.downloads.append(payload)
+                if failing:
+                    self._json(503, {"success": False, "message": "Bridge busy"})
+                    return
+                path = os.path.join("/tmp", f"{payload.get('message_id', 'media')}.bin")
+                self._json(200, {"success": True, "message": "Successfully downloaded fake media",
+                                 "filename": os.path.basename(path), "path": path})
+            else:
+                self._json(404, {"success": False, "message": "Not found"})
+
+        def _chunk(self, data: bytes) -> None:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def do_GET(self):
+            if self.path != "/api/events":
+                self._json(404, {"success": False, "message": "Not found"})
+                return
+            subscriber = bridge._subscribe()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            # Flushed writes go out as chunks, like Go's net/http
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self.close_connection = True
+            try:
+                self._chunk(b": connected\n\n")
+                while True:
+                    try:
+                        frame = subscriber.get(timeout=HEARTBEAT_INTERVAL)
+                    except queue.Empty:
+                        frame = b": ping\n\n"
+                    if frame is None:
+                        break
+                    self._chunk(frame)
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                bridge._unsubscribe(subscriber)
+
+    return Handler
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a fake WhatsApp bridge")
+    parser.add_argument("--db", help="messages.db to write injected messages into (created if missing)")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--chat", action="append", default=[], help="Chat JID to inject messages into (repeatable)")
+    parser.add_argument("--every", type=float, default=0, help="Seconds between injected messages (0 = never)")
+    args = parser.parse_args()
+
+    bridge = FakeBridge(args.db, port=args.port).start()
+    print(f"Fake bridge listening on {bridge.base_url}. Press Ctrl+C to stop.")
+    count = 0
+    try:
+        while True:
+            if args.every and args.chat:
+                chat_jid = args.chat[count % len(args.chat)]
+                count += 1
+                bridge.inject(chat_jid, f"test message {count}")
+                print(f"← {chat_jid}: test message {count} ({bridge.subscriber_count()} subscribers)")
+                time.sleep(args.every)
+            else:
+                time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bridge.stop()
+
+    latencies = bridge.reply_latencies
+    print(f"\n{len(bridge.sent)} messages sent through /api/send")
+    if latencies:
+        print(f"Receive-to-reply latency over {len(latencies)} replies: "
+              f"p50 {statistics.median(latencies):.2f}s, p99 {_percentile(latencies, 99):.2f}s, "
+              f"max {max(latencies):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""A stand-in for the OpenAI chat completions API, for exercising the bot locally.
+
+Serves ``POST /v1/chat/completions`` on localhost. Each request waits
+``latency`` seconds, like a real completion, then answers with
+``Reply to: <last user message>``, so callers can check which message a reply
+belongs to. Every request is recorded, and token usage is estimated at four
+characters per token.
+
+Point an ``OpenAI`` client at it with ``base_url=fake.base_url`` or with the
+``OPENAI_BASE_URL`` environment variable.
+
+Usage:
+    python benchmarks/fake_openai.py --port 8081 --latency 0.5
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeOpenAI:
+    """In-process fake of the chat completions endpoint."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.latency = latency
+        self.requests: List[Dict[str, Any]] = []
+        # Completions being generated right now, and the most at once
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAI":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def complete(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self.requests.append(request)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        messages = request.get("messages") or []
+        last_user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        content = f"Reply to: {last_user}"
+        prompt_tokens = sum(estimate_tokens(m.get("content") or "") for m in messages)
+        completion_tokens = estimate_tokens(content)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+
+def _make_handler(fake: FakeOpenAI):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # See fake_bridge.py: avoids ~40ms stalls on kept-alive connections
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _json(self, status: int, body: Dict[str, Any]) -> None:
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                request = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._json(400, {"error": {"message": "Invalid JSON", "type": "invalid_request_error"}})
+                return
+            if self.path.rstrip("/") != "/v1/chat/completions":
+                self._json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+                return
+            self._json(200, fake.complete(request))
+
+    return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI chat completions endpoint")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds each completion takes")
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(port=args.port, latency=args.latency).start()
+    print(f"Fake OpenAI listening on {fake.base_url} (set OPENAI_BASE_URL to it). Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.stop()
+    print(f"\n{len(fake.requests)} completions served, at most {fake.max_in_flight} at once")
+
+
+if __name__ == "__main__":
+    main()
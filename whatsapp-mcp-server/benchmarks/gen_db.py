@@ -0,0 +1,183 @@
+"""Generate a synthetic messages.db for benchmarks.
+
+Uses the bridge's exact schema (see fake_bridge.SCHEMA) and stores values the
+way the bridge does, with timestamps written as ``YYYY-MM-DD HH:MM:SS+HH:MM``
+strings and senders as bare phone numbers. The data is shaped like a real phone:
+
+- chat sizes follow a Zipf distribution: a few chats hold most messages and
+  there is a long tail of quiet ones
+- about 15% of chats are groups, with 3-60 members each
+- messages come in conversational bursts rather than uniformly at random
+- about a third are your own, and about 5% are media with a filename
+
+Generation is seeded, so the same arguments always give the same database.
+
+Usage:
+    python benchmarks/gen_db.py --messages 10k --out /tmp/bench-10k.db
+    python benchmarks/gen_db.py --messages 1M --out /tmp/bench-1m.db --migrate
+    python benchmarks/gen_db.py --messages 10M --chats 5000 --out /tmp/bench-10m.db
+"""
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fake_bridge import SCHEMA  # noqa: E402
+
+MY_NUMBER = "919800000000"
+GROUP_FRACTION = 0.15
+FROM_ME_FRACTION = 0.35
+MEDIA_FRACTION = 0.05
+UNNAMED_FRACTION = 0.1
+# Chance that the next message continues the current conversation
+BURST_STICKINESS = 0.8
+ZIPF_EXPONENT = 1.1
+INSERT_BATCH_SIZE = 50_000
+START = datetime(2023, 1, 1, tzinfo=timezone(timedelta(hours=5, minutes=30)))
+SPAN = timedelta(days=730)
+
+WORDS = (
+    "ok yes no haha lol sure thanks see you tomorrow today tonight call me later where are you "
+    "coming reached home office lunch dinner match cricket movie plan weekend trip photo send "
+    "link meeting done good morning night bro da anna super nice what when why how"
+).split()
+MEDIA = [("image", "jpg"), ("video", "mp4"), ("audio", "ogg"), ("document", "pdf")]
+
+
+def parse_count(value: str) -> int:
+    """Parse counts like ``10k``, ``1M`` or ``10_000_000``."""
+    value = value.strip().lower().replace("_", "")
+    for suffix, factor in (("k", 1_000), ("m", 1_000_000)):
+        if value.endswith(suffix):
+            return int(float(value[:-1]) * factor)
+    return int(value)
+
+
+def default_chat_count(messages: int) -> int:
+    return max(20, min(5000, messages // 500))
+
+
+def _make_chats(rng: random.Random, count: int) -> List[Tuple[str, Optional[str], List[str]]]:
+    """(jid, name, senders other than you) per chat, in descending order of activity."""
+    contacts = [f"91{rng.randrange(7_000_000_000, 9_999_999_999)}" for _ in range(max(count * 2, 100))]
+    chats = []
+    for i in range(count):
+        if rng.random() < GROUP_FRACTION:
+            jid = f"1203634{rng.randrange(10**11):011d}@g.us"
+            name = f"Group {i} {rng.choice(WORDS).title()}"
+            members = rng.sample(contacts, rng.randint(3, min(60, len(contacts))))
+        else:
+            number = contacts[i]
+            jid = f"{number}@s.whatsapp.net"
+            name = None if rng.random() < UNNAMED_FRACTION else f"Contact {i} {rng.choice(WORDS).title()}"
+            members = [number]
+        chats.append((jid, name, members))
+    return chats
+
+
+def _content(rng: random.Random) -> str:
+    return " ".join(rng.choices(WORDS, k=max(1, int(rng.lognormvariate(1.6, 0.8)))))
+
+
+def generate(path: str, messages: int, chats: Optional[int] = None, seed: int = 1) -> Tuple[int, int]:
+    """Write a fresh database at ``path``; returns (messages, chats) written."""
+    rng = random.Random(seed)
+    chat_count = chats or default_chat_count(messages)
+    chat_rows = _make_chats(rng, chat_count)
+    weights = list(itertools.accumulate(1 / (rank + 1) ** ZIPF_EXPONENT for rank in range(chat_count)))
+    mean_gap = SPAN.total_seconds() / max(messages, 1)
+
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+
+    last_time = {}
+    now = START.timestamp()
+    chat_index = 0
+    batch = []
+    for i in range(messages):
+        switched = rng.random() >= BURST_STICKINESS
+        if switched:
+            chat_index = rng.choices(range(chat_count), cum_weights=weights)[0]
+        jid, _, members = chat_rows[chat_index]
+        # Replies within a burst are quick, new conversations start after longer
+        # gaps; the factors average out to 1 so the history spans SPAN
+        now += rng.expovariate(1 / mean_gap) * (4.0 if switched else 0.25)
+        timestamp = datetime.fromtimestamp(int(now), START.tzinfo).isoformat(sep=" ")
+        from_me = rng.random() < FROM_ME_FRACTION
+        sender = MY_NUMBER if from_me else rng.choice(members)
+        if rng.random() < MEDIA_FRACTION:
+            media_type, extension = rng.choice(MEDIA)
+            filename = f"{media_type}_{i}.{extension}"
+            content = "" if rng.random() < 0.7 else _content(rng)
+        else:
+            media_type = filename = ""
+            content = _content(rng)
+        batch.append((f"3EB0{i:016X}", jid, sender, content, timestamp, from_me, media_type, filename))
+        last_time[jid] = timestamp
+        if len(batch) >= INSERT_BATCH_SIZE:
+            _insert_messages(conn, batch)
+            batch = []
+    _insert_messages(conn, batch)
+
+    conn.executemany(
+        "INSERT INTO chats (jid, name, last_message_time) VALUES (?, ?, ?)",
+        [(jid, name, last_time.get(jid)) for jid, name, _ in chat_rows if jid in last_time]
+    )
+    conn.commit()
+    # The bridge uses the default rollback journal
+    conn.execute("PRAGMA journal_mode = DELETE")
+    written_chats = conn.execute("SELECT COUNT(*) FROM chats").fetchone()[0]
+    conn.close()
+    return messages, written_chats
+
+
+def _insert_messages(conn: sqlite3.Connection, rows: List[tuple]) -> None:
+    conn.executemany("""
+        INSERT INTO messages (id, chat_jid, sender, content, timestamp, is_from_me, media_type, filename)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+
+
+def prepare(path: str) -> None:
+    """Add the secondary indexes, search index and chat summary, as a tuned install would have."""
+    import indexes
+    import search
+    import summary
+
+    indexes.migrate(path)
+    search.create_search_index(path)
+    summary.create_summary(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic messages.db")
+    parser.add_argument("--messages", type=parse_count, default=parse_count("10k"), help="e.g. 10k, 1M, 10M")
+    parser.add_argument("--chats", type=int, help="Number of chats (default: scales with --messages)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", required=True, help="Database file to create (replaced if it exists)")
+    parser.add_argument("--migrate", action="store_true",
+                        help="Also create the secondary indexes, search index and chat summary")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    messages, chats = generate(args.out, args.messages, args.chats, args.seed)
+    print(f"Wrote {messages:,} messages in {chats:,} chats to {args.out} in {time.perf_counter() - started:.1f}s")
+    if args.migrate:
+        started = time.perf_counter()
+        prepare(args.out)
+        print(f"Indexed in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
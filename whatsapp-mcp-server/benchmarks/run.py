@@ -0,0 +1,383 @@
+"""Benchmark the query layer: every public function in whatsapp.py and every MCP tool in main.py.
+
+Each case is called repeatedly against a messages.db (for example one made by
+gen_db.py) and reported with p50/p99 latency, rows returned per second and
+peak RSS. Sends and downloads go to a local FakeBridge. The in-process caches
+are cleared before every call, so the numbers measure the queries themselves;
+pass --warm to measure with the caches as a long-running server has them.
+
+Reports are JSON, and --compare checks a run against an earlier report: it
+exits with status 1 if any case got slower by more than --threshold.
+
+Usage:
+    python benchmarks/run.py --size 10k                      # generate (once) and benchmark a 10k database
+    python benchmarks/run.py --db /tmp/bench-1m.db --output after.json
+    python benchmarks/run.py --db /tmp/bench-1m.db --compare before.json
+    python benchmarks/run.py --size 1M --filter contact
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import platform
+import re
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import db  # noqa: E402
+import gen_db  # noqa: E402
+import main as mcp_tools  # noqa: E402
+import whatsapp  # noqa: E402
+from fake_bridge import FakeBridge  # noqa: E402
+
+DEFAULT_REPEAT = 50
+DEFAULT_MAX_SECONDS = 5.0
+DEFAULT_THRESHOLD = 0.2
+# Differences below this are noise, whatever the ratio
+NOISE_FLOOR_MS = 0.05
+
+
+@dataclass
+class Case:
+    name: str
+    call: Callable[[], Any]
+
+
+def _sample(db_path: str) -> Dict[str, Any]:
+    """Realistic arguments: the busiest chat, group and sender, a message in the middle of history."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        def one(sql: str, default: Any = None) -> Any:
+            row = conn.execute(sql).fetchone()
+            return row[0] if row else default
+
+        chat_jid = one("SELECT chat_jid FROM messages WHERE chat_jid LIKE '%@s.whatsapp.net' "
+                       "GROUP BY chat_jid ORDER BY COUNT(*) DESC LIMIT 1")
+        group_jid = one("SELECT chat_jid FROM messages WHERE chat_jid LIKE '%@g.us' "
+                        "GROUP BY chat_jid ORDER BY COUNT(*) DESC LIMIT 1", chat_jid)
+        sender = one("SELECT sender FROM messages WHERE is_from_me = 0 "
+                     "GROUP BY sender ORDER BY COUNT(*) DESC LIMIT 1")
+        count = one("SELECT COUNT(*) FROM messages", 0)
+        middle = conn.execute("SELECT id, chat_jid, timestamp FROM messages ORDER BY rowid LIMIT 1 OFFSET ?",
+                              (count // 2,)).fetchone()
+        recent_ids = [row[0] for row in conn.execute("SELECT id FROM messages ORDER BY rowid DESC LIMIT 20")]
+        watermark = one("SELECT COALESCE(MAX(rowid), 0) FROM messages", 0)
+        # A bot watching 200 chats
+        target_jids = [row[0] for row in conn.execute(
+            "SELECT jid FROM chats ORDER BY last_message_time DESC LIMIT 200")]
+        # ... that has seen everything so far, as on most polls
+        inbound_watermarks = {}
+        for jid in target_jids:
+            row = conn.execute("SELECT timestamp, rowid FROM messages WHERE chat_jid = ? AND is_from_me = 0 "
+                               "ORDER BY timestamp DESC, rowid DESC LIMIT 1", (jid,)).fetchone()
+            inbound_watermarks[jid] = tuple(row) if row else ("", 0)
+    finally:
+        conn.close()
+    return {
+        "chat_jid": chat_jid,
+        "group_jid": group_jid,
+        "phone": (chat_jid or "").split("@")[0],
+        "sender": sender,
+        "message_id": middle[0] if middle else None,
+        "message_chat_jid": middle[1] if middle else None,
+        "after": middle[2][:10] if middle else None,
+        "recent_ids": recent_ids,
+        "since": max(0, watermark - 100),
+        "target_jids": target_jids,
+        "inbound_watermarks": inbound_watermarks,
+        "messages": count,
+    }
+
+
+def whatsapp_cases(s: Dict[str, Any]) -> List[Case]:
+    w = whatsapp
+    return [
+        Case("whatsapp.get_sender_name", lambda: w.get_sender_name(s["sender"])),
+        Case("whatsapp.get_sender_names", lambda: w.get_sender_names([s["sender"], s["phone"], s["chat_jid"]])),
+        Case("whatsapp.list_messages", lambda: w.list_messages(include_context=False)),
+        Case("whatsapp.list_messages(context)", lambda: w.list_messages()),
+        Case("whatsapp.list_messages(chat)", lambda: w.list_messages(chat_jid=s["chat_jid"], limit=50, include_context=False)),
+        Case("whatsapp.list_messages(sender)", lambda: w.list_messages(sender_phone_number=s["sender"], include_context=False)),
+        Case("whatsapp.list_messages(after)", lambda: w.list_messages(after=s["after"], include_context=False)),
+        Case("whatsapp.list_messages(query)", lambda: w.list_messages(query="tomorrow", include_context=False)),
+        Case("whatsapp.list_messages(page 50)", lambda: w.list_messages(page=50, include_context=False)),
+        Case("whatsapp.list_messages(cursor)", lambda: w.list_messages(chat_jid=s["group_jid"], include_context=False, cursor="")),
+        Case("whatsapp.list_messages(batch 1000)", lambda: w.list_messages(limit=1000, include_context=False, as_batch=True)),
+        Case("whatsapp.iter_messages(10k)", lambda: _drain(w.iter_messages(), 10_000)),
+        Case("whatsapp.get_message_context", lambda: w.get_message_context(s["message_id"])),
+        Case("whatsapp.get_message_contexts", lambda: w.get_message_contexts(s["recent_ids"])),
+        Case("whatsapp.list_chats", lambda: w.list_chats()),
+        Case("whatsapp.list_chats(name)", lambda: w.list_chats(sort_by="name", limit=100)),
+        Case("whatsapp.list_chats(query)", lambda: w.list_chats(query="contact")),
+        Case("whatsapp.iter_chats", lambda: _drain(w.iter_chats())),
+        Case("whatsapp.search_contacts", lambda: w.search_contacts(s["phone"][:6])),
+        Case("whatsapp.search_messages", lambda: w.search_messages("see you tomorrow")),
+        Case("whatsapp.get_contact_chats", lambda: w.get_contact_chats(s["sender"])),
+        Case("whatsapp.get_last_interaction", lambda: w.get_last_interaction(s["chat_jid"])),
+        Case("whatsapp.get_change_watermark", lambda: w.get_change_watermark()),
+        Case("whatsapp.get_new_messages", lambda: w.get_new_messages(s["since"])),
+        Case("whatsapp.get_new_messages(chats)", lambda: w.get_new_messages(s["since"], [s["chat_jid"], s["group_jid"]])),
+        Case("whatsapp.get_new_inbound_messages(200)",
+             lambda: w.get_new_inbound_messages(s["target_jids"], s["inbound_watermarks"])[0]),
+        Case("whatsapp.get_chat", lambda: w.get_chat(s["chat_jid"])),
+        Case("whatsapp.get_direct_chat_by_contact", lambda: w.get_direct_chat_by_contact(s["phone"])),
+        Case("whatsapp.send_message", lambda: w.send_message(s["phone"], "benchmark")),
+        Case("whatsapp.send_file", lambda: w.send_file(s["phone"], s["media_path"])),
+        Case("whatsapp.send_audio_message", lambda: w.send_audio_message(s["phone"], s["audio_path"])),
+        Case("whatsapp.send_messages_batch(50)",
+             lambda: w.send_messages_batch([f"9100000{i:05d}" for i in range(50)], "benchmark", rate_limit=None)),
+        Case("whatsapp.download_media", lambda: w.download_media(s["message_id"], s["message_chat_jid"])),
+    ]
+
+
+def mcp_cases(s: Dict[str, Any], run: Callable[[Any], Any]) -> List[Case]:
+    t = mcp_tools
+    return [
+        Case("mcp.search_contacts", lambda: run(t.search_contacts(s["phone"][:6]))),
+        Case("mcp.list_messages", lambda: run(t.list_messages())),
+        Case("mcp.list_messages(chat)", lambda: run(t.list_messages(chat_jid=s["chat_jid"], limit=50, include_context=False))),
+        Case("mcp.search_messages", lambda: run(t.search_messages("see you tomorrow"))),
+        Case("mcp.list_chats", lambda: run(t.list_chats())),
+        Case("mcp.get_chat", lambda: run(t.get_chat(s["chat_jid"]))),
+        Case("mcp.get_direct_chat_by_contact", lambda: run(t.get_direct_chat_by_contact(s["phone"]))),
+        Case("mcp.get_contact_chats", lambda: run(t.get_contact_chats(s["sender"]))),
+        Case("mcp.get_last_interaction", lambda: run(t.get_last_interaction(s["chat_jid"]))),
+        Case("mcp.get_message_context", lambda: run(t.get_message_context(s["message_id"]))),
+        Case("mcp.get_new_messages", lambda: run(t.get_new_messages(s["since"]))),
+        Case("mcp.send_message", lambda: run(t.send_message(s["phone"], "benchmark"))),
+        Case("mcp.send_file", lambda: run(t.send_file(s["phone"], s["media_path"]))),
+        Case("mcp.send_audio_message", lambda: run(t.send_audio_message(s["phone"], s["audio_path"]))),
+        Case("mcp.send_messages_batch(50)",
+             lambda: run(t.send_messages_batch([f"9100000{i:05d}" for i in range(50)], "benchmark", rate_limit=0))),
+        Case("mcp.download_media", lambda: run(t.download_media(s["message_id"], s["message_chat_jid"]))),
+    ]
+
+
+class RowCount(int):
+    """Result of a case that consumes rows itself (like iterators) instead of returning them."""
+
+
+def _drain(iterator, limit: Optional[int] = None) -> RowCount:
+    count = 0
+    for _ in iterator:
+        count += 1
+        if count == limit:
+            break
+    return RowCount(count)
+
+
+def _count_rows(result: Any) -> int:
+    """Rows a call returned, whatever shape it came in."""
+    if isinstance(result, RowCount):
+        return result
+    if isinstance(result, dict):
+        for key in ("messages", "results", "items"):
+            if isinstance(result.get(key), list):
+                return len(result[key])
+        return 1
+    items = getattr(result, "items", result)
+    if isinstance(items, (list, tuple, whatsapp.MessageBatch)):
+        return len(items)
+    return 1 if result else 0
+
+
+def _clear_caches() -> None:
+    whatsapp.SENDER_NAME_CACHE.clear()
+    whatsapp.CHAT_CACHE.clear()
+
+
+def _reset_peak_rss() -> bool:
+    # Linux resets VmHWM (peak RSS) when 5 is written to clear_refs
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def measure(case: Case, repeat: int, max_seconds: float, warm: bool) -> Dict[str, Any]:
+    # Several functions print status lines; keep them out of the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return _measure(case, repeat, max_seconds, warm)
+
+
+def _measure(case: Case, repeat: int, max_seconds: float, warm: bool) -> Dict[str, Any]:
+    _clear_caches()
+    case.call()  # warm up SQLite's page cache and the statement caches
+    _reset_peak_rss()
+    timings = []
+    rows = 0
+    deadline = time.perf_counter() + max_seconds
+    while len(timings) < repeat and (len(timings) < 3 or time.perf_counter() < deadline):
+        if not warm:
+            _clear_caches()
+        started = time.perf_counter()
+        result = case.call()
+        timings.append(time.perf_counter() - started)
+        rows += _count_rows(result)
+    timings.sort()
+    total = sum(timings)
+    return {
+        "calls": len(timings),
+        "p50_ms": timings[len(timings) // 2] * 1000,
+        "p99_ms": timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000,
+        "mean_ms": total / len(timings) * 1000,
+        "rows_per_call": rows / len(timings),
+        "rows_per_s": rows / total if total else 0.0,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(db_path: str, repeat: int, max_seconds: float, warm: bool, pattern: Optional[str]) -> Dict[str, Any]:
+    whatsapp.MESSAGES_DB_PATH = db_path
+    # FastMCP logs every httpx request at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    sample = _sample(db_path)
+    scratch = tempfile.mkdtemp(prefix="whatsapp-bench-")
+    sample["media_path"] = os.path.join(scratch, "photo.jpg")
+    sample["audio_path"] = os.path.join(scratch, "voice.ogg")
+    for path in (sample["media_path"], sample["audio_path"]):
+        with open(path, "wb") as f:
+            f.write(b"\0" * 1024)
+
+    bridge = FakeBridge().start()
+    whatsapp.WHATSAPP_API_BASE_URL = bridge.base_url
+    loop = asyncio.new_event_loop()
+    cases = whatsapp_cases(sample) + mcp_cases(sample, loop.run_until_complete)
+    if pattern:
+        cases = [case for case in cases if re.search(pattern, case.name)]
+
+    results = {}
+    try:
+        for case in cases:
+            results[case.name] = result = measure(case, repeat, max_seconds, warm)
+            print(f"{case.name:<42} p50 {result['p50_ms']:>9.3f}ms  p99 {result['p99_ms']:>9.3f}ms  "
+                  f"{result['rows_per_s']:>12,.0f} rows/s  {result['peak_rss_mb']:>7.1f}MB", flush=True)
+    finally:
+        loop.close()
+        bridge.stop()
+
+    return {
+        "meta": {
+            "db": os.path.abspath(db_path),
+            "messages": sample["messages"],
+            "chats": _chat_count(db_path),
+            "warm_caches": warm,
+            "repeat": repeat,
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "pool": db.POOL_ENABLED,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        },
+        "results": results,
+    }
+
+
+def _chat_count(db_path: str) -> int:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM chats").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Print p50 changes against ``baseline``; returns the cases that regressed."""
+    if report["meta"]["messages"] != baseline["meta"]["messages"]:
+        print(f"Warning: baseline has {baseline['meta']['messages']:,} messages, this run {report['meta']['messages']:,}")
+    regressions = []
+    print(f"\n{'case':<42} {'before':>10} {'after':>10} {'change':>8}")
+    for name, result in report["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        old, new = before["p50_ms"], result["p50_ms"]
+        change = (new - old) / old if old else 0.0
+        regressed = change > threshold and new - old > NOISE_FLOOR_MS
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<42} {old:>8.3f}ms {new:>8.3f}ms {change:>+7.0%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark whatsapp.py and the MCP tools")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--db", help="messages.db to benchmark against")
+    source.add_argument("--size", type=gen_db.parse_count, help="Generate a database of this many messages (e.g. 10k, 1M, 10M)")
+    parser.add_argument("--raw", action="store_true",
+                        help="With --size: skip the secondary indexes, search index and chat summary")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Calls per case")
+    parser.add_argument("--max-seconds", type=float, default=DEFAULT_MAX_SECONDS, help="Time budget per case")
+    parser.add_argument("--warm", action="store_true", help="Keep in-process caches between calls")
+    parser.add_argument("--filter", help="Only run cases whose name matches this regex")
+    parser.add_argument("--output", "-o", help="Write the JSON report here")
+    parser.add_argument("--compare", help="Earlier JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Fractional p50 slowdown that counts as a regression (default 0.2)")
+    args = parser.parse_args()
+
+    db_path = args.db
+    if db_path is None:
+        suffix = "-raw" if args.raw else ""
+        db_path = os.path.join(tempfile.gettempdir(), f"whatsapp-bench-{args.size}{suffix}.db")
+        if not os.path.exists(db_path):
+            print(f"Generating {db_path} ...", flush=True)
+            gen_db.generate(db_path, args.size)
+            if not args.raw:
+                gen_db.prepare(db_path)
+
+    report = run_benchmarks(db_path, args.repeat, args.max_seconds, args.warm, args.filter)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""HTTP client for the bridge's REST API.
+
+All calls share one ``requests.Session`` so connections to the bridge are
+kept alive and reused instead of opened per message. Every call has a
+timeout, so a hung bridge can't block a caller forever.
+
+Failures are retried with exponential backoff, but only when a retry can't
+duplicate anything: connection failures (nothing reached the bridge) are
+always retried, while timeouts, dropped connections and 502/503/504 are only
+retried for idempotent calls such as downloads. A send that may have reached
+the bridge is never repeated.
+
+Each endpoint keeps a latency histogram; ``client().stats()`` reports them.
+
+``AsyncBridgeClient`` is the asyncio counterpart (on ``httpx``) used by
+whatsapp_async.py. It applies the same timeouts and retry rules and records
+into the same client's histograms, so the stats cover both.
+"""
+import asyncio
+import bisect
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+CONNECT_TIMEOUT = 3.0
+# Sends with media wait for the bridge to upload the file to WhatsApp
+SEND_TIMEOUT = 60.0
+DOWNLOAD_TIMEOUT = 120.0
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.25
+BACKOFF_MAX = 4.0
+POOL_MAXSIZE = 10
+RETRY_STATUSES = {502, 503, 504}
+
+# Upper bounds of the histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; percentiles are bucket upper bounds."""
+
+    def __init__(self, buckets: List[float] = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = pct / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.buckets[index] if index < len(self.buckets) else self.max_ms
+        return self.max_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else None,
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "max_ms": self.max_ms,
+            "buckets": {
+                (f"<={bound}" if index < len(self.buckets) else f">{self.buckets[-1]}"): count
+                for index, (bound, count) in enumerate(zip(self.buckets + [None], self.counts))
+                if count
+            },
+        }
+
+
+def _backoff(base: float, attempt: int) -> float:
+    # Full jitter keeps retrying callers from hitting the bridge in lockstep
+    return random.uniform(0, min(BACKOFF_MAX, base * 2 ** (attempt - 1)))
+
+
+def _is_connect_error(error: requests.RequestException) -> bool:
+    """Whether the request failed before anything was sent to the bridge."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], "reason", None), NewConnectionError)
+    return False
+
+
+class BridgeClient:
+    """Pooled, instrumented HTTP client for the bridge."""
+
+    def __init__(
+        self,
+        max_retries: int = MAX_RETRIES,
+        backoff_base: float = BACKOFF_BASE,
+        pool_maxsize: int = POOL_MAXSIZE
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def post(self, url: str, payload: Dict[str, Any], timeout: float, idempotent: bool = False) -> requests.Response:
+        """POST ``payload`` as JSON, retrying where that is safe.
+
+        Returns the last response (which may be an error status) or raises
+        the last ``requests.RequestException`` once retries are exhausted.
+        """
+        endpoint = urlsplit(url).path
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                response = self.session.post(url, json=payload, timeout=(CONNECT_TIMEOUT, timeout))
+            except requests.RequestException as e:
+                self._record(endpoint, started, "errors")
+                if attempt >= self.max_retries or not (idempotent or _is_connect_error(e)):
+                    raise
+            else:
+                self._record(endpoint, started, "ok" if response.status_code < 400 else "http_errors")
+                if not (idempotent and response.status_code in RETRY_STATUSES) or attempt >= self.max_retries:
+                    return response
+            attempt += 1
+            self._count(endpoint, "retries")
+            time.sleep(self._backoff(attempt))
+
+    def _backoff(self, attempt: int) -> float:
+        return _backoff(self.backoff_base, attempt)
+
+    def _record(self, endpoint: str, started: float, outcome: str) -> None:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            histogram = self._histograms.get(endpoint)
+            if histogram is None:
+                histogram = self._histograms[endpoint] = LatencyHistogram()
+            histogram.observe(elapsed_ms)
+            counters = self._counters.setdefault(endpoint, {})
+            counters[outcome] = counters.get(outcome, 0) + 1
+
+    def _count(self, endpoint: str, name: str) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(endpoint, {})
+            counters[name] = counters.get(name, 0) + 1
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Latency histogram and outcome counters per endpoint."""
+        with self._lock:
+            return {
+                endpoint: {**histogram.snapshot(), **self._counters.get(endpoint, {})}
+                for endpoint, histogram in self._histograms.items()
+            }
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class AsyncBridgeClient:
+    """asyncio version of BridgeClient, recording into ``recorder``'s stats.
+
+    An ``httpx.AsyncClient`` belongs to the event loop it was first used on;
+    ``async_client()`` keeps one per loop.
+    """
+
+    def __init__(
+        self,
+        recorder: BridgeClient,
+        max_retries: int = MAX_RETRIES,
+        backoff_base: float = BACKOFF_BASE,
+        pool_maxsize: int = POOL_MAXSIZE
+    ):
+        self.recorder = recorder
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize)
+        )
+
+    async def post(self, url: str, payload: Dict[str, Any], timeout: float, idempotent: bool = False) -> httpx.Response:
+        """Like BridgeClient.post; raises the last ``httpx.HTTPError`` once retries are exhausted."""
+        endpoint = urlsplit(url).path
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                response = await self.client.post(url, json=payload, timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT))
+            except httpx.HTTPError as e:
+                self.recorder._record(endpoint, started, "errors")
+                # Connect errors mean nothing reached the bridge
+                connect_error = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                if attempt >= self.max_retries or not (idempotent or connect_error):
+                    raise
+            else:
+                self.recorder._record(endpoint, started, "ok" if response.status_code < 400 else "http_errors")
+                if not (idempotent and response.status_code in RETRY_STATUSES) or attempt >= self.max_retries:
+                    return response
+            attempt += 1
+            self.recorder._count(endpoint, "retries")
+            await asyncio.sleep(_backoff(self.backoff_base, attempt))
+
+    @property
+    def is_closed(self) -> bool:
+        return self.client.is_closed
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+class RateLimiter:
+    """Token bucket shared by threads: ``acquire()`` blocks until a call is allowed.
+
+    Allows ``rate`` calls per second on average and bursts of up to ``burst``.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AsyncRateLimiter:
+    """RateLimiter for coroutines on one event loop: ``await acquire()`` until a call is allowed."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+_client: Optional[BridgeClient] = None
+_client_lock = threading.Lock()
+
+
+def client() -> BridgeClient:
+    """The process-wide bridge client."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = BridgeClient()
+    return _client
+
+
+_async_client: Optional[AsyncBridgeClient] = None
+_async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def async_client() -> AsyncBridgeClient:
+    """The async bridge client for the running event loop, recreated if it was closed or belongs to another loop."""
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client.is_closed or _async_client_loop is not loop:
+        _async_client = AsyncBridgeClient(client())
+        _async_client_loop = loop
+    return _async_client
+
+
+async def aclose() -> None:
+    """Close the async bridge client (a new one is created on next use)."""
+    global _async_client, _async_client_loop
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = _async_client_loop = None
@@ -0,0 +1,415 @@
+import argparse
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Sequence
+
+from cache import LRUCache
+
+MESSAGES_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'whatsapp-bridge', 'store', 'messages.db')
+
+# Set WHATSAPP_DB_POOL=0 to go back to opening a fresh connection per call.
+POOL_ENABLED = os.getenv("WHATSAPP_DB_POOL", "1") != "0"
+POOL_SIZE = int(os.getenv("WHATSAPP_DB_POOL_SIZE", "4"))
+POOL_TIMEOUT = float(os.getenv("WHATSAPP_DB_POOL_TIMEOUT", "10"))
+
+# Per-connection tuning for the read-only connections
+CACHE_SIZE_KIB = 16384
+MMAP_SIZE = 256 * 1024 * 1024
+CACHED_STATEMENTS = 256
+
+# Optional sqlite3 trace callback installed on every connection handed out
+_trace_callback = None
+# Optional context manager factory (conn, db_path) that wraps every connection handed out
+_connection_hook = None
+
+
+def open_read_connection(db_path: str) -> sqlite3.Connection:
+    """Open a read-only connection tuned for the query layer.
+
+    The connection can be handed between threads, but callers must make sure
+    only one thread uses it at a time (the pool guarantees this).
+    """
+    conn = sqlite3.connect(
+        f"file:{db_path}?mode=ro",
+        uri=True,
+        check_same_thread=False,
+        cached_statements=CACHED_STATEMENTS,
+    )
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    return conn
+
+
+class ConnectionPool:
+    """A bounded pool of long-lived read-only SQLite connections.
+
+    Connections are created lazily up to ``size`` and handed out exclusively,
+    so each one is only ever used by a single thread at a time. Because they
+    stay open, SQLite's per-connection statement cache keeps prepared
+    statements around across calls.
+    """
+
+    def __init__(self, db_path: str, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "hits": 0,
+            "misses": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+            "discarded": 0,
+        }
+
+    def acquire(self) -> sqlite3.Connection:
+        """Take a connection from the pool, opening or waiting for one if needed."""
+        try:
+            conn = self._idle.get_nowait()
+            self._count(checkouts=1, hits=1)
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Connection pool is closed")
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+
+        if can_create:
+            try:
+                conn = open_read_connection(self.db_path)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+            self._count(checkouts=1, misses=1)
+            return conn
+
+        started = time.monotonic()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            self._count(timeouts=1)
+            raise sqlite3.OperationalError(
+                f"Timed out after {self.timeout}s waiting for a database connection"
+            )
+        self._count(checkouts=1, waits=1, wait_time=time.monotonic() - started)
+        return conn
+
+    def release(self, conn: sqlite3.Connection, discard: bool = False) -> None:
+        """Return a connection to the pool, or close it if it is no longer usable."""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            closed = self._closed
+            if discard or closed:
+                self._created -= 1
+        if discard or closed:
+            if discard:
+                self._count(discarded=1)
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except sqlite3.DatabaseError as e:
+            # A bare DatabaseError means the file itself is unusable (e.g. corrupt or replaced)
+            discard = type(e) is sqlite3.DatabaseError
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def close(self) -> None:
+        """Close all idle connections; connections in use are closed on release."""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
+            conn.close()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = self.size
+            stats["open"] = self._created
+        stats["idle"] = self._idle.qsize()
+        stats["hit_rate"] = stats["hits"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        return stats
+
+    def _count(self, **deltas) -> None:
+        with self._lock:
+            for key, value in deltas.items():
+                self._stats[key] += value
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str) -> ConnectionPool:
+    """Return the shared pool for a database file, creating it on first use."""
+    db_path = os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = _pools[db_path] = ConnectionPool(db_path)
+        return pool
+
+
+@contextmanager
+def connection(db_path: str) -> Iterator[sqlite3.Connection]:
+    """Borrow a read connection for ``db_path``.
+
+    Uses the shared pool unless pooling is disabled, in which case a plain
+    connection is opened and closed around the block like before.
+    """
+    trace_callback = _trace_callback
+    hook = _connection_hook
+    if not POOL_ENABLED:
+        conn = sqlite3.connect(db_path)
+        conn.set_trace_callback(trace_callback)
+        try:
+            if hook is None:
+                yield conn
+            else:
+                with hook(conn, db_path) as wrapped:
+                    yield wrapped
+        finally:
+            conn.close()
+        return
+
+    with get_pool(db_path).connection() as conn:
+        if trace_callback is None and hook is None:
+            yield conn
+            return
+        conn.set_trace_callback(trace_callback)
+        try:
+            if hook is None:
+                yield conn
+            else:
+                with hook(conn, db_path) as wrapped:
+                    yield wrapped
+        finally:
+            conn.set_trace_callback(None)
+
+
+class DataVersionWatcher:
+    """Tells whether a database changed, using ``PRAGMA data_version``.
+
+    data_version is per connection: it changes whenever another connection
+    commits. The watcher keeps one dedicated connection for it (never used for
+    queries), so every commit by the bridge or an indexer shows up as a new
+    version. Checking costs a shared lock and a read of the file header.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def version(self) -> int:
+        with self._lock:
+            if self._conn is None:
+                self._conn = open_read_connection(self.db_path)
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_watchers: Dict[str, DataVersionWatcher] = {}
+
+
+def data_version(db_path: str) -> int:
+    """A number that changes whenever another connection commits to ``db_path``."""
+    db_path = os.path.abspath(db_path)
+    with _pools_lock:
+        watcher = _watchers.get(db_path)
+        if watcher is None:
+            watcher = _watchers[db_path] = DataVersionWatcher(db_path)
+    return watcher.version()
+
+
+def set_trace_callback(callback: Optional[Callable[[str], None]]) -> None:
+    """Install a callback that receives the (expanded) SQL of every statement run
+    on connections handed out from now on. Pass None to remove it."""
+    global _trace_callback
+    _trace_callback = callback
+
+
+def set_connection_hook(hook: Optional[Callable[[sqlite3.Connection, str], ContextManager[Any]]]) -> None:
+    """Install a context manager factory that wraps every connection handed out
+    from now on (used by instrument.py). Pass None to remove it."""
+    global _connection_hook
+    _connection_hook = hook
+
+
+def pool_stats(db_path: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """Get hit/wait statistics for every pool, or only the one for ``db_path``."""
+    with _pools_lock:
+        pools = dict(_pools)
+    if db_path is not None:
+        db_path = os.path.abspath(db_path)
+        pools = {db_path: pools[db_path]} if db_path in pools else {}
+    return {path: pool.stats() for path, pool in pools.items()}
+
+
+def close_pools() -> None:
+    """Close and forget all pools and version watchers (e.g. on shutdown or after the DB file is replaced)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        watchers = list(_watchers.values())
+        _pools.clear()
+        _watchers.clear()
+    for pool in pools:
+        pool.close()
+    for watcher in watchers:
+        watcher.close()
+
+
+# === Writes and derived tables ===
+# search.py and summary.py keep tables derived from ``messages`` current with
+# an incremental indexer instead of triggers, which the bridge's inserts must
+# never trip over. Each records how far it got in a state table of
+# (name, last_rowid, row_count) rows.
+
+SYNC_BATCH_SIZE = 10000
+
+_tables_present = LRUCache(maxsize=16, ttl=30)
+
+
+def connect_for_write(db_path: str) -> sqlite3.Connection:
+    """Open a read-write connection that waits (up to 30s) for the bridge's locks."""
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA busy_timeout = 30000")
+    return conn
+
+
+def has_tables(db_path: str, names: Sequence[str]) -> bool:
+    """Check (with a short-lived cache) whether all of ``names`` exist in ``db_path``."""
+    key = (os.path.abspath(db_path), tuple(names))
+    present = _tables_present.get(key)
+    if present is None:
+        try:
+            with connection(db_path) as conn:
+                count = conn.execute(
+                    f"SELECT COUNT(*) FROM sqlite_master WHERE name IN ({', '.join('?' * len(names))})",
+                    tuple(names)
+                ).fetchone()[0]
+            present = count == len(names)
+        except sqlite3.Error:
+            present = False
+        _tables_present.set(key, present)
+    return present
+
+
+def forget_tables() -> None:
+    """Drop the has_tables cache, after creating or dropping tables."""
+    _tables_present.clear()
+
+
+def sync_messages(
+    conn: sqlite3.Connection,
+    state_table: str,
+    apply: Callable[[sqlite3.Connection, int, int], Any],
+    batch_size: int = SYNC_BATCH_SIZE
+) -> int:
+    """Pass messages stored since the last sync to ``apply(conn, after_rowid, last_rowid)``.
+
+    Progress is kept in the ``'messages'`` row of ``state_table``. Each batch
+    of up to ``batch_size`` rows is committed together with its progress, so
+    the bridge is never locked out of the database for long and an
+    interrupted sync resumes where it stopped. Returns the number of messages
+    passed on.
+    """
+    synced = 0
+    while True:
+        after_rowid = conn.execute(f"SELECT last_rowid FROM {state_table} WHERE name = 'messages'").fetchone()[0]
+        last_rowid, batch = conn.execute("""
+            SELECT MAX(rowid), COUNT(*) FROM (
+                SELECT rowid FROM messages WHERE rowid > ? ORDER BY rowid LIMIT ?
+            )
+        """, (after_rowid, batch_size)).fetchone()
+        if not batch:
+            return synced
+        with conn:
+            apply(conn, after_rowid, last_rowid)
+            conn.execute(f"""
+                UPDATE {state_table}
+                SET last_rowid = ?, row_count = row_count + ?
+                WHERE name = 'messages'
+            """, (last_rowid, batch))
+        synced += batch
+
+
+def indexer_main(
+    argv: Optional[List[str]],
+    title: str,
+    synced: str,
+    create: Callable[[str], Any],
+    sync: Callable[[str], int],
+    rebuild: Callable[[str], Any],
+    drop: Callable[[str], Any]
+) -> int:
+    """The init/sync/watch/rebuild/drop command line shared by the indexers.
+
+    ``title`` names what is managed ("Search index") and ``synced`` is the
+    past tense of a sync ("Indexed").
+    """
+    parser = argparse.ArgumentParser(description=f"Manage the {title.lower()} for messages.db")
+    parser.add_argument("command", choices=["init", "sync", "watch", "rebuild", "drop"])
+    parser.add_argument("--db", default=MESSAGES_DB_PATH, help="Path to messages.db")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between syncs for 'watch'")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "init":
+            create(args.db)
+            print(f"{title} created")
+        elif args.command == "sync":
+            print(f"{synced} {sync(args.db)} new messages")
+        elif args.command == "watch":
+            print(f"Syncing {title.lower()} every {args.interval}s. Press Ctrl+C to stop.")
+            while True:
+                count = sync(args.db)
+                if count:
+                    print(f"{synced} {count} new messages")
+                time.sleep(args.interval)
+        elif args.command == "rebuild":
+            rebuild(args.db)
+            print(f"{title} rebuilt")
+        elif args.command == "drop":
+            drop(args.db)
+            print(f"{title} dropped")
+    except KeyboardInterrupt:
+        pass
+    except (sqlite3.Error, RuntimeError) as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
@@ -0,0 +1,154 @@
+"""Push delivery of new messages from the bridge.
+
+The bridge publishes every message it stores on ``/api/events`` as a
+server-sent event stream. ``MessageListener`` keeps a subscription open in a
+background thread and hands messages to the consumer through a queue, so the
+consumer reacts as soon as a message arrives instead of on its next poll.
+
+Events are only a latency optimisation: while the stream is down (bridge
+restarting, subscriber dropped for falling behind) nothing is delivered, so
+consumers should poll the database whenever ``connected`` is not set and once
+more after every reconnect to pick up what they missed.
+"""
+import json
+import queue
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+import requests
+
+from whatsapp import WHATSAPP_API_BASE_URL, Message
+
+EVENTS_URL = f"{WHATSAPP_API_BASE_URL}/events"
+# The bridge sends a heartbeat every 15s; a silent stream after this long is dead
+READ_TIMEOUT = 45
+CONNECT_TIMEOUT = 5
+MAX_RECONNECT_DELAY = 30
+
+
+@dataclass
+class MessageEvent:
+    message: Message
+    # When the event reached this process, used to judge delivery lag
+    received_at: datetime
+
+
+def parse_message(data: Dict[str, Any]) -> Message:
+    """Build a Message from the JSON payload of a ``message`` event."""
+    timestamp = datetime.fromisoformat(data["timestamp"].replace("Z", "+00:00"))
+    return Message(
+        timestamp=timestamp,
+        sender=data.get("sender", ""),
+        content=data.get("content", ""),
+        is_from_me=bool(data.get("is_from_me", False)),
+        chat_jid=data["chat_jid"],
+        id=data["id"],
+        chat_name=data.get("chat_name") or None,
+        media_type=data.get("media_type") or None,
+    )
+
+
+def iter_events(url: str = EVENTS_URL, session: Optional[requests.Session] = None) -> Iterator[Optional[Dict[str, Any]]]:
+    """Yield the payload of each event on the stream until it closes.
+
+    ``None`` is yielded once the stream is open (before any event), so callers
+    can tell a live subscription from one that is still connecting.
+    Raises ``requests.RequestException`` if the connection fails or goes quiet.
+    """
+    http = session or requests
+    with http.get(url, stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                  headers={"Accept": "text/event-stream"}) as response:
+        response.raise_for_status()
+        yield None
+
+        event_type, data_lines = "message", []
+        # chunk_size=None hands over each chunk as soon as the bridge flushes it
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            if line is None:
+                continue
+            if line == "":
+                # A blank line ends the event
+                if data_lines:
+                    if event_type == "message":
+                        yield json.loads("\n".join(data_lines))
+                event_type, data_lines = "message", []
+            elif line.startswith(":"):
+                continue
+            else:
+                field, _, value = line.partition(":")
+                value = value[1:] if value.startswith(" ") else value
+                if field == "event":
+                    event_type = value
+                elif field == "data":
+                    data_lines.append(value)
+
+
+class MessageListener(threading.Thread):
+    """Background subscriber that queues pushed messages, reconnecting with backoff.
+
+    ``connected`` is set while the stream is open. ``generation`` counts the
+    connections made so far; a consumer that sees it change should poll the
+    database once to cover the gap before the reconnect.
+    """
+
+    def __init__(self, url: str = EVENTS_URL, chat_jids: Optional[Iterable[str]] = None, include_own: bool = False):
+        super().__init__(name="message-listener", daemon=True)
+        self.url = url
+        self.chat_jids = set(chat_jids) if chat_jids is not None else None
+        self.include_own = include_own
+        self.queue: "queue.Queue[MessageEvent]" = queue.Queue()
+        self.connected = threading.Event()
+        self.generation = 0
+        self._stopping = threading.Event()
+
+    def run(self) -> None:
+        delay = 1
+        session = requests.Session()
+        while not self._stopping.is_set():
+            try:
+                for data in iter_events(self.url, session):
+                    if self._stopping.is_set():
+                        break
+                    if data is None:
+                        self.generation += 1
+                        self.connected.set()
+                        delay = 1
+                        print(f"📡 Subscribed to bridge events at {self.url}")
+                        continue
+                    self._dispatch(data)
+            except (requests.RequestException, ValueError) as e:
+                if self.connected.is_set():
+                    print(f"⚠️ Bridge event stream lost: {e}")
+            finally:
+                self.connected.clear()
+            if self._stopping.wait(delay):
+                break
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+        session.close()
+
+    def _dispatch(self, data: Dict[str, Any]) -> None:
+        received_at = datetime.now(timezone.utc)
+        try:
+            message = parse_message(data)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"⚠️ Ignoring malformed event: {e}")
+            return
+        if message.is_from_me and not self.include_own:
+            return
+        if self.chat_jids is not None and message.chat_jid not in self.chat_jids:
+            return
+        self.queue.put(MessageEvent(message, received_at))
+
+    def get(self, timeout: Optional[float] = None) -> Optional[MessageEvent]:
+        """Next queued message, or None if none arrives within ``timeout``."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def stop(self) -> None:
+        # A blocked read returns at the next heartbeat at the latest
+        self._stopping.set()
+
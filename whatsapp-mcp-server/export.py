@@ -0,0 +1,138 @@
+"""Stream messages (or chats) out of messages.db as NDJSON or CSV.
+
+Rows are read through whatsapp.iter_messages / iter_chats and written as
+they arrive, so memory use stays flat however large the database is, and the
+bridge can keep writing while an export runs.
+
+Usage:
+    python export.py > messages.ndjson
+    python export.py --format csv --output messages.csv --oldest-first
+    python export.py --chat 123456789@s.whatsapp.net --after 2024-01-01
+    python export.py --chats --format csv
+"""
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+
+import whatsapp
+
+MESSAGE_FIELDS = ["timestamp", "chat_jid", "chat_name", "sender", "is_from_me", "content", "media_type", "id"]
+CHAT_FIELDS = ["jid", "name", "last_message_time", "last_message", "last_sender", "last_is_from_me"]
+PROGRESS_EVERY = 100_000
+
+
+def _records(items: Iterable[Any], fields: List[str]) -> Iterator[Dict[str, Any]]:
+    for item in items:
+        record = {}
+        for name in fields:
+            value = getattr(item, name)
+            if hasattr(value, "isoformat"):
+                value = value.isoformat()
+            elif name in ("is_from_me", "last_is_from_me") and value is not None:
+                value = bool(value)
+            record[name] = value
+        yield record
+
+
+def write_ndjson(records: Iterable[Dict[str, Any]], out: TextIO) -> int:
+    count = 0
+    for record in records:
+        out.write(json.dumps(record, ensure_ascii=False))
+        out.write("\n")
+        count += 1
+        _progress(count)
+    return count
+
+
+def write_csv(records: Iterable[Dict[str, Any]], out: TextIO, fields: List[str]) -> int:
+    writer = csv.DictWriter(out, fieldnames=fields)
+    writer.writeheader()
+    count = 0
+    for record in records:
+        writer.writerow(record)
+        count += 1
+        _progress(count)
+    return count
+
+
+def _progress(count: int) -> None:
+    if count % PROGRESS_EVERY == 0:
+        print(f"... {count:,} rows", file=sys.stderr)
+
+
+def export(
+    out: TextIO,
+    fmt: str = "ndjson",
+    chats: bool = False,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    sender_phone_number: Optional[str] = None,
+    chat_jid: Optional[str] = None,
+    query: Optional[str] = None,
+    oldest_first: bool = False
+) -> int:
+    """Write matching messages (or all chats) to ``out``; returns the number of rows."""
+    if chats:
+        fields = CHAT_FIELDS
+        items = whatsapp.iter_chats(query=query)
+    else:
+        fields = MESSAGE_FIELDS
+        items = whatsapp.iter_messages(
+            after=after,
+            before=before,
+            sender_phone_number=sender_phone_number,
+            chat_jid=chat_jid,
+            query=query,
+            oldest_first=oldest_first
+        )
+    records = _records(items, fields)
+    if fmt == "csv":
+        return write_csv(records, out, fields)
+    return write_ndjson(records, out)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export WhatsApp messages or chats as NDJSON or CSV")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--output", "-o", default="-", help="Output file (default: stdout)")
+    parser.add_argument("--db", default=whatsapp.MESSAGES_DB_PATH, help="Path to messages.db")
+    parser.add_argument("--chats", action="store_true", help="Export chats instead of messages")
+    parser.add_argument("--chat", dest="chat_jid", help="Only messages from this chat JID")
+    parser.add_argument("--sender", dest="sender_phone_number", help="Only messages from this sender")
+    parser.add_argument("--after", help="Only messages after this ISO-8601 date")
+    parser.add_argument("--before", help="Only messages before this ISO-8601 date")
+    parser.add_argument("--query", help="Only messages (or chats) matching this text")
+    parser.add_argument("--oldest-first", action="store_true", help="Export messages in chronological order")
+    args = parser.parse_args(argv)
+
+    whatsapp.MESSAGES_DB_PATH = args.db
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        count = export(
+            out,
+            fmt=args.format,
+            chats=args.chats,
+            after=args.after,
+            before=args.before,
+            sender_phone_number=args.sender_phone_number,
+            chat_jid=args.chat_jid,
+            query=args.query,
+            oldest_first=args.oldest_first
+        )
+    except (ValueError, sqlite3.Error) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        return 0
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Exported {count:,} {'chats' if args.chats else 'messages'}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""Durable consumer for the messages change feed.
+
+``whatsapp.get_new_messages`` returns whatever was stored after a rowid
+watermark, in the order the bridge stored it, for O(new messages) per call.
+Holding on to the watermark is up to the caller. ``ChangeFeed`` keeps it in a
+small JSON file, so a consumer that restarts resumes where it stopped instead
+of at the end of the table.
+
+The bot uses one to poll its target chats while the bridge's event stream is
+down. The feed can repeat messages (after a crash, or when the bridge
+re-stores a message under a new rowid), so consumers de-duplicate by message
+ID; the bot's SeenStore does.
+"""
+import json
+import os
+import threading
+from typing import Iterable, List, Optional
+
+from whatsapp import Message, get_change_watermark, get_new_messages
+
+
+class ChangeFeed:
+    """Durable consumer of the messages change feed.
+
+    Tracks a rowid watermark for a set of chats and persists it to
+    ``state_file`` so a restarted consumer carries on where it stopped.
+    ``poll()`` returns new messages; ``commit()`` records that they have been
+    handled. A consumer that crashes between the two sees the same messages
+    again rather than losing them.
+    """
+
+    def __init__(
+        self,
+        state_file: str,
+        chat_jids: Optional[Iterable[str]] = None,
+        batch_size: int = 500,
+        start_at_end: bool = True
+    ):
+        self.state_file = state_file
+        self.chat_jids = list(chat_jids) if chat_jids is not None else None
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        saved = self._load()
+        if saved is None:
+            saved = get_change_watermark() if start_at_end else 0
+        self._committed = saved
+        self._pending = saved
+
+    @property
+    def watermark(self) -> int:
+        return self._committed
+
+    def poll(self) -> List[Message]:
+        """Get messages newer than the last poll (not yet committed)."""
+        with self._lock:
+            messages, self._pending = get_new_messages(self._pending, self.chat_jids, self.batch_size)
+            return messages
+
+    def commit(self) -> None:
+        """Persist the watermark reached by the last poll."""
+        with self._lock:
+            if self._pending == self._committed:
+                return
+            tmp_path = f"{self.state_file}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"watermark": self._pending}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.state_file)
+            self._committed = self._pending
+
+    def rewind(self) -> None:
+        """Forget uncommitted progress so the next poll repeats it."""
+        with self._lock:
+            self._pending = self._committed
+
+    def _load(self) -> Optional[int]:
+        if not os.path.exists(self.state_file):
+            return None
+        try:
+            with open(self.state_file, "r") as f:
+                return int(json.load(f)["watermark"])
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring unreadable change-feed state {self.state_file}: {e}")
+            return None
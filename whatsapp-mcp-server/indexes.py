@@ -0,0 +1,250 @@
+"""Index migrations and query-plan checks for messages.db.
+
+The bridge only creates the primary keys, but whatsapp.py filters and sorts
+by chat, sender and time. This tool creates the secondary indexes those
+queries need and can verify, via EXPLAIN QUERY PLAN, that none of the hot
+queries has fallen back to a full table scan.
+
+Usage:
+    python indexes.py migrate   # create missing indexes and refresh statistics
+    python indexes.py status    # show which indexes exist
+    python indexes.py check     # capture the plan of every query; exit 1 on a full scan
+
+Creating the indexes on a large database holds the write lock for a while,
+so it's best done while the bridge is stopped.
+"""
+import argparse
+import re
+import sqlite3
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import db
+import search
+import whatsapp
+
+# (name, table, columns, queries that rely on it)
+INDEXES = [
+    ("idx_messages_chat_timestamp", "messages", ("chat_jid", "timestamp"),
+     "list_messages(chat_jid=...), context windows, last message of a chat"),
+    ("idx_messages_timestamp", "messages", ("timestamp", "id"),
+     "list_messages without filters (newest first), keyset pages and iter_messages/export.py"),
+    ("idx_messages_sender_timestamp", "messages", ("sender", "timestamp"),
+     "list_messages(sender_phone_number=...), get_contact_chats, get_last_interaction"),
+    ("idx_chats_last_message_time", "chats", ("last_message_time",),
+     "list_chats sorted by last activity"),
+    ("idx_chats_name", "chats", ("name",),
+     "list_chats sorted by name"),
+]
+# Lookups by messages.id alone are served by the (id, chat_jid) primary key index.
+
+_SCAN = re.compile(r"^SCAN (\w+)$")
+_TABLE_REF = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_BASE_TABLES = {"messages", "chats"}
+
+
+@dataclass
+class PlanCheck:
+    name: str
+    call: Callable[[], Any]
+    # Tables (or aliases) that may be scanned in full, e.g. the small chats table for LIKE lookups
+    allow_scans: Set[str] = field(default_factory=set)
+
+
+@dataclass
+class PlanReport:
+    name: str
+    statements: List[Tuple[str, List[str]]]
+    full_scans: List[str]
+
+    @property
+    def ok(self) -> bool:
+        return not self.full_scans
+
+
+def index_status(db_path: str) -> Dict[str, bool]:
+    """Report, per required index, whether it exists with the expected columns."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        status = {}
+        for name, table, columns, _ in INDEXES:
+            actual = tuple(row[2] for row in conn.execute(f"PRAGMA index_info({name})"))
+            status[name] = actual == columns
+        return status
+    finally:
+        conn.close()
+
+
+def migrate(db_path: str) -> List[str]:
+    """Create any missing index and refresh planner statistics. Returns the created names."""
+    conn = db.connect_for_write(db_path)
+    created = []
+    try:
+        for name, ok in index_status(db_path).items():
+            if ok:
+                continue
+            _, table, columns, _ = next(index for index in INDEXES if index[0] == name)
+            with conn:
+                # An index with the right name but wrong columns is recreated
+                conn.execute(f"DROP INDEX IF EXISTS {name}")
+                conn.execute(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+            created.append(name)
+        conn.execute("PRAGMA analysis_limit = 1000")
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+
+    missing = [name for name, ok in index_status(db_path).items() if not ok]
+    if missing:
+        raise RuntimeError(f"Indexes still missing after migration: {', '.join(missing)}")
+    return created
+
+
+def _sample_values(db_path: str) -> Dict[str, Optional[str]]:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        row = conn.execute("""
+            SELECT m.id, m.chat_jid, m.sender FROM messages m
+            WHERE m.is_from_me = 0 AND m.chat_jid LIKE '%@s.whatsapp.net'
+            ORDER BY m.rowid DESC LIMIT 1
+        """).fetchone() or conn.execute("SELECT id, chat_jid, sender FROM messages ORDER BY rowid DESC LIMIT 1").fetchone()
+    finally:
+        conn.close()
+    message_id, chat_jid, sender = row or (None, None, None)
+    return {
+        "message_id": message_id,
+        "chat_jid": chat_jid,
+        "sender": sender,
+        "phone": (chat_jid or "").split("@")[0],
+    }
+
+
+def hot_queries(db_path: str) -> List[PlanCheck]:
+    """Representative calls covering every query in whatsapp.py."""
+    sample = _sample_values(db_path)
+    chat_jid, sender, message_id = sample["chat_jid"], sample["sender"], sample["message_id"]
+    chats_scan = {"chats", "c"}
+    checks = [
+        PlanCheck("list_messages", lambda: whatsapp.list_messages(include_context=False)),
+        PlanCheck("list_messages(chat_jid)", lambda: whatsapp.list_messages(chat_jid=chat_jid, include_context=False)),
+        PlanCheck("list_messages(sender)", lambda: whatsapp.list_messages(sender_phone_number=sender, include_context=False)),
+        PlanCheck("list_messages(cursor)", lambda: whatsapp.list_messages(chat_jid=chat_jid, include_context=False, cursor="")),
+        PlanCheck("iter_messages", lambda: next(whatsapp.iter_messages(chunk_size=10), None)),
+        PlanCheck("list_messages(include_context)", lambda: whatsapp.list_messages(chat_jid=chat_jid, limit=5),
+                  allow_scans=chats_scan),
+        PlanCheck("get_message_context", lambda: whatsapp.get_message_context(message_id)),
+        PlanCheck("list_chats", lambda: whatsapp.list_chats()),
+        PlanCheck("list_chats(sort_by=name)", lambda: whatsapp.list_chats(sort_by="name")),
+        PlanCheck("get_chat", lambda: whatsapp.get_chat(chat_jid)),
+        PlanCheck("get_contact_chats", lambda: whatsapp.get_contact_chats(chat_jid)),
+        PlanCheck("get_new_messages", lambda: whatsapp.get_new_messages(0, [chat_jid])),
+        PlanCheck("get_new_inbound_messages", lambda: whatsapp.get_new_inbound_messages([chat_jid])),
+        PlanCheck("get_new_inbound_messages(watermarks)",
+                  lambda: whatsapp.get_new_inbound_messages([chat_jid], {chat_jid: ("", 0)})),
+        PlanCheck("get_last_interaction", lambda: whatsapp.get_last_interaction(chat_jid), allow_scans=chats_scan),
+        PlanCheck("get_sender_names", lambda: whatsapp.get_sender_names([sender, chat_jid]), allow_scans=chats_scan),
+        # Substring matches on the (small) chats table can't use a b-tree index
+        PlanCheck("search_contacts", lambda: whatsapp.search_contacts(sample["phone"]), allow_scans=chats_scan),
+        PlanCheck("get_direct_chat_by_contact", lambda: whatsapp.get_direct_chat_by_contact(sample["phone"]),
+                  allow_scans=chats_scan),
+    ]
+    if search.has_search_index(db_path):
+        # Without the index search_messages is a LIKE scan by design
+        checks.append(PlanCheck("search_messages", lambda: whatsapp.search_messages("hello")))
+    return checks
+
+
+def _base_table_names(sql: str) -> Dict[str, str]:
+    """Map every name a base table is referred to by in ``sql`` (itself or an alias) to the table."""
+    names = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        if table in _BASE_TABLES:
+            names[table] = table
+            if alias and alias.upper() not in {"ON", "WHERE", "JOIN", "LEFT", "ORDER", "GROUP", "LIMIT"}:
+                names[alias] = table
+    return names
+
+
+def explain(conn: sqlite3.Connection, sql: str) -> List[str]:
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def check_query_plans(db_path: str, checks: Optional[List[PlanCheck]] = None) -> List[PlanReport]:
+    """Run each hot query, capture its SQL and report any full table scans."""
+    whatsapp.MESSAGES_DB_PATH = db_path
+    # Cached lookups would skip their SQL and escape the check
+    whatsapp.SENDER_NAME_CACHE.clear()
+    whatsapp.CHAT_CACHE.clear()
+    checks = checks if checks is not None else hot_queries(db_path)
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    reports = []
+    try:
+        for check in checks:
+            captured = []
+            db.set_trace_callback(captured.append)
+            try:
+                check.call()
+            finally:
+                db.set_trace_callback(None)
+
+            statements = []
+            full_scans = []
+            for sql in captured:
+                if not sql.lstrip().upper().startswith(("SELECT", "WITH")) or "sqlite_master" in sql:
+                    continue
+                plan = explain(conn, sql)
+                statements.append((sql, plan))
+                tables = _base_table_names(sql)
+                for detail in plan:
+                    # Scans of CTEs, subquery results and constant rows are fine
+                    match = _SCAN.match(detail)
+                    if match and match.group(1) in tables and match.group(1) not in check.allow_scans:
+                        full_scans.append(detail)
+            if not statements:
+                full_scans.append("no SQL captured")
+            reports.append(PlanReport(check.name, statements, full_scans))
+    finally:
+        conn.close()
+    return reports
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Create and verify the indexes messages.db needs")
+    parser.add_argument("command", choices=["migrate", "status", "check"])
+    parser.add_argument("--db", default=whatsapp.MESSAGES_DB_PATH, help="Path to messages.db")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Print every captured statement and plan")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "migrate":
+            created = migrate(args.db)
+            print(f"Created {', '.join(created)}" if created else "All indexes already present")
+        elif args.command == "status":
+            for name, ok in index_status(args.db).items():
+                print(f"{'✓' if ok else '✗'} {name}")
+        elif args.command == "check":
+            reports = check_query_plans(args.db)
+            for report in reports:
+                print(f"{'✓' if report.ok else '✗'} {report.name}")
+                for detail in report.full_scans:
+                    print(f"    full scan: {detail}")
+                if args.verbose or not report.ok:
+                    for sql, plan in report.statements:
+                        print("    " + " ".join(sql.split()))
+                        for detail in plan:
+                            print(f"        {detail}")
+            failed = [report.name for report in reports if not report.ok]
+            if failed:
+                print(f"❌ {len(failed)} hot queries regressed to a full scan: {', '.join(failed)}")
+                return 1
+            print("✅ No hot query does a full table scan")
+    except (sqlite3.Error, RuntimeError) as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
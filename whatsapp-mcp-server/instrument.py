@@ -0,0 +1,282 @@
+"""Query instrumentation for the read connections handed out by db.py.
+
+When enabled, every statement run through ``db.connection()`` is timed from
+execute to the last fetch, its fetched rows are counted, and it is attributed
+to the outermost whatsapp.py function on the call stack (so ``list_chats``
+rather than the ``_select_chats`` helper it calls). Statements slower than the
+threshold have their ``EXPLAIN QUERY PLAN`` captured and are kept in a
+bounded slow-query log.
+
+When disabled (the default) db.connection() hands out the bare connection,
+so the only cost is one ``is None`` check per borrowed connection.
+
+Enable it with ``WHATSAPP_QUERY_STATS=1`` (and optionally
+``WHATSAPP_SLOW_QUERY_MS``, default 100) or at runtime with ``enable()``;
+read the numbers with ``stats()`` or the ``get_performance_stats`` MCP tool.
+"""
+import collections
+import functools
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+import db
+
+SLOW_QUERY_MS = float(os.getenv("WHATSAPP_SLOW_QUERY_MS", "100"))
+SLOW_LOG_SIZE = 100
+MAX_STATEMENTS = 500
+# Statements are attributed to the outermost function of these modules on the stack
+ATTRIBUTED_MODULES = {"whatsapp", "feed", "search", "summary"}
+
+_WHITESPACE = re.compile(r"\s+")
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace and variable-length placeholder lists so equal queries group together."""
+    return _PLACEHOLDER_LIST.sub("?, ...", _WHITESPACE.sub(" ", sql).strip())
+
+
+def _caller() -> str:
+    """The outermost function of an attributed module on the current stack."""
+    frame = sys._getframe(1)
+    found = None
+    while frame is not None:
+        module = frame.f_globals.get("__name__")
+        if module in ATTRIBUTED_MODULES:
+            found = f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return found or "<other>"
+
+
+class QueryStats:
+    """Thread-safe aggregation of statement timings, per function and per statement."""
+
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS, log_slow: bool = True):
+        self.slow_query_ms = slow_query_ms
+        self.log_slow = log_slow
+        self._lock = threading.Lock()
+        self._functions: Dict[str, Dict[str, float]] = {}
+        self._statements: Dict[str, Dict[str, Any]] = {}
+        self.slow_queries: Deque[Dict[str, Any]] = collections.deque(maxlen=SLOW_LOG_SIZE)
+
+    def record(self, function: str, sql: str, elapsed_ms: float, rows: int) -> None:
+        key = normalize_sql(sql)
+        slow = elapsed_ms >= self.slow_query_ms
+        with self._lock:
+            entry = self._functions.get(function)
+            if entry is None:
+                entry = self._functions[function] = {
+                    "statements": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "slow": 0
+                }
+            entry["statements"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["rows"] += rows
+            entry["slow"] += slow
+
+            statement = self._statements.get(key)
+            if statement is None and len(self._statements) < MAX_STATEMENTS:
+                statement = self._statements[key] = {
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "functions": set()
+                }
+            if statement is not None:
+                statement["count"] += 1
+                statement["total_ms"] += elapsed_ms
+                statement["max_ms"] = max(statement["max_ms"], elapsed_ms)
+                statement["rows"] += rows
+                statement["functions"].add(function)
+
+    def record_slow(self, function: str, sql: str, params: Any, elapsed_ms: float, rows: int, plan: List[str]) -> None:
+        entry = {
+            "function": function,
+            "sql": normalize_sql(sql),
+            "params": [repr(param)[:100] for param in params] if isinstance(params, (list, tuple)) else repr(params)[:200],
+            "elapsed_ms": round(elapsed_ms, 3),
+            "rows": rows,
+            "plan": plan,
+            "at": time.time(),
+        }
+        self.slow_queries.append(entry)
+        if self.log_slow:
+            # stderr: stdout carries the MCP protocol
+            print(f"Slow query ({elapsed_ms:.1f}ms, {rows} rows) in {function}: {entry['sql'][:300]}\n"
+                  f"  plan: {'; '.join(plan)}", file=sys.stderr)
+
+    def snapshot(self, top: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            functions = {
+                name: {**entry, "mean_ms": entry["total_ms"] / entry["statements"]}
+                for name, entry in self._functions.items()
+            }
+            statements = sorted(
+                ({"sql": sql, **entry, "functions": sorted(entry["functions"])} for sql, entry in self._statements.items()),
+                key=lambda entry: entry["total_ms"],
+                reverse=True
+            )[:top]
+            slow = list(self.slow_queries)
+        return {
+            "slow_query_ms": self.slow_query_ms,
+            "functions": dict(sorted(functions.items(), key=lambda item: item[1]["total_ms"], reverse=True)),
+            "top_statements": statements,
+            "slow_queries": slow,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._functions.clear()
+            self._statements.clear()
+            self.slow_queries.clear()
+
+
+class _InstrumentedCursor:
+    """Cursor proxy that times a statement across execute and all its fetches."""
+
+    def __init__(self, cursor: sqlite3.Cursor, owner: "_InstrumentedConnection"):
+        self._cursor = cursor
+        self._owner = owner
+        self._sql: Optional[str] = None
+        self._params: Any = ()
+        self._function = ""
+        self._elapsed = 0.0
+        self._rows = 0
+
+    def execute(self, sql: str, parameters: Any = ()) -> "_InstrumentedCursor":
+        self.finish()
+        self._function = _caller()
+        started = time.perf_counter()
+        self._cursor.execute(sql, parameters)
+        self._elapsed = time.perf_counter() - started
+        self._sql, self._params, self._rows = sql, parameters, 0
+        return self
+
+    def fetchone(self) -> Any:
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._elapsed += time.perf_counter() - started
+        self._rows += row is not None
+        return row
+
+    def fetchmany(self, size: int = 1) -> List[Any]:
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(size)
+        self._elapsed += time.perf_counter() - started
+        self._rows += len(rows)
+        return rows
+
+    def fetchall(self) -> List[Any]:
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._elapsed += time.perf_counter() - started
+        self._rows += len(rows)
+        self.finish()
+        return rows
+
+    def __iter__(self) -> Iterator[Any]:
+        while True:
+            row = self.fetchone()
+            if row is None:
+                self.finish()
+                return
+            yield row
+
+    def finish(self) -> None:
+        """Record the current statement (called on the next execute, fetchall or release)."""
+        if self._sql is None:
+            return
+        sql, self._sql = self._sql, None
+        self._owner._record(self._function, sql, self._params, self._elapsed * 1000, self._rows)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+
+class _InstrumentedConnection:
+    """Connection proxy handing out instrumented cursors."""
+
+    def __init__(self, conn: sqlite3.Connection, stats: QueryStats):
+        self._conn = conn
+        self._stats = stats
+        self._cursors: List[_InstrumentedCursor] = []
+
+    def cursor(self) -> _InstrumentedCursor:
+        cursor = _InstrumentedCursor(self._conn.cursor(), self)
+        self._cursors.append(cursor)
+        return cursor
+
+    def execute(self, sql: str, parameters: Any = ()) -> _InstrumentedCursor:
+        return self.cursor().execute(sql, parameters)
+
+    def _record(self, function: str, sql: str, params: Any, elapsed_ms: float, rows: int) -> None:
+        self._stats.record(function, sql, elapsed_ms, rows)
+        if elapsed_ms >= self._stats.slow_query_ms:
+            try:
+                plan = [row[3] for row in self._conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+            except sqlite3.Error as e:
+                plan = [f"(plan unavailable: {e})"]
+            self._stats.record_slow(function, sql, params, elapsed_ms, rows, plan)
+
+    def finish(self) -> None:
+        for cursor in self._cursors:
+            cursor.finish()
+        self._cursors.clear()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._conn, name)
+
+
+_stats: Optional[QueryStats] = None
+
+
+@contextmanager
+def _instrumented(conn: sqlite3.Connection, db_path: str) -> Iterator[_InstrumentedConnection]:
+    stats = _stats
+    if stats is None:
+        yield conn
+        return
+    wrapped = _InstrumentedConnection(conn, stats)
+    try:
+        yield wrapped
+    finally:
+        wrapped.finish()
+
+
+def enable(slow_query_ms: float = SLOW_QUERY_MS, log_slow: bool = True) -> QueryStats:
+    """Start instrumenting connections borrowed from now on."""
+    global _stats
+    if _stats is None:
+        _stats = QueryStats(slow_query_ms, log_slow)
+    else:
+        _stats.slow_query_ms, _stats.log_slow = slow_query_ms, log_slow
+    db.set_connection_hook(_instrumented)
+    return _stats
+
+
+def disable() -> None:
+    global _stats
+    db.set_connection_hook(None)
+    _stats = None
+
+
+def is_enabled() -> bool:
+    return _stats is not None
+
+
+def stats(top: int = 20) -> Optional[Dict[str, Any]]:
+    """Per-function and per-statement totals plus the slow-query log (None when disabled)."""
+    return _stats.snapshot(top) if _stats is not None else None
+
+
+def reset() -> None:
+    if _stats is not None:
+        _stats.reset()
+
+
+if os.getenv("WHATSAPP_QUERY_STATS", "0") != "0":
+    enable()
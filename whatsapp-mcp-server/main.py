@@ -1,6 +1,11 @@
-from typing import List, Dict, Any, Optional
+import dataclasses
+from typing import List, Dict, Any, Optional, Union
 from mcp.server.fastmcp import FastMCP
-from whatsapp import (
+import bridge
+import db
+import instrument
+import whatsapp
+from whatsapp_async import (
     search_contacts as whatsapp_search_contacts,
     list_messages as whatsapp_list_messages,
     list_chats as whatsapp_list_chats,
@@ -9,27 +14,45 @@ from whatsapp import (
     get_contact_chats as whatsapp_get_contact_chats,
     get_last_interaction as whatsapp_get_last_interaction,
     get_message_context as whatsapp_get_message_context,
+    search_messages as whatsapp_search_messages,
+    get_new_messages as whatsapp_get_new_messages,
+    get_change_watermark as whatsapp_get_change_watermark,
     send_message as whatsapp_send_message,
     send_file as whatsapp_send_file,
     send_audio_message as whatsapp_audio_voice_message,
+    send_messages_batch as whatsapp_send_messages_batch,
     download_media as whatsapp_download_media
 )
 
 # Initialize FastMCP server
 mcp = FastMCP("whatsapp")
 
+def to_json(value: Any) -> Any:
+    """Convert results from whatsapp.py (row records, pages, contexts) into plain dicts and lists."""
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    if hasattr(value, "to_dicts"):
+        return value.to_dicts()
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return {field.name: to_json(getattr(value, field.name)) for field in dataclasses.fields(value)}
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    if isinstance(value, dict):
+        return {key: to_json(item) for key, item in value.items()}
+    return value
+
 @mcp.tool()
-def search_contacts(query: str) -> List[Dict[str, Any]]:
+async def search_contacts(query: str) -> List[Dict[str, Any]]:
     """Search WhatsApp contacts by name or phone number.
     
     Args:
         query: Search term to match against contact names or phone numbers
     """
-    contacts = whatsapp_search_contacts(query)
-    return contacts
+    contacts = await whatsapp_search_contacts(query)
+    return to_json(contacts)
 
 @mcp.tool()
-def list_messages(
+async def list_messages(
     after: Optional[str] = None,
     before: Optional[str] = None,
     sender_phone_number: Optional[str] = None,
@@ -39,8 +62,9 @@ def list_messages(
     page: int = 0,
     include_context: bool = True,
     context_before: int = 1,
-    context_after: int = 1
-) -> List[Dict[str, Any]]:
+    context_after: int = 1,
+    cursor: Optional[str] = None
+) -> Union[str, List[Dict[str, Any]], Dict[str, Any]]:
     """Get WhatsApp messages matching specified criteria with optional context.
     
     Args:
@@ -48,14 +72,15 @@ def list_messages(
         before: Optional ISO-8601 formatted string to only return messages before this date
         sender_phone_number: Optional phone number to filter messages by sender
         chat_jid: Optional chat JID to filter messages by chat
-        query: Optional search term to filter messages by content
+        query: Optional search term to filter messages by content (served from the full-text index when it exists)
         limit: Maximum number of messages to return (default 20)
         page: Page number for pagination (default 0)
-        include_context: Whether to include messages before and after matches (default True)
+        include_context: Whether to include messages before and after matches (default True). The messages are then returned as formatted text
         context_before: Number of messages to include before each match (default 1)
         context_after: Number of messages to include after each match (default 1)
+        cursor: Optional opaque cursor for stable keyset pagination. Pass "" for the first page; the result is then {items, next_cursor} and next_cursor is passed back to get the next page (page is ignored)
     """
-    messages = whatsapp_list_messages(
+    messages = await whatsapp_list_messages(
         after=after,
         before=before,
         sender_phone_number=sender_phone_number,
@@ -65,18 +90,36 @@ def list_messages(
         page=page,
         include_context=include_context,
         context_before=context_before,
-        context_after=context_after
+        context_after=context_after,
+        cursor=cursor
     )
-    return messages
+    return to_json(messages)
 
 @mcp.tool()
-def list_chats(
+async def search_messages(
+    query: str,
+    chat_jid: Optional[str] = None,
+    limit: int = 20
+) -> List[Dict[str, Any]]:
+    """Full-text search over WhatsApp messages, ranked by relevance, with highlighted snippets.
+    
+    Args:
+        query: Text to search for in message content
+        chat_jid: Optional chat JID to restrict the search to
+        limit: Maximum number of results to return (default 20)
+    """
+    results = await whatsapp_search_messages(query, chat_jid, limit)
+    return to_json(results)
+
+@mcp.tool()
+async def list_chats(
     query: Optional[str] = None,
     limit: int = 20,
     page: int = 0,
     include_last_message: bool = True,
-    sort_by: str = "last_active"
-) -> List[Dict[str, Any]]:
+    sort_by: str = "last_active",
+    cursor: Optional[str] = None
+) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get WhatsApp chats matching specified criteria.
     
     Args:
@@ -85,61 +128,65 @@ def list_chats(
         page: Page number for pagination (default 0)
         include_last_message: Whether to include the last message in each chat (default True)
         sort_by: Field to sort results by, either "last_active" or "name" (default "last_active")
+        cursor: Optional opaque cursor for stable keyset pagination. Pass "" for the first page; the result is then {items, next_cursor} and next_cursor is passed back to get the next page (page is ignored)
     """
-    chats = whatsapp_list_chats(
+    chats = await whatsapp_list_chats(
         query=query,
         limit=limit,
         page=page,
         include_last_message=include_last_message,
-        sort_by=sort_by
+        sort_by=sort_by,
+        cursor=cursor
     )
-    return chats
+    return to_json(chats)
 
 @mcp.tool()
-def get_chat(chat_jid: str, include_last_message: bool = True) -> Dict[str, Any]:
+async def get_chat(chat_jid: str, include_last_message: bool = True) -> Dict[str, Any]:
     """Get WhatsApp chat metadata by JID.
     
     Args:
         chat_jid: The JID of the chat to retrieve
         include_last_message: Whether to include the last message (default True)
     """
-    chat = whatsapp_get_chat(chat_jid, include_last_message)
-    return chat
+    chat = await whatsapp_get_chat(chat_jid, include_last_message)
+    return to_json(chat)
 
 @mcp.tool()
-def get_direct_chat_by_contact(sender_phone_number: str) -> Dict[str, Any]:
+async def get_direct_chat_by_contact(sender_phone_number: str) -> Dict[str, Any]:
     """Get WhatsApp chat metadata by sender phone number.
     
     Args:
         sender_phone_number: The phone number to search for
     """
-    chat = whatsapp_get_direct_chat_by_contact(sender_phone_number)
-    return chat
+    chat = await whatsapp_get_direct_chat_by_contact(sender_phone_number)
+    return to_json(chat)
 
 @mcp.tool()
-def get_contact_chats(jid: str, limit: int = 20, page: int = 0) -> List[Dict[str, Any]]:
+async def get_contact_chats(jid: str, limit: int = 20, page: int = 0, cursor: Optional[str] = None
+) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """Get all WhatsApp chats involving the contact.
     
     Args:
         jid: The contact's JID to search for
         limit: Maximum number of chats to return (default 20)
         page: Page number for pagination (default 0)
+        cursor: Optional opaque cursor for stable keyset pagination. Pass "" for the first page; the result is then {items, next_cursor} and next_cursor is passed back to get the next page (page is ignored)
     """
-    chats = whatsapp_get_contact_chats(jid, limit, page)
-    return chats
+    chats = await whatsapp_get_contact_chats(jid, limit, page, cursor)
+    return to_json(chats)
 
 @mcp.tool()
-def get_last_interaction(jid: str) -> str:
+async def get_last_interaction(jid: str) -> str:
     """Get most recent WhatsApp message involving the contact.
     
     Args:
         jid: The JID of the contact to search for
     """
-    message = whatsapp_get_last_interaction(jid)
+    message = await whatsapp_get_last_interaction(jid)
     return message
 
 @mcp.tool()
-def get_message_context(
+async def get_message_context(
     message_id: str,
     before: int = 5,
     after: int = 5
@@ -151,11 +198,33 @@ def get_message_context(
         before: Number of messages to include before the target message (default 5)
         after: Number of messages to include after the target message (default 5)
     """
-    context = whatsapp_get_message_context(message_id, before, after)
-    return context
+    context = await whatsapp_get_message_context(message_id, before, after)
+    return to_json(context)
+
+@mcp.tool()
+async def get_new_messages(
+    since: Optional[int] = None,
+    chat_jids: Optional[List[str]] = None,
+    limit: int = 100
+) -> Dict[str, Any]:
+    """Get WhatsApp messages that arrived since a previous call, oldest first.
+    
+    Args:
+        since: Watermark returned by a previous call. Omit it to get the current watermark without any messages
+        chat_jids: Optional list of chat JIDs to restrict the feed to
+        limit: Maximum number of messages to return (default 100)
+    
+    Returns:
+        A dictionary with the new messages and the watermark to pass as `since` next time
+    """
+    if since is None:
+        return {"messages": [], "watermark": await whatsapp_get_change_watermark()}
+    
+    messages, watermark = await whatsapp_get_new_messages(since, chat_jids, limit)
+    return {"messages": to_json(messages), "watermark": watermark}
 
 @mcp.tool()
-def send_message(
+async def send_message(
     recipient: str,
     message: str
 ) -> Dict[str, Any]:
@@ -177,14 +246,14 @@ def send_message(
         }
     
     # Call the whatsapp_send_message function with the unified recipient parameter
-    success, status_message = whatsapp_send_message(recipient, message)
+    success, status_message = await whatsapp_send_message(recipient, message)
     return {
         "success": success,
         "message": status_message
     }
 
 @mcp.tool()
-def send_file(recipient: str, media_path: str) -> Dict[str, Any]:
+async def send_file(recipient: str, media_path: str) -> Dict[str, Any]:
     """Send a file such as a picture, raw audio, video or document via WhatsApp to the specified recipient. For group messages use the JID.
     
     Args:
@@ -197,14 +266,14 @@ def send_file(recipient: str, media_path: str) -> Dict[str, Any]:
     """
     
     # Call the whatsapp_send_file function
-    success, status_message = whatsapp_send_file(recipient, media_path)
+    success, status_message = await whatsapp_send_file(recipient, media_path)
     return {
         "success": success,
         "message": status_message
     }
 
 @mcp.tool()
-def send_audio_message(recipient: str, media_path: str) -> Dict[str, Any]:
+async def send_audio_message(recipient: str, media_path: str) -> Dict[str, Any]:
     """Send any audio file as a WhatsApp audio message to the specified recipient. For group messages use the JID. If it errors due to ffmpeg not being installed, use send_file instead.
     
     Args:
@@ -215,14 +284,79 @@ def send_audio_message(recipient: str, media_path: str) -> Dict[str, Any]:
     Returns:
         A dictionary containing success status and a status message
     """
-    success, status_message = whatsapp_audio_voice_message(recipient, media_path)
+    success, status_message = await whatsapp_audio_voice_message(recipient, media_path)
     return {
         "success": success,
         "message": status_message
     }
 
 @mcp.tool()
-def download_media(message_id: str, chat_jid: str) -> Dict[str, Any]:
+async def send_messages_batch(
+    recipients: List[str],
+    message: str,
+    max_concurrency: int = whatsapp.SEND_BATCH_CONCURRENCY,
+    rate_limit: Optional[float] = whatsapp.SEND_BATCH_RATE
+) -> Dict[str, Any]:
+    """Send the same WhatsApp message to many people or groups at once.
+    
+    The rate limit dominates how long a large batch takes: at the default 5
+    per second, 500 recipients take about 100 seconds. It is kept low on
+    purpose, since WhatsApp may flag accounts that send many messages in a
+    short time. Raise it (or pass 0) only for small batches or recipients who
+    expect the message.
+    
+    Args:
+        recipients: Phone numbers with country code but no + or other symbols, or JIDs
+                 (e.g., "123456789@s.whatsapp.net" or a group JID like "123456789@g.us"). Duplicates are sent to once.
+        message: The message text to send
+        max_concurrency: How many sends may be in flight at once (default 4)
+        rate_limit: Maximum sends started per second, 0 for no limit (default 5; see above before raising it)
+    
+    Returns:
+        A dictionary with overall success, sent and failed counts, and a success status and status message per recipient
+    """
+    try:
+        results = await whatsapp_send_messages_batch(recipients, message, max_concurrency, rate_limit)
+    except ValueError as e:
+        return {
+            "success": False,
+            "message": str(e)
+        }
+    sent = sum(1 for result in results if result.success)
+    return {
+        "success": sent == len(results),
+        "sent": sent,
+        "failed": len(results) - sent,
+        "results": to_json(results)
+    }
+
+@mcp.tool()
+async def get_performance_stats(top: int = 20, reset: bool = False) -> Dict[str, Any]:
+    """Get runtime performance statistics of the WhatsApp server, for diagnosing slow tools.
+    
+    Args:
+        top: Number of most expensive SQL statements to include (default 20)
+        reset: Clear the query statistics and slow-query log after reading them (default False)
+    
+    Returns:
+        A dictionary with query timings per function and statement plus the slow-query log (when
+        WHATSAPP_QUERY_STATS=1), connection pool, cache and bridge request statistics
+    """
+    queries = instrument.stats(top)
+    if reset:
+        instrument.reset()
+    return {
+        "queries": queries if queries is not None else {"enabled": False},
+        "connection_pools": db.pool_stats(),
+        "caches": {
+            "chats": whatsapp.CHAT_CACHE.stats(),
+            "sender_names": whatsapp.SENDER_NAME_CACHE.stats()
+        },
+        "bridge": bridge.client().stats()
+    }
+
+@mcp.tool()
+async def download_media(message_id: str, chat_jid: str) -> Dict[str, Any]:
     """Download media from a WhatsApp message and get the local file path.
     
     Args:
@@ -232,7 +366,7 @@ def download_media(message_id: str, chat_jid: str) -> Dict[str, Any]:
     Returns:
         A dictionary containing success status, a status message, and the file path if successful
     """
-    file_path = whatsapp_download_media(message_id, chat_jid)
+    file_path = await whatsapp_download_media(message_id, chat_jid)
     
     if file_path:
         return {
@@ -0,0 +1,177 @@
+"""Token-budgeted assembly of the bot's chat completion prompts.
+
+``build_prompt`` puts the pieces of a reply prompt together in a fixed order:
+
+1. the chat's tone prompt (system message)
+2. conversation history, oldest first
+3. recent chat messages that are not already in the history
+4. the new message
+
+The first two parts change rarely between consecutive replies in a chat, so
+successive requests share a long identical prefix that the provider can cache.
+To keep it that way the history window doesn't slide by one exchange per
+reply. Its start moves in steps of ``HISTORY_STEP`` messages, counted from the
+start of the stored history, and ``trim_history`` cuts stored history in the
+same steps.
+
+Tokens are counted with tiktoken when it is installed, and estimated at four
+characters per token otherwise. When the prompt is over budget, whole steps of
+history are dropped first, then the oldest recent messages. The tone prompt
+and the new message are always kept.
+"""
+import math
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+MODEL = "gpt-4o"
+# Prompt tokens allowed per reply (the reply itself is capped separately by max_tokens)
+PROMPT_BUDGET = 2000
+MAX_HISTORY_MESSAGES = 10
+MAX_STORED_HISTORY = 24
+HISTORY_STEP = 6
+# Chat formatting around each message (role, separators), per OpenAI's counting guide
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+Messages = List[Dict[str, str]]
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str) -> Any:
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str = MODEL) -> int:
+    if tiktoken is None:
+        return math.ceil(len(text) / 4)
+    return len(_encoding(model).encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: Messages, model: str = MODEL) -> int:
+    return sum(TOKENS_PER_MESSAGE + count_tokens(m["content"], model) for m in messages) + TOKENS_PER_REPLY
+
+
+def tokenizer_name() -> str:
+    return "tiktoken" if tiktoken is not None else "chars/4"
+
+
+def trim_history(history: Messages, max_messages: int = MAX_STORED_HISTORY, step: int = HISTORY_STEP) -> Messages:
+    """Cut stored history down to ``max_messages``, in whole steps so history windows stay aligned."""
+    excess = len(history) - max_messages
+    if excess <= 0:
+        return history
+    return history[math.ceil(excess / step) * step:]
+
+
+def _key(message: Dict[str, str]) -> tuple:
+    return message["role"], " ".join(message["content"].split())
+
+
+@dataclass
+class Prompt:
+    messages: Messages
+    # Estimated prompt tokens, including the chat formatting
+    tokens: int
+    history_messages: int
+    context_messages: int
+    duplicates_removed: int = 0
+    dropped: int = 0
+    over_budget: bool = False
+    sections: Dict[str, int] = field(default_factory=dict)
+
+    def report(self) -> str:
+        parts = ", ".join(f"{name} {tokens}" for name, tokens in self.sections.items())
+        extra = ""
+        if self.duplicates_removed:
+            extra += f", {self.duplicates_removed} duplicate(s) removed"
+        if self.dropped:
+            extra += f", {self.dropped} message(s) dropped for budget"
+        if self.over_budget:
+            extra += ", over budget"
+        return f"~{self.tokens} prompt tokens ({tokenizer_name()}: {parts}){extra}"
+
+
+def build_prompt(
+    system: str,
+    history: Messages,
+    context: Messages,
+    user: str,
+    budget: int = PROMPT_BUDGET,
+    max_history: int = MAX_HISTORY_MESSAGES,
+    step: int = HISTORY_STEP,
+    model: str = MODEL
+) -> Prompt:
+    """Assemble the messages for one reply within ``budget`` prompt tokens."""
+    # Start of the history window, rounded up to a whole step
+    start = math.ceil(max(0, len(history) - max_history) / step) * step
+    window = history[start:]
+
+    seen = set()
+    for message in window:
+        seen.add(_key(message))
+        # A debounced burst is stored as one message, one line per chat message
+        for line in message["content"].splitlines():
+            seen.add(_key({"role": message["role"], "content": line}))
+    seen.add(("user", " ".join(user.split())))
+    recent: Messages = []
+    duplicates = 0
+    for message in context:
+        key = _key(message)
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        recent.append(message)
+
+    head = [{"role": "system", "content": system}]
+    tail = [{"role": "user", "content": user}]
+    fixed = count_message_tokens(head + tail, model)
+    window_tokens = [TOKENS_PER_MESSAGE + count_tokens(m["content"], model) for m in window]
+    recent_tokens = [TOKENS_PER_MESSAGE + count_tokens(m["content"], model) for m in recent]
+
+    dropped = 0
+    while window and fixed + sum(window_tokens) + sum(recent_tokens) > budget:
+        cut = min(step, len(window))
+        window, window_tokens = window[cut:], window_tokens[cut:]
+        dropped += cut
+    while recent and fixed + sum(recent_tokens) > budget:
+        recent, recent_tokens = recent[1:], recent_tokens[1:]
+        dropped += 1
+
+    total = fixed + sum(window_tokens) + sum(recent_tokens)
+    return Prompt(
+        messages=head + window + recent + tail,
+        tokens=total,
+        history_messages=len(window),
+        context_messages=len(recent),
+        duplicates_removed=duplicates,
+        dropped=dropped,
+        over_budget=total > budget,
+        sections={
+            "system": count_message_tokens(head, model) - TOKENS_PER_REPLY,
+            "history": sum(window_tokens),
+            "recent": sum(recent_tokens),
+            "message": count_message_tokens(tail, model) - TOKENS_PER_REPLY,
+        },
+    )
+
+
+def usage_report(usage: Optional[Any]) -> str:
+    """The provider's own token counts from a completion's ``usage``, if it sent any."""
+    if usage is None:
+        return ""
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details is not None else None
+    report = f"{usage.prompt_tokens} prompt / {usage.completion_tokens} completion tokens"
+    if cached:
+        report += f" ({cached} cached)"
+    return report
@@ -0,0 +1,275 @@
+"""Per-chat ordered job scheduling for the reply bot.
+
+``ReplyScheduler`` runs jobs on a pool of worker threads. Jobs for different
+chats run in parallel, so one slow completion no longer holds up every other
+chat. Jobs for the same chat run one at a time, in the order they were
+submitted.
+
+``submit_after`` is the non-blocking replacement for sleeping in a worker: a
+single timer thread keeps the delayed jobs in a heap and hands each one to its
+chat's queue when it is due. Jobs for one chat with the same due time keep
+their submission order.
+
+``Debouncer`` builds on it to collect a burst of items for a chat (several
+short messages sent in a row) and hand them over together once the chat has
+been quiet for a moment.
+
+``BackgroundRefresher`` computes slow per-chat values (the bot's tone
+profiles) on its own threads, off the reply path, from a de-duplicated queue.
+"""
+import heapq
+import itertools
+import queue
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+WORKERS = 4
+DEBOUNCE_WINDOW = 2.5
+DEBOUNCE_MAX_WAIT = 10.0
+REFRESH_WORKERS = 1
+
+Job = Tuple[Callable[..., Any], tuple]
+
+
+class ReplyScheduler:
+    """Worker pool that keeps jobs of the same chat in order."""
+
+    def __init__(self, workers: int = WORKERS):
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reply")
+        self._lock = threading.Lock()
+        # Chats with a drain task on the pool, and the jobs waiting behind it
+        self._queues: Dict[str, Deque[Job]] = {}
+        self._timers: List[Tuple[float, int, str, Job]] = []
+        self._sequence = itertools.count()
+        self._timer_wakeup = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        self._closed = False
+        self._timer_thread = threading.Thread(target=self._run_timers, name="reply-timers", daemon=True)
+        self._timer_thread.start()
+
+    def submit(self, chat_jid: str, fn: Callable[..., Any], *args: Any) -> None:
+        """Run ``fn(*args)`` after every job submitted earlier for the same chat."""
+        with self._lock:
+            self._enqueue(chat_jid, (fn, args))
+
+    def submit_after(self, delay: float, chat_jid: str, fn: Callable[..., Any], *args: Any) -> None:
+        """Like ``submit``, but the job joins its chat's queue only after ``delay`` seconds."""
+        with self._lock:
+            heapq.heappush(self._timers, (time.monotonic() + delay, next(self._sequence), chat_jid, (fn, args)))
+            self._timer_wakeup.notify()
+
+    def _enqueue(self, chat_jid: str, job: Job) -> None:
+        # Called with _lock held
+        if self._closed:
+            raise RuntimeError("ReplyScheduler is closed")
+        jobs = self._queues.get(chat_jid)
+        if jobs is None:
+            self._queues[chat_jid] = deque([job])
+            self._pool.submit(self._drain, chat_jid)
+        else:
+            jobs.append(job)
+
+    def _drain(self, chat_jid: str) -> None:
+        # Only one drain task per chat exists at a time, which is what keeps its jobs in order
+        while True:
+            with self._lock:
+                jobs = self._queues[chat_jid]
+                if not jobs:
+                    del self._queues[chat_jid]
+                    self._idle.notify_all()
+                    return
+                fn, args = jobs.popleft()
+            try:
+                fn(*args)
+            except Exception:
+                print(f"⚠️ Reply job for {chat_jid} failed:\n{traceback.format_exc()}")
+
+    def _run_timers(self) -> None:
+        with self._lock:
+            while not self._closed:
+                if not self._timers:
+                    self._timer_wakeup.wait()
+                    continue
+                due = self._timers[0][0] - time.monotonic()
+                if due > 0:
+                    self._timer_wakeup.wait(due)
+                    continue
+                _, _, chat_jid, job = heapq.heappop(self._timers)
+                self._enqueue(chat_jid, job)
+
+    def pending(self) -> int:
+        """Jobs not finished yet, including delayed ones."""
+        with self._lock:
+            return len(self._timers) + sum(len(jobs) + 1 for jobs in self._queues.values())
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every submitted and delayed job has run; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._timers or self._queues:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                # Delayed jobs don't notify when they become due, so poll while any are waiting
+                self._idle.wait(min(remaining or 0.1, 0.1) if self._timers else remaining)
+        return True
+
+    def close(self, wait: bool = True) -> None:
+        """Stop accepting jobs. With ``wait``, first run everything already submitted;
+        otherwise drop the jobs (and delayed jobs) that haven't started. Jobs
+        already running finish before this returns either way."""
+        if wait:
+            self.wait_idle()
+        with self._lock:
+            self._closed = True
+            if not wait:
+                self._timers.clear()
+                for jobs in self._queues.values():
+                    jobs.clear()
+            self._timer_wakeup.notify()
+        self._timer_thread.join()
+        self._pool.shutdown(wait=True)
+
+
+class Debouncer:
+    """Collects items per chat and passes each burst to ``handler(chat_jid, items)`` in one call.
+
+    A burst ends when no item arrived for ``window`` seconds, or ``max_wait``
+    seconds after its first item if the chat never goes quiet. The handler
+    runs as a job on the chat's scheduler queue, so bursts of one chat are
+    handled in order. A ``window`` of 0 turns debouncing off: every item is
+    its own burst.
+    """
+
+    def __init__(
+        self,
+        scheduler: ReplyScheduler,
+        handler: Callable[[str, List[Any]], Any],
+        window: float = DEBOUNCE_WINDOW,
+        max_wait: float = DEBOUNCE_MAX_WAIT
+    ):
+        self.scheduler = scheduler
+        self.handler = handler
+        self.window = window
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        # chat_jid -> (items, monotonic time of the first, number of the latest)
+        self._bursts: Dict[str, Tuple[List[Any], float, int]] = {}
+        # Numbers are never reused, so a flush left over from an earlier burst can't match a later one
+        self._numbers = itertools.count(1)
+
+    def add(self, chat_jid: str, item: Any) -> None:
+        if self.window <= 0:
+            self.scheduler.submit(chat_jid, self.handler, chat_jid, [item])
+            return
+        with self._lock:
+            items, started, _ = self._bursts.get(chat_jid, ([], time.monotonic(), 0))
+            items.append(item)
+            number = next(self._numbers)
+            self._bursts[chat_jid] = (items, started, number)
+            delay = min(self.window, max(0.0, started + self.max_wait - time.monotonic()))
+        self.scheduler.submit_after(delay, chat_jid, self._flush, chat_jid, number)
+
+    def _flush(self, chat_jid: str, number: int) -> None:
+        with self._lock:
+            burst = self._bursts.get(chat_jid)
+            if burst is None:
+                return
+            items, started, latest = burst
+            # A later item has its own flush coming, unless the burst has run out of time
+            if number != latest and time.monotonic() < started + self.max_wait:
+                return
+            del self._bursts[chat_jid]
+        self.handler(chat_jid, items)
+
+    def pending(self) -> int:
+        """Items waiting for their burst to end."""
+        with self._lock:
+            return sum(len(items) for items, _, _ in self._bursts.values())
+
+
+class BackgroundRefresher:
+    """Runs ``compute(key)`` on background threads and passes the result to ``on_result(key, value)``.
+
+    Keys are handled in the order they were requested. A key that is already
+    queued or being computed is not queued again. Normally a key can be
+    requested again once ``on_result`` returns. When ``on_result`` only hands
+    the value on to be stored later, pass ``release_on_result=False`` and call
+    ``release(key)`` once the value is stored, so requests made in between
+    don't compute it a second time.
+    """
+
+    def __init__(
+        self,
+        compute: Callable[[str], Any],
+        on_result: Callable[[str, Any], Any],
+        workers: int = REFRESH_WORKERS,
+        release_on_result: bool = True
+    ):
+        self.compute = compute
+        self.on_result = on_result
+        self.release_on_result = release_on_result
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending: set = set()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"refresher-{i}", daemon=True) for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def request(self, key: str) -> bool:
+        """Queue ``key`` unless it is already waiting; True if it was queued."""
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+        self._queue.put(key)
+        return True
+
+    def _run(self) -> None:
+        while True:
+            key = self._queue.get()
+            if key is None:
+                return
+            try:
+                self.on_result(key, self.compute(key))
+            except Exception:
+                print(f"⚠️ Background refresh for {key} failed:\n{traceback.format_exc()}")
+                self.release(key)
+            else:
+                if self.release_on_result:
+                    self.release(key)
+
+    def release(self, key: str) -> None:
+        """Let ``key`` be requested again."""
+        with self._lock:
+            self._pending.discard(key)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def close(self, wait: bool = True) -> None:
+        """Stop the threads. With ``wait``, first finish the queued keys; otherwise drop them.
+
+        Without ``wait`` a computation already running is not waited for.
+        """
+        if not wait:
+            while True:
+                try:
+                    key = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if key is not None:
+                    self.release(key)
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
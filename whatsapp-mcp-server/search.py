@@ -0,0 +1,205 @@
+"""Full-text search index for messages.db.
+
+The index lives next to the bridge's tables as two external-content FTS5
+tables (``messages_fts`` over ``messages.content`` and ``chats_fts`` over
+``chats.jid``/``chats.name``) using the trigram tokenizer, so a MATCH behaves
+like the case-insensitive ``LIKE '%query%'`` it replaces.
+
+The bridge's SQLite driver is built without FTS5, so the index can't be kept
+in sync with triggers (any trigger touching an FTS5 table would make the
+bridge's inserts fail). Instead an incremental indexer (``db.sync_messages``)
+copies new rows by rowid and records how far it got in
+``search_index_state``; queries search the index up to that watermark and
+fall back to LIKE for the unindexed tail, so results are never stale even if
+the indexer lags behind.
+
+Usage:
+    python search.py init      # create and fill the index
+    python search.py sync      # index rows added since the last run
+    python search.py watch     # keep syncing every few seconds
+    python search.py rebuild   # rebuild from scratch (cleans up replaced rows)
+    python search.py drop      # remove the index again
+"""
+import sqlite3
+import sys
+from typing import List, Optional, Tuple
+
+import db
+from db import MESSAGES_DB_PATH
+
+# Trigram matching needs at least this many characters; shorter queries use LIKE
+MIN_QUERY_LENGTH = 3
+SNIPPET_TOKENS = 16
+TABLES = ("messages_fts", "chats_fts", "search_index_state")
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS search_index_state (
+        name TEXT PRIMARY KEY,
+        last_rowid INTEGER NOT NULL DEFAULT 0,
+        row_count INTEGER NOT NULL DEFAULT 0
+    );
+
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        content,
+        content='messages',
+        content_rowid='rowid',
+        tokenize='trigram'
+    );
+
+    CREATE VIRTUAL TABLE IF NOT EXISTS chats_fts USING fts5(
+        jid,
+        name,
+        content='chats',
+        content_rowid='rowid',
+        tokenize='trigram'
+    );
+
+    INSERT OR IGNORE INTO search_index_state (name) VALUES ('messages'), ('chats');
+"""
+
+# Filter for list_messages: indexed rows via MATCH, newer rows via LIKE
+MESSAGES_MATCH_CLAUSE = """(
+    messages.rowid IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)
+    OR (
+        messages.rowid > (SELECT last_rowid FROM search_index_state WHERE name = 'messages')
+        AND LOWER(messages.content) LIKE LOWER(?)
+    )
+)"""
+
+# Filter for search_contacts/list_chats on the chats table
+CHATS_MATCH_CLAUSE = """(
+    chats.rowid IN (SELECT rowid FROM chats_fts WHERE chats_fts MATCH ?)
+    OR (
+        chats.rowid > (SELECT last_rowid FROM search_index_state WHERE name = 'chats')
+        AND (LOWER(chats.name) LIKE LOWER(?) OR LOWER(chats.jid) LIKE LOWER(?))
+    )
+)"""
+
+
+def fts_query(query: str) -> str:
+    """Quote free text as a single FTS5 phrase so operators in it are literal."""
+    return '"' + query.replace('"', '""') + '"'
+
+
+def can_use_index(db_path: str, query: Optional[str]) -> bool:
+    """Whether a search for ``query`` can be served from the FTS index."""
+    if not query or len(query) < MIN_QUERY_LENGTH:
+        return False
+    return has_search_index(db_path)
+
+
+def has_search_index(db_path: str) -> bool:
+    return db.has_tables(db_path, TABLES)
+
+
+def messages_match_params(query: str) -> Tuple[str, str]:
+    return fts_query(query), f"%{query}%"
+
+
+def chats_match_params(query: str) -> Tuple[str, str, str]:
+    return fts_query(query), f"%{query}%", f"%{query}%"
+
+
+def create_search_index(db_path: str = MESSAGES_DB_PATH) -> None:
+    """Create the FTS tables (if needed) and index everything not yet indexed."""
+    conn = db.connect_for_write(db_path)
+    try:
+        try:
+            conn.executescript(SCHEMA)
+        except sqlite3.OperationalError as e:
+            raise RuntimeError(
+                f"Could not create the search index; SQLite {sqlite3.sqlite_version} "
+                f"needs FTS5 with the trigram tokenizer (3.34+): {e}"
+            )
+        conn.commit()
+    finally:
+        conn.close()
+    db.forget_tables()
+    sync_search_index(db_path)
+
+
+def _index_messages(conn: sqlite3.Connection, after_rowid: int, last_rowid: int) -> None:
+    conn.execute("""
+        INSERT INTO messages_fts (rowid, content)
+        SELECT rowid, content FROM messages
+        WHERE rowid > ? AND rowid <= ?
+    """, (after_rowid, last_rowid))
+
+
+def sync_search_index(db_path: str = MESSAGES_DB_PATH) -> int:
+    """Index messages added since the last sync and refresh the chats index.
+
+    Returns the number of message rows indexed.
+    """
+    conn = db.connect_for_write(db_path)
+    try:
+        indexed = db.sync_messages(conn, "search_index_state", _index_messages)
+
+        # The bridge rewrites a chat row (new rowid) on every message, so the
+        # small chats index is simply rebuilt whenever the table has moved on.
+        chats_rowid, chats_count = conn.execute("SELECT COALESCE(MAX(rowid), 0), COUNT(*) FROM chats").fetchone()
+        indexed_rowid, indexed_count = conn.execute(
+            "SELECT last_rowid, row_count FROM search_index_state WHERE name = 'chats'"
+        ).fetchone()
+        if (chats_rowid, chats_count) != (indexed_rowid, indexed_count):
+            with conn:
+                conn.execute("INSERT INTO chats_fts (chats_fts) VALUES ('rebuild')")
+                conn.execute("""
+                    UPDATE search_index_state SET last_rowid = ?, row_count = ?
+                    WHERE name = 'chats'
+                """, (chats_rowid, chats_count))
+    finally:
+        conn.close()
+    return indexed
+
+
+def rebuild_search_index(db_path: str = MESSAGES_DB_PATH) -> None:
+    """Rebuild both FTS tables from scratch.
+
+    Replaced or deleted messages leave stale entries behind (they never match
+    a live row, but still take space); a rebuild drops them.
+    """
+    conn = db.connect_for_write(db_path)
+    try:
+        with conn:
+            conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+            conn.execute("INSERT INTO chats_fts (chats_fts) VALUES ('rebuild')")
+            conn.execute("""
+                UPDATE search_index_state
+                SET last_rowid = (SELECT COALESCE(MAX(rowid), 0) FROM messages),
+                    row_count = (SELECT COUNT(*) FROM messages)
+                WHERE name = 'messages'
+            """)
+            conn.execute("""
+                UPDATE search_index_state
+                SET last_rowid = (SELECT COALESCE(MAX(rowid), 0) FROM chats),
+                    row_count = (SELECT COUNT(*) FROM chats)
+                WHERE name = 'chats'
+            """)
+        conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('optimize')")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def drop_search_index(db_path: str = MESSAGES_DB_PATH) -> None:
+    conn = db.connect_for_write(db_path)
+    try:
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS messages_fts")
+            conn.execute("DROP TABLE IF EXISTS chats_fts")
+            conn.execute("DROP TABLE IF EXISTS search_index_state")
+    finally:
+        conn.close()
+    db.forget_tables()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    return db.indexer_main(
+        argv, "Search index", "Indexed",
+        create_search_index, sync_search_index, rebuild_search_index, drop_search_index
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
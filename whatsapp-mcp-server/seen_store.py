@@ -0,0 +1,174 @@
+"""Which incoming messages the bot has already handled.
+
+Replaces ``seen.json``, which was rewritten in full after every message and
+grew forever. Here each message is one primary-key insert into a small SQLite
+table (WAL journal, so an insert only appends to the log), which costs the
+same however long the bot has been running.
+
+The table stays small through TTL eviction. Ids older than ``ttl`` seconds
+(by message time) are deleted, and each chat keeps a high-water mark at the
+newest message time it evicted. Any message at or before a chat's mark counts
+as seen without a row of its own. Such messages are older than the TTL, so the
+bot would skip them as stale anyway.
+
+SQLite makes the store crash-safe: an interrupted write is rolled back when
+the file is next opened. If the file is unreadable it is moved aside and a
+fresh store is started, so the bot comes back up with nothing worse than a
+forgotten history. An existing ``seen.json`` is imported on first open.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Union
+
+SEEN_DB = "seen.db"
+LEGACY_SEEN_FILE = "seen.json"
+DEFAULT_TTL = 7 * 24 * 3600
+# Expired ids are evicted after this many inserts (and when the store opens)
+EVICT_EVERY = 1000
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS seen (
+        message_id TEXT PRIMARY KEY,
+        chat_jid TEXT NOT NULL,
+        message_time REAL NOT NULL
+    ) WITHOUT ROWID;
+
+    CREATE INDEX IF NOT EXISTS idx_seen_time ON seen (message_time);
+
+    CREATE TABLE IF NOT EXISTS high_water (
+        chat_jid TEXT PRIMARY KEY,
+        message_time REAL NOT NULL
+    ) WITHOUT ROWID;
+"""
+
+Timestamp = Union[datetime, float, None]
+
+
+def _epoch(timestamp: Timestamp) -> float:
+    if timestamp is None:
+        return time.time()
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    return float(timestamp)
+
+
+class SeenStore:
+    """Seen message ids with per-chat high-water marks. Safe to share between threads."""
+
+    def __init__(self, path: str = SEEN_DB, ttl: float = DEFAULT_TTL, legacy_path: Optional[str] = LEGACY_SEEN_FILE):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self._conn = self._open()
+        if legacy_path and os.path.exists(legacy_path):
+            self.import_json(legacy_path)
+        self.evict_expired()
+
+    def _open(self) -> sqlite3.Connection:
+        try:
+            return self._connect()
+        except sqlite3.DatabaseError as e:
+            corrupt = f"{self.path}.corrupt-{int(time.time())}"
+            print(f"⚠️ Seen store {self.path} is unreadable ({e}), moving it to {corrupt}")
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(self.path + suffix):
+                    os.replace(self.path + suffix, corrupt + suffix)
+            return self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode = WAL")
+            # A crash can lose the last few inserts but never corrupts the file
+            conn.execute("PRAGMA synchronous = NORMAL")
+            if conn.execute("PRAGMA quick_check").fetchone()[0] != "ok":
+                raise sqlite3.DatabaseError("integrity check failed")
+            conn.executescript(SCHEMA)
+        except sqlite3.DatabaseError:
+            conn.close()
+            raise
+        return conn
+
+    def is_seen(self, message_id: str, chat_jid: str, timestamp: Timestamp = None) -> bool:
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM seen WHERE message_id = ?", (message_id,)).fetchone():
+                return True
+            if timestamp is None:
+                return False
+            row = self._conn.execute(
+                "SELECT message_time FROM high_water WHERE chat_jid = ?", (chat_jid,)
+            ).fetchone()
+            return row is not None and _epoch(timestamp) <= row[0]
+
+    def add(self, message_id: str, chat_jid: str, timestamp: Timestamp = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO seen (message_id, chat_jid, message_time) VALUES (?, ?, ?)",
+                (message_id, chat_jid, _epoch(timestamp))
+            )
+            self._inserts += 1
+            evict = self._inserts % EVICT_EVERY == 0
+        if evict:
+            self.evict_expired()
+
+    def evict_expired(self) -> int:
+        """Fold ids older than the TTL into their chats' high-water marks; returns how many were evicted."""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("""
+                    INSERT INTO high_water (chat_jid, message_time)
+                    SELECT chat_jid, MAX(message_time) FROM seen
+                    WHERE message_time < ? AND chat_jid != ''
+                    GROUP BY chat_jid
+                    ON CONFLICT (chat_jid) DO UPDATE SET
+                        message_time = MAX(message_time, excluded.message_time)
+                """, (cutoff,))
+                evicted = self._conn.execute("DELETE FROM seen WHERE message_time < ?", (cutoff,)).rowcount
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return evicted
+
+    def import_json(self, path: str) -> int:
+        """Import the ids of an old ``seen.json`` and rename it so it is only imported once.
+
+        The file has no chats or times, so the ids are stored as seen now and
+        expire after one TTL.
+        """
+        try:
+            with open(path, "r") as f:
+                ids = json.load(f).get("seen", [])
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not import {path}: {e}")
+            return 0
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO seen (message_id, chat_jid, message_time) VALUES (?, '', ?)",
+                    ((message_id, now) for message_id in ids if message_id)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        os.replace(path, f"{path}.migrated")
+        print(f"Imported {len(ids)} seen ids from {path}")
+        return len(ids)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
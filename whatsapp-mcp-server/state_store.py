@@ -0,0 +1,186 @@
+"""Write-behind, per-chat persistence for the bot's state (conversation memory, tone map).
+
+Each chat's value lives in its own small JSON file under the store's
+directory, so nothing is read at startup and a change rewrites only the chat
+that changed:
+
+- ``get`` reads a chat's file the first time it is needed. Recently used
+  chats are kept in an LRU of ``cache_size`` entries, so memory stays bounded
+  however many chats the bot has seen
+- ``set`` only records the chat as dirty. A chat that changed several times
+  is written once
+- a background thread flushes the dirty chats every ``flush_interval``
+  seconds. Each one is written to a temporary file that atomically replaces
+  the chat's file
+- ``close`` (also registered with atexit) flushes what is left
+
+A crash loses at most the last ``flush_interval`` seconds of changes and never
+leaves a half-written file behind.
+
+The state used to live in single files (memory.json, tone_map.json, plus
+their ``.journal`` files from the write-behind version). Pass that file as
+``legacy_path`` and it is split into per-chat files on first open, then
+renamed to ``<file>.migrated``.
+
+Values are stored JSON-encoded: ``get`` returns a fresh copy, so callers can
+modify it and ``set`` it back without racing the flush thread.
+"""
+import atexit
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+from urllib.parse import quote
+
+from cache import LRUCache
+
+FLUSH_INTERVAL = 2.0
+CACHE_SIZE = 256
+
+
+def _write_atomic(path: str, data: str, durable: bool = True) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(data)
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _read_legacy(path: str) -> Dict[str, Any]:
+    """All chats of a single-file state: the JSON file with its journal (if any) replayed over it."""
+    with open(path, "r") as f:
+        state = json.loads(f.read() or "{}")
+    journal_path = f"{path}.journal"
+    if os.path.exists(journal_path):
+        with open(journal_path, "r") as f:
+            for line in f:
+                try:
+                    key, value = json.loads(line)
+                except ValueError:
+                    # Torn by a crash mid-write: nothing after it was flushed either
+                    break
+                state[key] = value
+    return state
+
+
+class StateStore:
+    """JSON-serialisable values by chat JID, one file per chat, persisted write-behind.
+
+    Safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        cache_size: int = CACHE_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+        legacy_path: Optional[str] = None
+    ):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+        self._cache = LRUCache(maxsize=cache_size)
+        self._lock = threading.Lock()
+        # Held for the file writes, so set() never waits for the disk
+        self._io_lock = threading.Lock()
+        # Changed since the last flush. Not part of the LRU, so a chat can't be
+        # evicted before it is written
+        self._dirty: Dict[str, str] = {}
+        if legacy_path and os.path.exists(legacy_path):
+            self.import_json(legacy_path)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"state-flush:{os.path.basename(directory)}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, quote(key, safe="@.-_") + ".json")
+
+    def _load(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), "r") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            encoded = self._dirty.get(key)
+        if encoded is None:
+            encoded = self._cache.get(key)
+        if encoded is None:
+            encoded = self._load(key)
+            if encoded is not None:
+                self._cache.set(key, encoded)
+        return json.loads(encoded) if encoded is not None else default
+
+    def set(self, key: str, value: Any) -> None:
+        encoded = json.dumps(value)
+        with self._lock:
+            self._dirty[key] = encoded
+        self._cache.set(key, encoded)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            if key in self._dirty:
+                return True
+        return key in self._cache or os.path.exists(self._path(key))
+
+    def flush(self) -> int:
+        """Write the chats changed since the last flush; returns how many were written."""
+        with self._io_lock:
+            with self._lock:
+                pending = dict(self._dirty)
+            for key, encoded in pending.items():
+                _write_atomic(self._path(key), encoded)
+                with self._lock:
+                    # Leave it dirty if it changed again while being written
+                    if self._dirty.get(key) is encoded:
+                        del self._dirty[key]
+            return len(pending)
+
+    def import_json(self, path: str) -> int:
+        """Split a single-file state into per-chat files and rename it so it is only imported once.
+
+        Chats that already have a file keep it.
+        """
+        try:
+            state = _read_legacy(path)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not import {path}: {e}")
+            return 0
+        imported = 0
+        for key, value in state.items():
+            if not os.path.exists(self._path(key)):
+                _write_atomic(self._path(key), json.dumps(value), durable=False)
+                imported += 1
+        if hasattr(os, "sync"):
+            # One sync for all files instead of an fsync per chat
+            os.sync()
+        for legacy in (path, f"{path}.journal"):
+            if os.path.exists(legacy):
+                os.replace(legacy, f"{legacy}.migrated")
+        print(f"Imported {imported} chats from {path} into {self.directory}")
+        return imported
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            dirty = len(self._dirty)
+        return {**self._cache.stats(), "dirty": dirty}
+
+    def _run(self) -> None:
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"⚠️ Could not save {self.directory}: {e}")
+
+    def close(self) -> None:
+        """Stop the flush thread and write out everything still dirty."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._thread.join()
+        self.flush()
@@ -0,0 +1,154 @@
+"""Per-chat participant summary for messages.db.
+
+``chat_participants`` has one row per (sender, chat) pair: how many messages
+that sender wrote in the chat and what their latest one was. Lookups by
+contact (get_contact_chats) read it instead of scanning every message the
+contact ever sent, so they cost O(chats) rather than O(messages). Your own
+messages are stored under your own number, so that row doubles as the chat's
+last-from-me message.
+
+The table is maintained the same way as the search index (see
+``db.sync_messages``): new messages are aggregated by rowid and
+``chat_summary_state`` records how far that got. Queries combine the summary
+with a scan of the short unsummarised tail, so results are current even if
+the indexer lags.
+
+The bridge re-stores a message it sees again under a new rowid, which the
+indexer counts twice; ``rebuild`` recomputes the counts exactly.
+
+Usage:
+    python summary.py init      # create and fill the table
+    python summary.py sync      # add messages stored since the last run
+    python summary.py watch     # keep syncing every few seconds
+    python summary.py rebuild   # recompute from scratch
+    python summary.py drop      # remove the table again
+"""
+import sqlite3
+import sys
+from typing import List, Optional
+
+import db
+from db import MESSAGES_DB_PATH
+
+TABLES = ("chat_participants", "chat_summary_state")
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS chat_summary_state (
+        name TEXT PRIMARY KEY,
+        last_rowid INTEGER NOT NULL DEFAULT 0,
+        row_count INTEGER NOT NULL DEFAULT 0
+    );
+
+    CREATE TABLE IF NOT EXISTS chat_participants (
+        sender TEXT NOT NULL,
+        chat_jid TEXT NOT NULL,
+        message_count INTEGER NOT NULL,
+        last_timestamp TIMESTAMP,
+        last_message_id TEXT,
+        last_content TEXT,
+        last_is_from_me BOOLEAN,
+        PRIMARY KEY (sender, chat_jid)
+    ) WITHOUT ROWID;
+
+    CREATE INDEX IF NOT EXISTS idx_chat_participants_chat ON chat_participants (chat_jid, last_timestamp);
+
+    INSERT OR IGNORE INTO chat_summary_state (name) VALUES ('messages');
+"""
+
+# Chats a sender has written in: summarised rows plus the not yet summarised
+# tail. The unary + keeps SQLite from using the sender index for the tail,
+# which would visit all of the sender's messages instead of the short rowid range.
+CONTACT_CHATS_CLAUSE = """c.jid IN (
+    SELECT chat_jid FROM chat_participants WHERE sender = ?
+    UNION
+    SELECT chat_jid FROM messages
+    WHERE messages.rowid > (SELECT last_rowid FROM chat_summary_state WHERE name = 'messages')
+    AND +messages.sender = ?
+)"""
+
+# Used when the summary doesn't exist
+CONTACT_CHATS_FALLBACK_CLAUSE = "c.jid IN (SELECT chat_jid FROM messages WHERE sender = ?)"
+
+# Adds the messages in a rowid range to the summary. Bare columns next to
+# MAX() take their values from the row holding the maximum.
+_SUMMARIZE = """
+    INSERT INTO chat_participants (
+        sender, chat_jid, message_count, last_timestamp, last_message_id, last_content, last_is_from_me
+    )
+    SELECT sender, chat_jid, COUNT(*), MAX(timestamp), id, content, is_from_me
+    FROM messages
+    WHERE rowid > ? AND rowid <= ? AND sender IS NOT NULL
+    GROUP BY sender, chat_jid
+    ON CONFLICT (sender, chat_jid) DO UPDATE SET
+        message_count = message_count + excluded.message_count,
+        last_message_id = CASE WHEN excluded.last_timestamp >= last_timestamp OR last_timestamp IS NULL
+            THEN excluded.last_message_id ELSE last_message_id END,
+        last_content = CASE WHEN excluded.last_timestamp >= last_timestamp OR last_timestamp IS NULL
+            THEN excluded.last_content ELSE last_content END,
+        last_is_from_me = CASE WHEN excluded.last_timestamp >= last_timestamp OR last_timestamp IS NULL
+            THEN excluded.last_is_from_me ELSE last_is_from_me END,
+        last_timestamp = CASE WHEN excluded.last_timestamp >= last_timestamp OR last_timestamp IS NULL
+            THEN excluded.last_timestamp ELSE last_timestamp END
+"""
+
+def has_summary(db_path: str) -> bool:
+    return db.has_tables(db_path, TABLES)
+
+
+def create_summary(db_path: str = MESSAGES_DB_PATH) -> None:
+    """Create the summary tables (if needed) and summarise everything not yet summarised."""
+    conn = db.connect_for_write(db_path)
+    try:
+        conn.executescript(SCHEMA)
+        conn.commit()
+    finally:
+        conn.close()
+    db.forget_tables()
+    sync_summary(db_path)
+
+
+def _summarize(conn: sqlite3.Connection, after_rowid: int, last_rowid: int) -> None:
+    conn.execute(_SUMMARIZE, (after_rowid, last_rowid))
+
+
+def sync_summary(db_path: str = MESSAGES_DB_PATH) -> int:
+    """Fold messages stored since the last sync into the summary; returns how many were added."""
+    conn = db.connect_for_write(db_path)
+    try:
+        return db.sync_messages(conn, "chat_summary_state", _summarize)
+    finally:
+        conn.close()
+
+
+def rebuild_summary(db_path: str = MESSAGES_DB_PATH) -> None:
+    """Recompute the summary from scratch, dropping double counts and deleted messages."""
+    conn = db.connect_for_write(db_path)
+    try:
+        with conn:
+            conn.execute("DELETE FROM chat_participants")
+            conn.execute("UPDATE chat_summary_state SET last_rowid = 0, row_count = 0 WHERE name = 'messages'")
+    finally:
+        conn.close()
+    sync_summary(db_path)
+
+
+def drop_summary(db_path: str = MESSAGES_DB_PATH) -> None:
+    conn = db.connect_for_write(db_path)
+    try:
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS chat_participants")
+            conn.execute("DROP TABLE IF EXISTS chat_summary_state")
+    finally:
+        conn.close()
+    db.forget_tables()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    return db.indexer_main(
+        argv, "Chat summary", "Summarised",
+        create_summary, sync_summary, rebuild_summary, drop_summary
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""The MCP tools as a client calls them, output validation included.
+
+Run with ``python -m pytest tests`` from whatsapp-mcp-server/.
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, os.path.join(HERE, "..", "benchmarks"))
+
+import gen_db  # noqa: E402
+import main  # noqa: E402
+import summary  # noqa: E402
+import whatsapp  # noqa: E402
+
+
+@pytest.fixture
+def messages_db(tmp_path, monkeypatch):
+    path = str(tmp_path / "messages.db")
+    # Enough group chats that some members wrote in several
+    gen_db.generate(path, 2000, chats=40)
+    monkeypatch.setattr(whatsapp, "MESSAGES_DB_PATH", path)
+    whatsapp.CHAT_CACHE.clear()
+    whatsapp.SENDER_NAME_CACHE.clear()
+    return path
+
+
+def call_tool(name, arguments):
+    _, structured = asyncio.run(main.mcp.call_tool(name, arguments))
+    return structured["result"]
+
+
+def read_all_pages(name, arguments):
+    pages = []
+    cursor = ""
+    while cursor is not None:
+        page = call_tool(name, {**arguments, "cursor": cursor})
+        assert set(page) == {"items", "next_cursor"}
+        pages.append(page)
+        cursor = page["next_cursor"]
+    assert pages[-1]["next_cursor"] is None
+    return [item for page in pages for item in page["items"]]
+
+
+def test_list_messages_defaults(messages_db):
+    # With context (the default) the messages come back as formatted text
+    text = call_tool("list_messages", {"limit": 2})
+    assert isinstance(text, str) and text
+    assert len(call_tool("list_messages", {"include_context": False})) == 20
+
+
+def test_list_messages_with_cursor(messages_db):
+    arguments = {"include_context": False, "limit": 7}
+    items = read_all_pages("list_messages", arguments)
+    assert len(items) == 2000
+    assert items[:7] == call_tool("list_messages", arguments)
+
+
+def test_list_chats_with_cursor(messages_db):
+    arguments = {"limit": 5}
+    items = read_all_pages("list_chats", arguments)
+    conn = sqlite3.connect(messages_db)
+    try:
+        assert len(items) == conn.execute("SELECT COUNT(*) FROM chats").fetchone()[0]
+    finally:
+        conn.close()
+    assert items[:5] == call_tool("list_chats", arguments)
+
+
+@pytest.mark.parametrize("with_summary", [False, True])
+def test_get_contact_chats_with_cursor(messages_db, with_summary):
+    if with_summary:
+        summary.create_summary(messages_db)
+    conn = sqlite3.connect(messages_db)
+    try:
+        # The member who wrote in the most chats; senders are stored as bare numbers
+        sender = conn.execute("""
+            SELECT sender FROM messages WHERE is_from_me = 0
+            GROUP BY sender ORDER BY COUNT(DISTINCT chat_jid) DESC LIMIT 1
+        """).fetchone()[0]
+        expected = {jid for jid, in conn.execute("""
+            SELECT jid FROM chats WHERE jid = ? OR jid IN (SELECT chat_jid FROM messages WHERE sender = ?)
+        """, (sender, sender))}
+    finally:
+        conn.close()
+    assert len(expected) > 1
+    arguments = {"jid": sender, "limit": 1}
+    items = read_all_pages("get_contact_chats", arguments)
+    assert len(items) == len(expected)
+    assert {chat["jid"] for chat in items} == expected
+    assert items[:1] == call_tool("get_contact_chats", arguments)
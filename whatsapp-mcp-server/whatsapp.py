@@ -1,45 +1,216 @@
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dataclasses import dataclass
-from typing import Optional, List, Tuple
+from typing import Any, Callable, Optional, List, Tuple, Dict, Iterable, Iterator, Sequence, TypeVar, Union
 import os.path
 import requests
 import json
+import base64
 import audio
+import bridge
+import db
+import search
+import summary
+from cache import LRUCache
 
-MESSAGES_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'whatsapp-bridge', 'store', 'messages.db')
+T = TypeVar("T")
+
+MESSAGES_DB_PATH = db.MESSAGES_DB_PATH
 WHATSAPP_API_BASE_URL = "http://localhost:8080/api"
 
-@dataclass
-class Message:
-    timestamp: datetime
-    sender: str
-    content: str
-    is_from_me: bool
-    chat_jid: str
-    id: str
-    chat_name: Optional[str] = None
-    media_type: Optional[str] = None
+# Sender JID -> display name, shared by everything that formats messages
+SENDER_NAME_CACHE = LRUCache(maxsize=4096, ttl=300)
+SENDER_NAME_BATCH_SIZE = 500
+# (db path, lookup, arguments) -> (data_version, rows) for the chat metadata lookups
+CHAT_CACHE = LRUCache(maxsize=1024)
+CONTEXT_BATCH_SIZE = 500
+# Chats per get_new_inbound_messages query (3 parameters each, under SQLite's old 999 limit)
+INBOUND_BATCH_SIZE = 300
+INBOUND_MAX_PER_CHAT = 100
+ITER_CHUNK_SIZE = 1000
+SEND_BATCH_CONCURRENCY = 4
+# Sends per second across a batch; WhatsApp may flag accounts that blast messages
+SEND_BATCH_RATE = 5.0
+SEND_BATCH_MAX_RECIPIENTS = 1000
 
-@dataclass
-class Chat:
-    jid: str
-    name: Optional[str]
-    last_message_time: Optional[datetime]
-    last_message: Optional[str] = None
-    last_sender: Optional[str] = None
-    last_is_from_me: Optional[bool] = None
+class _Record:
+    """Base for the row types: ``__slots__`` storage with dataclass-like repr, equality and to_dict()."""
+    __slots__ = ()
+    _fields: Tuple[str, ...] = ()
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{type(self).__name__}({values})"
+
+    def __eq__(self, other: Any) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self._fields)
+
+    __hash__ = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self._fields}
+
+
+class Message(_Record):
+    """A message row.
+
+    ``timestamp`` may be given as the string stored by the bridge; it's only
+    parsed into a datetime the first time it's read.
+    """
+    __slots__ = ("_timestamp", "sender", "content", "is_from_me", "chat_jid", "id", "chat_name", "media_type")
+    _fields = ("timestamp", "sender", "content", "is_from_me", "chat_jid", "id", "chat_name", "media_type")
+
+    def __init__(
+        self,
+        timestamp: Union[str, datetime],
+        sender: str,
+        content: str,
+        is_from_me: bool,
+        chat_jid: str,
+        id: str,
+        chat_name: Optional[str] = None,
+        media_type: Optional[str] = None
+    ):
+        self._timestamp = timestamp
+        self.sender = sender
+        self.content = content
+        self.is_from_me = is_from_me
+        self.chat_jid = chat_jid
+        self.id = id
+        self.chat_name = chat_name
+        self.media_type = media_type
+
+    @property
+    def timestamp(self) -> datetime:
+        value = self._timestamp
+        if value.__class__ is str:
+            value = self._timestamp = datetime.fromisoformat(value)
+        return value
+
+    @timestamp.setter
+    def timestamp(self, value: Union[str, datetime]) -> None:
+        self._timestamp = value
+
+    @classmethod
+    def from_row(cls, row: Sequence[Any], start: int = 0) -> "Message":
+        """Build a Message from ``row[start:start + 8]``.
+
+        The columns are expected in the order every message query selects them:
+        timestamp, sender, chat name, content, is_from_me, chat JID, id, media type.
+        """
+        message = cls.__new__(cls)
+        (message._timestamp, message.sender, message.chat_name, message.content,
+         message.is_from_me, message.chat_jid, message.id, message.media_type) = row[start:start + 8]
+        return message
+
+
+class Chat(_Record):
+    """A chat row; ``last_message_time`` is parsed lazily like Message.timestamp."""
+    __slots__ = ("jid", "name", "_last_message_time", "last_message", "last_sender", "last_is_from_me")
+    _fields = ("jid", "name", "last_message_time", "last_message", "last_sender", "last_is_from_me")
+
+    def __init__(
+        self,
+        jid: str,
+        name: Optional[str],
+        last_message_time: Union[str, datetime, None],
+        last_message: Optional[str] = None,
+        last_sender: Optional[str] = None,
+        last_is_from_me: Optional[bool] = None
+    ):
+        self.jid = jid
+        self.name = name
+        # The bridge stores an empty string for chats it never saw a message in
+        self._last_message_time = last_message_time or None
+        self.last_message = last_message
+        self.last_sender = last_sender
+        self.last_is_from_me = last_is_from_me
+
+    @property
+    def last_message_time(self) -> Optional[datetime]:
+        value = self._last_message_time
+        if value.__class__ is str:
+            value = self._last_message_time = datetime.fromisoformat(value)
+        return value
+
+    @last_message_time.setter
+    def last_message_time(self, value: Union[str, datetime, None]) -> None:
+        self._last_message_time = value or None
 
     @property
     def is_group(self) -> bool:
         """Determine if chat is a group based on JID pattern."""
         return self.jid.endswith("@g.us")
 
-@dataclass
-class Contact:
-    phone_number: str
-    name: Optional[str]
-    jid: str
+    @classmethod
+    def from_row(cls, row: Sequence[Any]) -> "Chat":
+        """Build a Chat from a (jid, name, last_message_time, last_message, last_sender, last_is_from_me) row."""
+        chat = cls.__new__(cls)
+        (chat.jid, chat.name, last_message_time, chat.last_message,
+         chat.last_sender, chat.last_is_from_me) = row[:6]
+        chat._last_message_time = last_message_time or None
+        return chat
+
+
+class Contact(_Record):
+    __slots__ = ("phone_number", "name", "jid")
+    _fields = __slots__
+
+    def __init__(self, phone_number: str, name: Optional[str], jid: str):
+        self.phone_number = phone_number
+        self.name = name
+        self.jid = jid
+
+    @classmethod
+    def from_row(cls, row: Sequence[Any]) -> "Contact":
+        """Build a Contact from a (jid, name) row."""
+        jid = row[0]
+        return cls(jid.split('@')[0], row[1], jid)
+
+
+class MessageBatch:
+    """Messages stored column by column, for scanning many rows cheaply.
+
+    Holds one list per field instead of one object per row; indexing or
+    iterating materializes Message objects on demand.
+    """
+    __slots__ = ("columns",)
+
+    def __init__(self, columns: Dict[str, List[Any]]):
+        self.columns = columns
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Sequence[Any]], start: int = 0) -> "MessageBatch":
+        names = ("timestamp", "sender", "chat_name", "content", "is_from_me", "chat_jid", "id", "media_type")
+        if not rows:
+            return cls({name: [] for name in names})
+        columns = list(zip(*rows))[start:start + 8]
+        return cls({name: list(column) for name, column in zip(names, columns)})
+
+    def __len__(self) -> int:
+        return len(self.columns["id"])
+
+    def __getitem__(self, index: int) -> Message:
+        c = self.columns
+        return Message(
+            c["timestamp"][index], c["sender"][index], c["content"][index], c["is_from_me"][index],
+            c["chat_jid"][index], c["id"][index], c["chat_name"][index], c["media_type"][index]
+        )
+
+    def __iter__(self) -> Iterator[Message]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def timestamps(self) -> List[datetime]:
+        """Parse the timestamp column."""
+        return [datetime.fromisoformat(value) for value in self.columns["timestamp"]]
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return [message.to_dict() for message in self]
+
 
 @dataclass
 class MessageContext:
@@ -47,51 +218,131 @@ class MessageContext:
     before: List[Message]
     after: List[Message]
 
-def get_sender_name(sender_jid: str) -> str:
+@dataclass
+class SearchResult:
+    message: Message
+    snippet: str
+    rank: float
+
+@dataclass
+class Page:
+    """One page of a cursor-paginated listing.
+
+    ``next_cursor`` is None once there are no more results.
+    """
+    items: Union[List[Any], MessageBatch, str]
+    next_cursor: Optional[str] = None
+
+def _encode_cursor(values: List[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str, size: int) -> Optional[List[Any]]:
+    """Decode an opaque cursor; an empty cursor means "start from the first page"."""
+    if not cursor:
+        return None
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid pagination cursor: {cursor}")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError(f"Invalid pagination cursor: {cursor}")
+    return values
+
+def _keyset_clause(columns: List[str], values: List[Any], descending: bool, nullable: bool = True) -> Tuple[str, List[Any]]:
+    """Build a WHERE clause selecting the rows after ``values`` in ``ORDER BY columns``.
+
+    All columns are sorted in the same direction and only the first one may be
+    NULL (SQLite sorts NULLs first ascending and last descending). Pass
+    ``nullable=False`` when it never is: the plain row-value comparison is a
+    single index range, while the NULL handling turns it into an OR.
+    """
+    op = "<" if descending else ">"
+    if not nullable:
+        return f"({', '.join(columns)}) {op} ({', '.join('?' for _ in columns)})", list(values)
+    first, rest = columns[0], columns[1:]
+    rest_clause = f"({', '.join(rest)}) {op} ({', '.join('?' for _ in rest)})"
+    if values[0] is None:
+        if descending:
+            return f"({first} IS NULL AND {rest_clause})", list(values[1:])
+        return f"(({first} IS NULL AND {rest_clause}) OR {first} IS NOT NULL)", list(values[1:])
+    clause = f"({', '.join(columns)}) {op} ({', '.join('?' for _ in columns)})"
+    if descending:
+        clause = f"({clause} OR {first} IS NULL)"
+    return clause, list(values)
+
+def get_sender_name(sender_jid: str) -> str:
+    return get_sender_names([sender_jid]).get(sender_jid, sender_jid)
+
+def get_sender_names(sender_jids: Iterable[str]) -> Dict[str, str]:
+    """Resolve display names for many senders at once.
+
+    Names are served from a shared in-process cache; anything not cached is
+    resolved with at most two queries per chunk of senders, no matter how
+    many there are.
+    """
+    names = {}
+    missing = []
+    for sender_jid in dict.fromkeys(sender_jids):
+        name = SENDER_NAME_CACHE.get(sender_jid)
+        if name is None:
+            missing.append(sender_jid)
+        else:
+            names[sender_jid] = name
+
+    for i in range(0, len(missing), SENDER_NAME_BATCH_SIZE):
+        chunk = missing[i:i + SENDER_NAME_BATCH_SIZE]
+        try:
+            resolved = _lookup_sender_names(chunk)
+        except sqlite3.Error as e:
+            print(f"Database error while getting sender name: {e}")
+            names.update((sender_jid, sender_jid) for sender_jid in chunk)
+            continue
+        for sender_jid, name in resolved.items():
+            SENDER_NAME_CACHE.set(sender_jid, name)
+        names.update(resolved)
+
+    return names
+
+def _lookup_sender_names(sender_jids: List[str]) -> Dict[str, str]:
+    placeholders = ", ".join("?" for _ in sender_jids)
+    with db.connection(MESSAGES_DB_PATH) as conn:
         cursor = conn.cursor()
         
         # First try matching by exact JID
-        cursor.execute("""
-            SELECT name
+        cursor.execute(f"""
+            SELECT jid, name
             FROM chats
-            WHERE jid = ?
-            LIMIT 1
-        """, (sender_jid,))
+            WHERE jid IN ({placeholders})
+        """, sender_jids)
         
-        result = cursor.fetchone()
+        names = {}
+        for jid, name in cursor.fetchall():
+            names[jid] = name or jid
         
         # If no result, try looking for the number within JIDs
-        if not result:
-            # Extract the phone number part if it's a JID
-            if '@' in sender_jid:
-                phone_part = sender_jid.split('@')[0]
-            else:
-                phone_part = sender_jid
-                
-            cursor.execute("""
-                SELECT name
+        unresolved = {}
+        for sender_jid in sender_jids:
+            if sender_jid not in names:
+                # Extract the phone number part if it's a JID
+                unresolved[sender_jid] = sender_jid.split('@')[0].lower()
+        
+        if unresolved:
+            like_clauses = " OR ".join("jid LIKE ?" for _ in unresolved)
+            cursor.execute(f"""
+                SELECT jid, name
                 FROM chats
-                WHERE jid LIKE ?
-                LIMIT 1
-            """, (f"%{phone_part}%",))
+                WHERE {like_clauses}
+            """, [f"%{phone_part}%" for phone_part in unresolved.values()])
+            candidates = cursor.fetchall()
             
-            result = cursor.fetchone()
-        
-        if result and result[0]:
-            return result[0]
-        else:
-            return sender_jid
-        
-    except sqlite3.Error as e:
-        print(f"Database error while getting sender name: {e}")
-        return sender_jid
-    finally:
-        if 'conn' in locals():
-            conn.close()
+            for sender_jid, phone_part in unresolved.items():
+                # Same pick as the old per-sender "LIKE ... LIMIT 1": first match in scan order
+                match = next((name for jid, name in candidates if phone_part in jid.lower()), None)
+                names[sender_jid] = match or sender_jid
+    
+    return names
 
-def format_message(message: Message, show_chat_info: bool = True) -> None:
+def format_message(message: Message, show_chat_info: bool = True, sender_names: Optional[Dict[str, str]] = None) -> None:
     """Print a single message with consistent formatting."""
     output = ""
     
@@ -105,7 +356,12 @@ def format_message(message: Message, show_chat_info: bool = True) -> None:
         content_prefix = f"[{message.media_type} - Message ID: {message.id} - Chat JID: {message.chat_jid}] "
     
     try:
-        sender_name = get_sender_name(message.sender) if not message.is_from_me else "Me"
+        if message.is_from_me:
+            sender_name = "Me"
+        elif sender_names is not None and message.sender in sender_names:
+            sender_name = sender_names[message.sender]
+        else:
+            sender_name = get_sender_name(message.sender)
         output += f"From: {sender_name}: {content_prefix}{message.content}\n"
     except Exception as e:
         print(f"Error formatting message: {e}")
@@ -117,10 +373,106 @@ def format_messages_list(messages: List[Message], show_chat_info: bool = True) -
         output += "No messages to display."
         return output
     
+    # Resolve every distinct sender up front instead of once per message
+    sender_names = get_sender_names(message.sender for message in messages if not message.is_from_me)
     for message in messages:
-        output += format_message(message, show_chat_info)
+        output += format_message(message, show_chat_info, sender_names)
     return output
 
+def _select_messages(
+    after: Optional[str],
+    before: Optional[str],
+    sender_phone_number: Optional[str],
+    chat_jid: Optional[str],
+    query: Optional[str],
+    limit: int,
+    page: int,
+    cursor: Optional[str],
+    oldest_first: bool = False
+) -> Tuple[List[tuple], Optional[str]]:
+    """Run the list_messages query; returns the raw rows and the next cursor (if paginating by cursor)."""
+    # Build base query
+    query_parts = ["SELECT messages.timestamp, messages.sender, chats.name, messages.content, messages.is_from_me, chats.jid, messages.id, messages.media_type FROM messages"]
+    # CROSS JOIN keeps messages as the outer loop, so the ORDER BY is served by a
+    # messages index; with few chats the planner would otherwise loop over chats
+    # and sort every matching message
+    query_parts.append("CROSS JOIN chats ON messages.chat_jid = chats.jid")
+    where_clauses = []
+    params = []
+    
+    # Add filters
+    if after:
+        try:
+            after = datetime.fromisoformat(after)
+        except ValueError:
+            raise ValueError(f"Invalid date format for 'after': {after}. Please use ISO-8601 format.")
+        
+        where_clauses.append("messages.timestamp > ?")
+        params.append(after)
+
+    if before:
+        try:
+            before = datetime.fromisoformat(before)
+        except ValueError:
+            raise ValueError(f"Invalid date format for 'before': {before}. Please use ISO-8601 format.")
+        
+        where_clauses.append("messages.timestamp < ?")
+        params.append(before)
+
+    if sender_phone_number:
+        where_clauses.append("messages.sender = ?")
+        params.append(sender_phone_number)
+        
+    if chat_jid:
+        where_clauses.append("messages.chat_jid = ?")
+        params.append(chat_jid)
+        
+    if query:
+        if search.can_use_index(MESSAGES_DB_PATH, query):
+            where_clauses.append(search.MESSAGES_MATCH_CLAUSE)
+            params.extend(search.messages_match_params(query))
+        else:
+            where_clauses.append("LOWER(messages.content) LIKE LOWER(?)")
+            params.append(f"%{query}%")
+    
+    if cursor is not None:
+        keyset = _decode_cursor(cursor, 2)
+        if keyset:
+            # The bridge always sets a message timestamp
+            clause, clause_params = _keyset_clause(
+                ["messages.timestamp", "messages.id"], keyset, descending=not oldest_first, nullable=False
+            )
+            where_clauses.append(clause)
+            params.extend(clause_params)
+        
+    if where_clauses:
+        query_parts.append("WHERE " + " AND ".join(where_clauses))
+        
+    # Add pagination
+    if cursor is not None:
+        # Fetch one extra row to know whether there is a next page
+        direction = "ASC" if oldest_first else "DESC"
+        query_parts.append(f"ORDER BY messages.timestamp {direction}, messages.id {direction}")
+        query_parts.append("LIMIT ?")
+        params.append(limit + 1)
+    else:
+        offset = page * limit
+        query_parts.append("ORDER BY messages.timestamp DESC")
+        query_parts.append("LIMIT ? OFFSET ?")
+        params.extend([limit, offset])
+    
+    with db.connection(MESSAGES_DB_PATH) as conn:
+        db_cursor = conn.cursor()
+        db_cursor.execute(" ".join(query_parts), tuple(params))
+        messages = db_cursor.fetchall()
+    
+    next_cursor = None
+    if cursor is not None and len(messages) > limit:
+        messages = messages[:limit]
+        next_cursor = _encode_cursor([messages[-1][0], messages[-1][6]])
+    return messages, next_cursor
+
+
 def list_messages(
     after: Optional[str] = None,
     before: Optional[str] = None,
@@ -131,98 +483,85 @@ def list_messages(
     page: int = 0,
     include_context: bool = True,
     context_before: int = 1,
-    context_after: int = 1
+    context_after: int = 1,
+    cursor: Optional[str] = None,
+    as_batch: bool = False
 ) -> List[Message]:
-    """Get messages matching the specified criteria with optional context."""
+    """Get messages matching the specified criteria with optional context.
+    
+    Passing ``cursor`` switches from page/offset pagination to keyset
+    pagination on (timestamp, id): use "" for the first page, then the
+    ``next_cursor`` of the returned Page. Every page costs the same and
+    pages don't shift while new messages arrive.
+    
+    With ``as_batch`` (and no context) the messages come back as a columnar
+    MessageBatch instead of a list of Message objects.
+    """
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
-        cursor = conn.cursor()
+        messages, next_cursor = _select_messages(
+            after, before, sender_phone_number, chat_jid, query, limit, page, cursor
+        )
         
-        # Build base query
-        query_parts = ["SELECT messages.timestamp, messages.sender, chats.name, messages.content, messages.is_from_me, chats.jid, messages.id, messages.media_type FROM messages"]
-        query_parts.append("JOIN chats ON messages.chat_jid = chats.jid")
-        where_clauses = []
-        params = []
-        
-        # Add filters
-        if after:
-            try:
-                after = datetime.fromisoformat(after)
-            except ValueError:
-                raise ValueError(f"Invalid date format for 'after': {after}. Please use ISO-8601 format.")
-            
-            where_clauses.append("messages.timestamp > ?")
-            params.append(after)
-
-        if before:
-            try:
-                before = datetime.fromisoformat(before)
-            except ValueError:
-                raise ValueError(f"Invalid date format for 'before': {before}. Please use ISO-8601 format.")
-            
-            where_clauses.append("messages.timestamp < ?")
-            params.append(before)
-
-        if sender_phone_number:
-            where_clauses.append("messages.sender = ?")
-            params.append(sender_phone_number)
-            
-        if chat_jid:
-            where_clauses.append("messages.chat_jid = ?")
-            params.append(chat_jid)
-            
-        if query:
-            where_clauses.append("LOWER(messages.content) LIKE LOWER(?)")
-            params.append(f"%{query}%")
-            
-        if where_clauses:
-            query_parts.append("WHERE " + " AND ".join(where_clauses))
-            
-        # Add pagination
-        offset = page * limit
-        query_parts.append("ORDER BY messages.timestamp DESC")
-        query_parts.append("LIMIT ? OFFSET ?")
-        params.extend([limit, offset])
+        if as_batch and not include_context:
+            batch = MessageBatch.from_rows(messages)
+            return Page(items=batch, next_cursor=next_cursor) if cursor is not None else batch
         
-        cursor.execute(" ".join(query_parts), tuple(params))
-        messages = cursor.fetchall()
-        
-        result = []
-        for msg in messages:
-            message = Message(
-                timestamp=datetime.fromisoformat(msg[0]),
-                sender=msg[1],
-                chat_name=msg[2],
-                content=msg[3],
-                is_from_me=msg[4],
-                chat_jid=msg[5],
-                id=msg[6],
-                media_type=msg[7]
-            )
-            result.append(message)
+        result = [Message.from_row(msg) for msg in messages]
             
         if include_context and result:
-            # Add context for each message
+            # Add context for each message, fetching every window in one go
+            contexts = get_message_contexts([msg.id for msg in result], context_before, context_after)
             messages_with_context = []
             for msg in result:
-                context = get_message_context(msg.id, context_before, context_after)
+                context = contexts.get(msg.id)
+                if context is None:
+                    raise ValueError(f"Message with ID {msg.id} not found")
                 messages_with_context.extend(context.before)
                 messages_with_context.append(context.message)
                 messages_with_context.extend(context.after)
             
-            return format_messages_list(messages_with_context, show_chat_info=True)
+            formatted = format_messages_list(messages_with_context, show_chat_info=True)
+            return Page(items=formatted, next_cursor=next_cursor) if cursor is not None else formatted
             
         # Format and display messages without context
         #return format_messages_list(result, show_chat_info=True)    
+        if cursor is not None:
+            return Page(items=result, next_cursor=next_cursor)
         return result
     
         
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         return []
-    finally:
-        if 'conn' in locals():
-            conn.close()
+
+
+def iter_messages(
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    sender_phone_number: Optional[str] = None,
+    chat_jid: Optional[str] = None,
+    query: Optional[str] = None,
+    oldest_first: bool = False,
+    chunk_size: int = ITER_CHUNK_SIZE
+) -> Iterator[Message]:
+    """Stream every message matching the list_messages filters.
+    
+    Rows are read ``chunk_size`` at a time with keyset pagination on
+    (timestamp, id), so memory stays bounded however many messages match.
+    The connection goes back to the pool between chunks: a single cursor
+    held open for a whole export would keep a read lock on messages.db
+    and block the bridge's writes for as long as it ran.
+    
+    Unlike list_messages, database errors are raised rather than ending
+    the stream early.
+    """
+    cursor = ""
+    while cursor is not None:
+        rows, cursor = _select_messages(
+            after, before, sender_phone_number, chat_jid, query, chunk_size, 0, cursor, oldest_first
+        )
+        for row in rows:
+            yield Message.from_row(row)
 
 
 def get_message_context(
@@ -232,90 +571,182 @@ def get_message_context(
 ) -> MessageContext:
     """Get context around a specific message."""
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
-        cursor = conn.cursor()
-        
-        # Get the target message first
-        cursor.execute("""
-            SELECT messages.timestamp, messages.sender, chats.name, messages.content, messages.is_from_me, chats.jid, messages.id, messages.chat_jid, messages.media_type
-            FROM messages
-            JOIN chats ON messages.chat_jid = chats.jid
-            WHERE messages.id = ?
-        """, (message_id,))
-        msg_data = cursor.fetchone()
-        
-        if not msg_data:
-            raise ValueError(f"Message with ID {message_id} not found")
-            
-        target_message = Message(
-            timestamp=datetime.fromisoformat(msg_data[0]),
-            sender=msg_data[1],
-            chat_name=msg_data[2],
-            content=msg_data[3],
-            is_from_me=msg_data[4],
-            chat_jid=msg_data[5],
-            id=msg_data[6],
-            media_type=msg_data[8]
-        )
-        
-        # Get messages before
-        cursor.execute("""
-            SELECT messages.timestamp, messages.sender, chats.name, messages.content, messages.is_from_me, chats.jid, messages.id, messages.media_type
-            FROM messages
-            JOIN chats ON messages.chat_jid = chats.jid
-            WHERE messages.chat_jid = ? AND messages.timestamp < ?
-            ORDER BY messages.timestamp DESC
-            LIMIT ?
-        """, (msg_data[7], msg_data[0], before))
-        
-        before_messages = []
-        for msg in cursor.fetchall():
-            before_messages.append(Message(
-                timestamp=datetime.fromisoformat(msg[0]),
-                sender=msg[1],
-                chat_name=msg[2],
-                content=msg[3],
-                is_from_me=msg[4],
-                chat_jid=msg[5],
-                id=msg[6],
-                media_type=msg[7]
-            ))
-        
-        # Get messages after
-        cursor.execute("""
-            SELECT messages.timestamp, messages.sender, chats.name, messages.content, messages.is_from_me, chats.jid, messages.id, messages.media_type
-            FROM messages
-            JOIN chats ON messages.chat_jid = chats.jid
-            WHERE messages.chat_jid = ? AND messages.timestamp > ?
-            ORDER BY messages.timestamp ASC
-            LIMIT ?
-        """, (msg_data[7], msg_data[0], after))
-        
-        after_messages = []
-        for msg in cursor.fetchall():
-            after_messages.append(Message(
-                timestamp=datetime.fromisoformat(msg[0]),
-                sender=msg[1],
-                chat_name=msg[2],
-                content=msg[3],
-                is_from_me=msg[4],
-                chat_jid=msg[5],
-                id=msg[6],
-                media_type=msg[7]
-            ))
-        
-        return MessageContext(
-            message=target_message,
-            before=before_messages,
-            after=after_messages
-        )
-        
+        context = get_message_contexts([message_id], before, after).get(message_id)
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         raise
-    finally:
-        if 'conn' in locals():
-            conn.close()
+    
+    if context is None:
+        raise ValueError(f"Message with ID {message_id} not found")
+    return context
+
+
+def get_message_contexts(
+    message_ids: List[str],
+    before: int = 5,
+    after: int = 5
+) -> Dict[str, MessageContext]:
+    """Get context around many messages with a single query per chunk of IDs.
+    
+    Args:
+        message_ids: IDs of the messages to get context for
+        before: Number of messages to include before each target message (default 5)
+        after: Number of messages to include after each target message (default 5)
+    
+    Returns:
+        A dict mapping each found message ID to its MessageContext. Windows are
+        ordered like get_message_context: ``before`` newest first, ``after``
+        oldest first. Messages shared by overlapping windows are built once.
+    """
+    message_ids = list(dict.fromkeys(message_ids))
+    contexts = {}
+    messages_by_rowid = {}
+    
+    for i in range(0, len(message_ids), CONTEXT_BATCH_SIZE):
+        chunk = message_ids[i:i + CONTEXT_BATCH_SIZE]
+        requested = ", ".join("(?, ?)" for _ in chunk)
+        params = [value for position, message_id in enumerate(chunk) for value in (position, message_id)]
+        
+        with db.connection(MESSAGES_DB_PATH) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                WITH requested(position, id) AS (VALUES {requested}),
+                hits AS (
+                    SELECT r.position, m.rowid AS hit_rowid, m.chat_jid, m.timestamp AS ts
+                    FROM requested r
+                    JOIN messages m ON m.rowid = (
+                        SELECT messages.rowid
+                        FROM messages
+                        JOIN chats ON messages.chat_jid = chats.jid
+                        WHERE messages.id = r.id
+                        LIMIT 1
+                    )
+                ),
+                windows(position, role, msg_rowid) AS (
+                    SELECT position, 0, hit_rowid FROM hits
+                    UNION ALL
+                    SELECT h.position, -1, m.rowid
+                    FROM hits h
+                    JOIN messages m ON m.rowid IN (
+                        SELECT rowid FROM messages
+                        WHERE chat_jid = h.chat_jid AND timestamp < h.ts
+                        ORDER BY timestamp DESC
+                        LIMIT {int(before)}
+                    )
+                    UNION ALL
+                    SELECT h.position, 1, m.rowid
+                    FROM hits h
+                    JOIN messages m ON m.rowid IN (
+                        SELECT rowid FROM messages
+                        WHERE chat_jid = h.chat_jid AND timestamp > h.ts
+                        ORDER BY timestamp ASC
+                        LIMIT {int(after)}
+                    )
+                )
+                SELECT w.position, w.role, w.msg_rowid, m.timestamp, m.sender, c.name, m.content, m.is_from_me, c.jid, m.id, m.media_type
+                FROM windows w
+                JOIN messages m ON m.rowid = w.msg_rowid
+                JOIN chats c ON m.chat_jid = c.jid
+                ORDER BY w.position, w.role, CASE WHEN w.role < 0 THEN m.timestamp END DESC, m.timestamp ASC
+            """, params)
+            rows = cursor.fetchall()
+        
+        windows = {}
+        for row in rows:
+            position, role, rowid = row[:3]
+            message = messages_by_rowid.get(rowid)
+            if message is None:
+                message = messages_by_rowid[rowid] = Message.from_row(row, 3)
+            
+            window = windows.setdefault(position, {-1: [], 0: [], 1: []})
+            window[role].append(message)
+        
+        for position, window in windows.items():
+            contexts[chunk[position]] = MessageContext(
+                message=window[0][0],
+                before=window[-1],
+                after=window[1]
+            )
+    
+    return contexts
+
+
+def _select_chats(
+    query: Optional[str],
+    limit: int,
+    page: int,
+    include_last_message: bool,
+    sort_by: str,
+    cursor: Optional[str]
+) -> Tuple[List[tuple], Optional[str]]:
+    """Run the list_chats query; returns the raw rows and the next cursor (if paginating by cursor)."""
+    use_search_index = search.can_use_index(MESSAGES_DB_PATH, query)
+
+    # Build base query
+    query_parts = ["""
+        SELECT 
+            chats.jid,
+            chats.name,
+            chats.last_message_time,
+            messages.content as last_message,
+            messages.sender as last_sender,
+            messages.is_from_me as last_is_from_me
+        FROM chats
+    """]
+
+    if include_last_message:
+        query_parts.append("""
+            LEFT JOIN messages ON chats.jid = messages.chat_jid 
+            AND chats.last_message_time = messages.timestamp
+        """)
+    
+    where_clauses = []
+    params = []
+
+    if query:
+        if use_search_index:
+            where_clauses.append(search.CHATS_MATCH_CLAUSE)
+            params.extend(search.chats_match_params(query))
+        else:
+            where_clauses.append("(LOWER(chats.name) LIKE LOWER(?) OR chats.jid LIKE ?)")
+            params.extend([f"%{query}%", f"%{query}%"])
+    
+    sort_column = "chats.last_message_time" if sort_by == "last_active" else "chats.name"
+    descending = sort_by == "last_active"
+    if cursor is not None:
+        keyset = _decode_cursor(cursor, 2)
+        if keyset:
+            clause, clause_params = _keyset_clause([sort_column, "chats.jid"], keyset, descending)
+            where_clauses.append(clause)
+            params.extend(clause_params)
+    
+    if where_clauses:
+        query_parts.append("WHERE " + " AND ".join(where_clauses))
+    
+    # Add sorting
+    order_by = "chats.last_message_time DESC" if sort_by == "last_active" else "chats.name"
+    if cursor is not None:
+        order_by += ", chats.jid DESC" if descending else ", chats.jid"
+    query_parts.append(f"ORDER BY {order_by}")
+
+    # Add pagination
+    if cursor is not None:
+        query_parts.append("LIMIT ?")
+        params.append(limit + 1)
+    else:
+        offset = (page ) * limit
+        query_parts.append("LIMIT ? OFFSET ?")
+        params.extend([limit, offset])
+
+    with db.connection(MESSAGES_DB_PATH) as conn:
+        chats = conn.execute(" ".join(query_parts), tuple(params)).fetchall()
+
+    next_cursor = None
+    if cursor is not None and len(chats) > limit:
+        chats = chats[:limit]
+        last = chats[-1]
+        next_cursor = _encode_cursor([last[2] if descending else last[1], last[0]])
+    return chats, next_cursor
 
 
 def list_chats(
@@ -323,223 +754,434 @@ def list_chats(
     limit: int = 20,
     page: int = 0,
     include_last_message: bool = True,
-    sort_by: str = "last_active"
+    sort_by: str = "last_active",
+    cursor: Optional[str] = None
 ) -> List[Chat]:
-    """Get chats matching the specified criteria."""
+    """Get chats matching the specified criteria.
+    
+    Passing ``cursor`` switches to keyset pagination and returns a Page
+    (see list_messages).
+    """
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
-        cursor = conn.cursor()
+        chats, next_cursor = _read_through(
+            ("list_chats", query, limit, page, include_last_message, sort_by, cursor),
+            lambda: _select_chats(query, limit, page, include_last_message, sort_by, cursor)
+        )
+        result = [Chat.from_row(chat_data) for chat_data in chats]
         
-        # Build base query
-        query_parts = ["""
-            SELECT 
-                chats.jid,
-                chats.name,
-                chats.last_message_time,
-                messages.content as last_message,
-                messages.sender as last_sender,
-                messages.is_from_me as last_is_from_me
-            FROM chats
-        """]
+        if cursor is not None:
+            return Page(items=result, next_cursor=next_cursor)
+        return result
         
-        if include_last_message:
-            query_parts.append("""
-                LEFT JOIN messages ON chats.jid = messages.chat_jid 
-                AND chats.last_message_time = messages.timestamp
-            """)
-            
-        where_clauses = []
-        params = []
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        return []
+
+
+def iter_chats(
+    query: Optional[str] = None,
+    include_last_message: bool = True,
+    sort_by: str = "last_active",
+    chunk_size: int = ITER_CHUNK_SIZE
+) -> Iterator[Chat]:
+    """Stream every chat matching the list_chats filters, ``chunk_size`` rows at a time (see iter_messages)."""
+    cursor = ""
+    while cursor is not None:
+        rows, cursor = _select_chats(query, chunk_size, 0, include_last_message, sort_by, cursor)
+        for row in rows:
+            yield Chat.from_row(row)
+
+
+def search_contacts(query: str) -> List[Contact]:
+    """Search contacts by name or phone number."""
+    use_search_index = search.can_use_index(MESSAGES_DB_PATH, query)
+    try:
+        with db.connection(MESSAGES_DB_PATH) as conn:
+            cursor = conn.cursor()
         
-        if query:
-            where_clauses.append("(LOWER(chats.name) LIKE LOWER(?) OR chats.jid LIKE ?)")
-            params.extend([f"%{query}%", f"%{query}%"])
-            
-        if where_clauses:
-            query_parts.append("WHERE " + " AND ".join(where_clauses))
-            
-        # Add sorting
-        order_by = "chats.last_message_time DESC" if sort_by == "last_active" else "chats.name"
-        query_parts.append(f"ORDER BY {order_by}")
+            if use_search_index:
+                match_clause = search.CHATS_MATCH_CLAUSE
+                params = search.chats_match_params(query)
+            else:
+                # Split query into characters to support partial matching
+                search_pattern = '%' +query + '%'
+                match_clause = "(LOWER(chats.name) LIKE LOWER(?) OR LOWER(chats.jid) LIKE LOWER(?))"
+                params = (search_pattern, search_pattern)
+        
+            cursor.execute(f"""
+                SELECT DISTINCT 
+                    jid,
+                    name
+                FROM chats
+                WHERE 
+                    {match_clause}
+                    AND jid NOT LIKE '%@g.us'
+                ORDER BY name, jid
+                LIMIT 50
+            """, params)
         
-        # Add pagination
-        offset = (page ) * limit
-        query_parts.append("LIMIT ? OFFSET ?")
-        params.extend([limit, offset])
+            contacts = cursor.fetchall()
         
-        cursor.execute(" ".join(query_parts), tuple(params))
-        chats = cursor.fetchall()
-        
-        result = []
-        for chat_data in chats:
-            chat = Chat(
-                jid=chat_data[0],
-                name=chat_data[1],
-                last_message_time=datetime.fromisoformat(chat_data[2]) if chat_data[2] else None,
-                last_message=chat_data[3],
-                last_sender=chat_data[4],
-                last_is_from_me=chat_data[5]
-            )
-            result.append(chat)
-            
-        return result
+            return [Contact.from_row(contact_data) for contact_data in contacts]
         
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         return []
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 
-def search_contacts(query: str) -> List[Contact]:
-    """Search contacts by name or phone number."""
+def search_messages(
+    query: str,
+    chat_jid: Optional[str] = None,
+    limit: int = 20
+) -> List[SearchResult]:
+    """Full-text search over message content, best matches first.
+    
+    Uses the FTS index when it exists (see search.py) and falls back to a
+    LIKE scan ordered by recency when it doesn't. Messages the indexer
+    hasn't reached yet are found with LIKE too; they have no rank and come
+    first, most recently stored first.
+    
+    Args:
+        query: Text to search for
+        chat_jid: Optional chat JID to restrict the search to
+        limit: Maximum number of results to return (default 20)
+    """
+    use_search_index = search.can_use_index(MESSAGES_DB_PATH, query)
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
-        cursor = conn.cursor()
+        chat_clause = "AND messages.chat_jid = ?" if chat_jid else ""
+        chat_params = [chat_jid] if chat_jid else []
+        rows = []
+        if use_search_index:
+            tail_sql = f"""
+                SELECT messages.timestamp, messages.sender, chats.name, messages.content, messages.is_from_me, chats.jid, messages.id, messages.media_type,
+                    messages.content, 0.0
+                FROM messages
+                CROSS JOIN chats ON messages.chat_jid = chats.jid
+                WHERE messages.rowid > (SELECT last_rowid FROM search_index_state WHERE name = 'messages')
+                AND LOWER(messages.content) LIKE LOWER(?) {chat_clause}
+                ORDER BY messages.rowid DESC
+                LIMIT ?
+            """
+            with db.connection(MESSAGES_DB_PATH) as conn:
+                rows = conn.execute(tail_sql, [f"%{query}%", *chat_params, limit]).fetchall()
+            sql = f"""
+                SELECT messages.timestamp, messages.sender, chats.name, messages.content, messages.is_from_me, chats.jid, messages.id, messages.media_type,
+                    snippet(messages_fts, 0, '[', ']', '...', {search.SNIPPET_TOKENS}), bm25(messages_fts)
+                FROM messages_fts
+                JOIN messages ON messages.rowid = messages_fts.rowid
+                JOIN chats ON messages.chat_jid = chats.jid
+                WHERE messages_fts MATCH ? {chat_clause}
+                ORDER BY bm25(messages_fts)
+                LIMIT ?
+            """
+            params = [search.fts_query(query)]
+        else:
+            sql = f"""
+                SELECT messages.timestamp, messages.sender, chats.name, messages.content, messages.is_from_me, chats.jid, messages.id, messages.media_type,
+                    messages.content, 0.0
+                FROM messages
+                JOIN chats ON messages.chat_jid = chats.jid
+                WHERE LOWER(messages.content) LIKE LOWER(?) {chat_clause}
+                ORDER BY messages.timestamp DESC
+                LIMIT ?
+            """
+            params = [f"%{query}%"]
+        params.extend(chat_params)
+        params.append(limit - len(rows))
         
-        # Split query into characters to support partial matching
-        search_pattern = '%' +query + '%'
+        if len(rows) < limit:
+            with db.connection(MESSAGES_DB_PATH) as conn:
+                cursor = conn.cursor()
+                cursor.execute(sql, params)
+                rows.extend(cursor.fetchall())
         
-        cursor.execute("""
-            SELECT DISTINCT 
-                jid,
-                name
-            FROM chats
-            WHERE 
-                (LOWER(name) LIKE LOWER(?) OR LOWER(jid) LIKE LOWER(?))
-                AND jid NOT LIKE '%@g.us'
-            ORDER BY name, jid
-            LIMIT 50
-        """, (search_pattern, search_pattern))
-        
-        contacts = cursor.fetchall()
-        
-        result = []
-        for contact_data in contacts:
-            contact = Contact(
-                phone_number=contact_data[0].split('@')[0],
-                name=contact_data[1],
-                jid=contact_data[0]
-            )
-            result.append(contact)
-            
-        return result
+        return [SearchResult(message=Message.from_row(msg), snippet=msg[8], rank=msg[9]) for msg in rows]
         
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         return []
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 
-def get_contact_chats(jid: str, limit: int = 20, page: int = 0) -> List[Chat]:
-    """Get all chats involving the contact.
+def get_contact_chats(jid: str, limit: int = 20, page: int = 0, cursor: Optional[str] = None) -> List[Chat]:
+    """Get all chats involving the contact: the chat with that JID and every chat they wrote in.
+    
+    Each chat appears once, with its latest message. When the chat_participants
+    summary exists (see summary.py) the lookup costs O(chats) instead of
+    scanning every message the contact sent.
     
     Args:
         jid: The contact's JID to search for
         limit: Maximum number of chats to return (default 20)
         page: Page number for pagination (default 0)
+        cursor: Optional keyset pagination cursor; returns a Page (see list_messages)
     """
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT DISTINCT
-                c.jid,
-                c.name,
-                c.last_message_time,
-                m.content as last_message,
-                m.sender as last_sender,
-                m.is_from_me as last_is_from_me
-            FROM chats c
-            JOIN messages m ON c.jid = m.chat_jid
-            WHERE m.sender = ? OR c.jid = ?
-            ORDER BY c.last_message_time DESC
-            LIMIT ? OFFSET ?
-        """, (jid, jid, limit, page * limit))
-        
-        chats = cursor.fetchall()
-        
-        result = []
-        for chat_data in chats:
-            chat = Chat(
-                jid=chat_data[0],
-                name=chat_data[1],
-                last_message_time=datetime.fromisoformat(chat_data[2]) if chat_data[2] else None,
-                last_message=chat_data[3],
-                last_sender=chat_data[4],
-                last_is_from_me=chat_data[5]
-            )
-            result.append(chat)
-            
+        if summary.has_summary(MESSAGES_DB_PATH):
+            where_clause = f"(c.jid = ? OR {summary.CONTACT_CHATS_CLAUSE})"
+            params = [jid, jid, jid]
+        else:
+            where_clause = f"(c.jid = ? OR {summary.CONTACT_CHATS_FALLBACK_CLAUSE})"
+            params = [jid, jid]
+        if cursor is not None:
+            keyset = _decode_cursor(cursor, 2)
+            if keyset:
+                clause, clause_params = _keyset_clause(["c.last_message_time", "c.jid"], keyset, descending=True)
+                where_clause = f"{where_clause} AND {clause}"
+                params.extend(clause_params)
+            pagination = "ORDER BY c.last_message_time DESC, c.jid DESC LIMIT ?"
+            params.append(limit + 1)
+        else:
+            pagination = "ORDER BY c.last_message_time DESC LIMIT ? OFFSET ?"
+            params.extend([limit, page * limit])
+        
+        with db.connection(MESSAGES_DB_PATH) as conn:
+            db_cursor = conn.cursor()
+        
+            db_cursor.execute(f"""
+                SELECT
+                    c.jid,
+                    c.name,
+                    c.last_message_time,
+                    m.content as last_message,
+                    m.sender as last_sender,
+                    m.is_from_me as last_is_from_me
+                FROM chats c
+                LEFT JOIN messages m ON c.jid = m.chat_jid
+                    AND c.last_message_time = m.timestamp
+                WHERE {where_clause}
+                {pagination}
+            """, params)
+        
+            chats = db_cursor.fetchall()
+        
+        next_cursor = None
+        if cursor is not None and len(chats) > limit:
+            chats = chats[:limit]
+            last = chats[-1]
+            next_cursor = _encode_cursor([last[2], last[0]])
+        
+        result = [Chat.from_row(chat_data) for chat_data in chats]
+        
+        if cursor is not None:
+            return Page(items=result, next_cursor=next_cursor)
         return result
         
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         return []
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 
 def get_last_interaction(jid: str) -> str:
     """Get most recent message involving the contact."""
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
-        cursor = conn.cursor()
+        with db.connection(MESSAGES_DB_PATH) as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT 
-                m.timestamp,
-                m.sender,
-                c.name,
-                m.content,
-                m.is_from_me,
-                c.jid,
-                m.id,
-                m.media_type
-            FROM messages m
-            JOIN chats c ON m.chat_jid = c.jid
-            WHERE m.sender = ? OR c.jid = ?
-            ORDER BY m.timestamp DESC
-            LIMIT 1
-        """, (jid, jid))
+            cursor.execute("""
+                SELECT 
+                    m.timestamp,
+                    m.sender,
+                    c.name,
+                    m.content,
+                    m.is_from_me,
+                    c.jid,
+                    m.id,
+                    m.media_type
+                FROM messages m
+                JOIN chats c ON m.chat_jid = c.jid
+                WHERE m.sender = ? OR m.chat_jid = ?
+                ORDER BY m.timestamp DESC
+                LIMIT 1
+            """, (jid, jid))
         
-        msg_data = cursor.fetchone()
+            msg_data = cursor.fetchone()
         
         if not msg_data:
             return None
-            
-        message = Message(
-            timestamp=datetime.fromisoformat(msg_data[0]),
-            sender=msg_data[1],
-            chat_name=msg_data[2],
-            content=msg_data[3],
-            is_from_me=msg_data[4],
-            chat_jid=msg_data[5],
-            id=msg_data[6],
-            media_type=msg_data[7]
-        )
+        
+        message = Message.from_row(msg_data)
         
         return format_message(message)
         
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         return None
-    finally:
-        if 'conn' in locals():
-            conn.close()
+
+
+def get_change_watermark() -> int:
+    """Get the current change-feed watermark (the highest message rowid)."""
+    with db.connection(MESSAGES_DB_PATH) as conn:
+        return conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM messages").fetchone()[0]
+
+
+def get_new_messages(
+    since: int,
+    chat_jids: Optional[List[str]] = None,
+    limit: int = 500
+) -> Tuple[List[Message], int]:
+    """Get messages stored after a change-feed watermark, oldest first.
+    
+    This is a rowid range scan, so it costs O(new messages) however many chats
+    are watched. Note that the bridge re-stores a message it sees again under
+    a new rowid, so consumers should still de-duplicate by message ID.
+    
+    Args:
+        since: Watermark returned by a previous call (or get_change_watermark())
+        chat_jids: Optional list of chat JIDs to restrict the feed to
+        limit: Maximum number of messages to return (default 500)
+    
+    Returns:
+        The new messages and the watermark to pass to the next call
+    """
+    try:
+        chat_clause = ""
+        params = [since]
+        if chat_jids is not None:
+            if not chat_jids:
+                return [], since
+            chat_clause = f"AND m.chat_jid IN ({', '.join('?' for _ in chat_jids)})"
+            params.extend(chat_jids)
+        
+        with db.connection(MESSAGES_DB_PATH) as conn:
+            cursor = conn.cursor()
+            # Pin the upper bound first so rows skipped by the chat filter are never rescanned
+            upper = cursor.execute("SELECT COALESCE(MAX(rowid), 0) FROM messages").fetchone()[0]
+            cursor.execute(f"""
+                SELECT m.rowid, m.timestamp, m.sender, c.name, m.content, m.is_from_me, c.jid, m.id, m.media_type
+                FROM messages m
+                JOIN chats c ON m.chat_jid = c.jid
+                WHERE m.rowid > ? AND m.rowid <= ? {chat_clause}
+                ORDER BY m.rowid
+                LIMIT ?
+            """, [params[0], upper, *params[1:], limit])
+            rows = cursor.fetchall()
+        
+        result = [Message.from_row(msg, 1) for msg in rows]
+        
+        watermark = rows[-1][0] if len(rows) >= limit else max(upper, since)
+        return result, watermark
+        
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        return [], since
+
+
+def get_new_inbound_messages(
+    chat_jids: List[str],
+    watermarks: Optional[Dict[str, Tuple[str, int]]] = None,
+    max_per_chat: int = INBOUND_MAX_PER_CHAT
+) -> Tuple[List[Message], Dict[str, Tuple[str, int]]]:
+    """Get the incoming messages of each chat that are newer than that chat's watermark.
+    
+    All chats are answered by one query (per INBOUND_BATCH_SIZE chats) that
+    reads one (chat_jid, timestamp) index range per chat, instead of a
+    list_messages call per chat. A chat without a watermark starts at its
+    newest incoming message (or at the beginning, if it has none). At most ``max_per_chat`` messages of a chat are
+    returned per call and its watermark stops at the last of them, so the
+    rest come with the next call.
+    
+    Args:
+        chat_jids: Chats to check
+        watermarks: chat JID -> watermark returned by a previous call
+        max_per_chat: Maximum number of messages per chat (default INBOUND_MAX_PER_CHAT)
+    
+    Returns:
+        The new incoming messages ordered by (timestamp, rowid), and the
+        watermarks to pass to the next call
+    """
+    watermarks = dict(watermarks or {})
+    rows = []
+    try:
+        with db.connection(MESSAGES_DB_PATH) as conn:
+            for i in range(0, len(chat_jids), INBOUND_BATCH_SIZE):
+                chunk = chat_jids[i:i + INBOUND_BATCH_SIZE]
+                known = [chat_jid for chat_jid in chunk if chat_jid in watermarks]
+                new = [chat_jid for chat_jid in chunk if chat_jid not in watermarks]
+                if known:
+                    params = []
+                    for chat_jid in known:
+                        params.extend([chat_jid, *watermarks[chat_jid]])
+                    # The timestamp >= bound keeps the index range tight when nothing
+                    # is new; rowid breaks ties between messages in the same second
+                    rows.extend(conn.execute(f"""
+                        WITH targets(jid, after_timestamp, after_rowid) AS (
+                            VALUES {', '.join('(?, ?, ?)' for _ in known)}
+                        )
+                        SELECT m.rowid, m.timestamp, m.sender, c.name, m.content, m.is_from_me, c.jid, m.id, m.media_type
+                        FROM targets t
+                        JOIN messages m ON m.rowid IN (
+                            SELECT rowid FROM messages
+                            WHERE chat_jid = t.jid
+                            AND is_from_me = 0
+                            AND timestamp >= t.after_timestamp
+                            AND (timestamp > t.after_timestamp OR rowid > t.after_rowid)
+                            ORDER BY timestamp, rowid
+                            LIMIT ?
+                        )
+                        JOIN chats c ON m.chat_jid = c.jid
+                    """, [*params, max_per_chat]).fetchall())
+                if new:
+                    for chat_jid in new:
+                        watermarks[chat_jid] = ("", 0)
+                    rows.extend(conn.execute(f"""
+                        WITH targets(jid) AS (
+                            VALUES {', '.join('(?)' for _ in new)}
+                        )
+                        SELECT m.rowid, m.timestamp, m.sender, c.name, m.content, m.is_from_me, c.jid, m.id, m.media_type
+                        FROM targets t
+                        JOIN messages m ON m.rowid = (
+                            SELECT rowid FROM messages
+                            WHERE chat_jid = t.jid
+                            AND is_from_me = 0
+                            ORDER BY timestamp DESC, rowid DESC
+                            LIMIT 1
+                        )
+                        JOIN chats c ON m.chat_jid = c.jid
+                    """, new).fetchall())
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+    
+    rows.sort(key=lambda row: (row[1], row[0]))
+    for row in rows:
+        watermarks[row[6]] = (row[1], row[0])
+    return [Message.from_row(row, 1) for row in rows], watermarks
+
+
+def _read_through(key: tuple, fetch: Callable[[], T]) -> T:
+    """Serve ``fetch()`` from CHAT_CACHE for as long as the database is unchanged.
+
+    The data version is read before fetching, so a commit that lands while
+    fetching can only cause an extra refetch on the next call, never a stale
+    hit. Only immutable rows are cached; callers build fresh records from them.
+    """
+    version = db.data_version(MESSAGES_DB_PATH)
+    key = (MESSAGES_DB_PATH,) + key
+    entry = CHAT_CACHE.get(key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    value = fetch()
+    CHAT_CACHE.set(key, (version, value))
+    return value
 
 
 def get_chat(chat_jid: str, include_last_message: bool = True) -> Optional[Chat]:
     """Get chat metadata by JID."""
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
-        cursor = conn.cursor()
+        chat_data = _read_through(
+            ("get_chat", chat_jid, include_last_message),
+            lambda: _select_chat(chat_jid, include_last_message)
+        )
+        return Chat.from_row(chat_data) if chat_data else None
         
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        return None
+
+
+def _select_chat(chat_jid: str, include_last_message: bool) -> Optional[tuple]:
+    with db.connection(MESSAGES_DB_PATH) as conn:
+        cursor = conn.cursor()
+    
         query = """
             SELECT 
                 c.jid,
@@ -550,44 +1192,37 @@ def get_chat(chat_jid: str, include_last_message: bool = True) -> Optional[Chat]
                 m.is_from_me as last_is_from_me
             FROM chats c
         """
-        
+    
         if include_last_message:
             query += """
                 LEFT JOIN messages m ON c.jid = m.chat_jid 
                 AND c.last_message_time = m.timestamp
             """
-            
-        query += " WHERE c.jid = ?"
         
+        query += " WHERE c.jid = ?"
+    
         cursor.execute(query, (chat_jid,))
-        chat_data = cursor.fetchone()
-        
-        if not chat_data:
-            return None
-            
-        return Chat(
-            jid=chat_data[0],
-            name=chat_data[1],
-            last_message_time=datetime.fromisoformat(chat_data[2]) if chat_data[2] else None,
-            last_message=chat_data[3],
-            last_sender=chat_data[4],
-            last_is_from_me=chat_data[5]
+        return cursor.fetchone()
+
+
+def get_direct_chat_by_contact(sender_phone_number: str) -> Optional[Chat]:
+    """Get chat metadata by sender phone number."""
+    try:
+        chat_data = _read_through(
+            ("get_direct_chat_by_contact", sender_phone_number),
+            lambda: _select_direct_chat_by_contact(sender_phone_number)
         )
+        return Chat.from_row(chat_data) if chat_data else None
         
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         return None
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 
-def get_direct_chat_by_contact(sender_phone_number: str) -> Optional[Chat]:
-    """Get chat metadata by sender phone number."""
-    try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
+def _select_direct_chat_by_contact(sender_phone_number: str) -> Optional[tuple]:
+    with db.connection(MESSAGES_DB_PATH) as conn:
         cursor = conn.cursor()
-        
+    
         cursor.execute("""
             SELECT 
                 c.jid,
@@ -602,130 +1237,132 @@ def get_direct_chat_by_contact(sender_phone_number: str) -> Optional[Chat]:
             WHERE c.jid LIKE ? AND c.jid NOT LIKE '%@g.us'
             LIMIT 1
         """, (f"%{sender_phone_number}%",))
-        
-        chat_data = cursor.fetchone()
-        
-        if not chat_data:
-            return None
-            
-        return Chat(
-            jid=chat_data[0],
-            name=chat_data[1],
-            last_message_time=datetime.fromisoformat(chat_data[2]) if chat_data[2] else None,
-            last_message=chat_data[3],
-            last_sender=chat_data[4],
-            last_is_from_me=chat_data[5]
-        )
-        
-    except sqlite3.Error as e:
-        print(f"Database error: {e}")
-        return None
-    finally:
-        if 'conn' in locals():
-            conn.close()
+    
+        return cursor.fetchone()
 
-def send_message(recipient: str, message: str) -> Tuple[bool, str]:
+def build_send_payload(
+    recipient: str,
+    message: Optional[str] = None,
+    media_path: Optional[str] = None,
+    as_audio: bool = False
+) -> Union[Dict[str, str], str]:
+    """Validate a send request and build the /api/send body.
+    
+    Returns the payload, or an error message if the request is invalid.
+    With ``as_audio`` the file is converted to Opus .ogg first if needed.
+    """
+    if not recipient:
+        return "Recipient must be provided"
+    
+    if media_path is None:
+        return {"recipient": recipient, "message": message}
+    
+    if not media_path:
+        return "Media path must be provided"
+    
+    if not os.path.isfile(media_path):
+        return f"Media file not found: {media_path}"
+
+    if as_audio and not media_path.endswith(".ogg"):
+        try:
+            media_path = audio.convert_to_opus_ogg_temp(media_path)
+        except Exception as e:
+            return f"Error converting file to opus ogg. You likely need to install ffmpeg: {str(e)}"
+    
+    return {"recipient": recipient, "media_path": media_path}
+
+def parse_send_response(status_code: int, text: str) -> Tuple[bool, str]:
+    """Turn an /api/send response into (success, status message)."""
+    if status_code != 200:
+        return False, f"Error: HTTP {status_code} - {text}"
     try:
-        # Validate input
-        if not recipient:
-            return False, "Recipient must be provided"
-        
-        url = f"{WHATSAPP_API_BASE_URL}/send"
-        payload = {
-            "recipient": recipient,
-            "message": message,
-        }
-        
-        response = requests.post(url, json=payload)
-        
-        # Check if the request was successful
-        if response.status_code == 200:
-            result = response.json()
-            return result.get("success", False), result.get("message", "Unknown response")
-        else:
-            return False, f"Error: HTTP {response.status_code} - {response.text}"
-            
-    except requests.RequestException as e:
-        return False, f"Request error: {str(e)}"
+        result = json.loads(text)
     except json.JSONDecodeError:
-        return False, f"Error parsing response: {response.text}"
-    except Exception as e:
-        return False, f"Unexpected error: {str(e)}"
+        return False, f"Error parsing response: {text}"
+    return result.get("success", False), result.get("message", "Unknown response")
 
-def send_file(recipient: str, media_path: str) -> Tuple[bool, str]:
+def parse_download_response(status_code: int, text: str) -> Optional[str]:
+    """Turn an /api/download response into the local file path (None on failure)."""
+    if status_code != 200:
+        print(f"Error: HTTP {status_code} - {text}")
+        return None
     try:
-        # Validate input
-        if not recipient:
-            return False, "Recipient must be provided"
-        
-        if not media_path:
-            return False, "Media path must be provided"
-        
-        if not os.path.isfile(media_path):
-            return False, f"Media file not found: {media_path}"
-        
-        url = f"{WHATSAPP_API_BASE_URL}/send"
-        payload = {
-            "recipient": recipient,
-            "media_path": media_path
-        }
-        
-        response = requests.post(url, json=payload)
-        
-        # Check if the request was successful
-        if response.status_code == 200:
-            result = response.json()
-            return result.get("success", False), result.get("message", "Unknown response")
-        else:
-            return False, f"Error: HTTP {response.status_code} - {response.text}"
-            
-    except requests.RequestException as e:
-        return False, f"Request error: {str(e)}"
+        result = json.loads(text)
     except json.JSONDecodeError:
-        return False, f"Error parsing response: {response.text}"
-    except Exception as e:
-        return False, f"Unexpected error: {str(e)}"
+        print(f"Error parsing response: {text}")
+        return None
+    if not result.get("success", False):
+        print(f"Download failed: {result.get('message', 'Unknown error')}")
+        return None
+    path = result.get("path")
+    print(f"Media downloaded successfully: {path}")
+    return path
 
-def send_audio_message(recipient: str, media_path: str) -> Tuple[bool, str]:
+def _post_send(payload: Union[Dict[str, str], str]) -> Tuple[bool, str]:
+    if isinstance(payload, str):
+        return False, payload
     try:
-        # Validate input
-        if not recipient:
-            return False, "Recipient must be provided"
-        
-        if not media_path:
-            return False, "Media path must be provided"
-        
-        if not os.path.isfile(media_path):
-            return False, f"Media file not found: {media_path}"
-
-        if not media_path.endswith(".ogg"):
-            try:
-                media_path = audio.convert_to_opus_ogg_temp(media_path)
-            except Exception as e:
-                return False, f"Error converting file to opus ogg. You likely need to install ffmpeg: {str(e)}"
-        
-        url = f"{WHATSAPP_API_BASE_URL}/send"
-        payload = {
-            "recipient": recipient,
-            "media_path": media_path
-        }
-        
-        response = requests.post(url, json=payload)
-        
-        # Check if the request was successful
-        if response.status_code == 200:
-            result = response.json()
-            return result.get("success", False), result.get("message", "Unknown response")
-        else:
-            return False, f"Error: HTTP {response.status_code} - {response.text}"
-            
+        # Never retried once it may have reached the bridge, so a message isn't sent twice
+        response = bridge.client().post(f"{WHATSAPP_API_BASE_URL}/send", payload, timeout=bridge.SEND_TIMEOUT)
+        return parse_send_response(response.status_code, response.text)
     except requests.RequestException as e:
         return False, f"Request error: {str(e)}"
-    except json.JSONDecodeError:
-        return False, f"Error parsing response: {response.text}"
     except Exception as e:
         return False, f"Unexpected error: {str(e)}"
 
+def send_message(recipient: str, message: str) -> Tuple[bool, str]:
+    return _post_send(build_send_payload(recipient, message=message))
+
+def send_file(recipient: str, media_path: str) -> Tuple[bool, str]:
+    return _post_send(build_send_payload(recipient, media_path=media_path or ""))
+
+def send_audio_message(recipient: str, media_path: str) -> Tuple[bool, str]:
+    return _post_send(build_send_payload(recipient, media_path=media_path or "", as_audio=True))
+
+@dataclass
+class SendResult:
+    recipient: str
+    success: bool
+    message: str
+
+def prepare_send_batch(recipients: Sequence[str], max_concurrency: int) -> Tuple[List[str], int]:
+    """Validate a batch send; returns the distinct recipients in order and the number of workers to use."""
+    recipients = list(dict.fromkeys(recipients))
+    if len(recipients) > SEND_BATCH_MAX_RECIPIENTS:
+        raise ValueError(f"At most {SEND_BATCH_MAX_RECIPIENTS} recipients per batch, got {len(recipients)}")
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1")
+    return recipients, min(max_concurrency, bridge.POOL_MAXSIZE, len(recipients))
+
+def send_messages_batch(
+    recipients: Sequence[str],
+    message: str,
+    max_concurrency: int = SEND_BATCH_CONCURRENCY,
+    rate_limit: Optional[float] = SEND_BATCH_RATE
+) -> List[SendResult]:
+    """Send the same message to many recipients.
+    
+    Sends run on up to ``max_concurrency`` threads (capped at the bridge
+    client's pool size) and start at no more than ``rate_limit`` per second
+    (``None`` or 0 for no limit). Duplicate recipients are sent to once.
+    
+    Returns one result per distinct recipient, in the order given.
+    """
+    recipients, workers = prepare_send_batch(recipients, max_concurrency)
+    if not recipients:
+        return []
+    limiter = bridge.RateLimiter(rate_limit, burst=workers) if rate_limit else None
+
+    def send(recipient: str) -> SendResult:
+        if limiter is not None:
+            limiter.acquire()
+        return SendResult(recipient, *send_message(recipient, message))
+
+    if workers == 1:
+        return [send(recipient) for recipient in recipients]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="whatsapp-send") as pool:
+        return list(pool.map(send, recipients))
+
 def download_media(message_id: str, chat_jid: str) -> Optional[str]:
     """Download media from a message and return the local file path.
     
@@ -743,27 +1380,12 @@ def download_media(message_id: str, chat_jid: str) -> Optional[str]:
             "chat_jid": chat_jid
         }
         
-        response = requests.post(url, json=payload)
-        
-        if response.status_code == 200:
-            result = response.json()
-            if result.get("success", False):
-                path = result.get("path")
-                print(f"Media downloaded successfully: {path}")
-                return path
-            else:
-                print(f"Download failed: {result.get('message', 'Unknown error')}")
-                return None
-        else:
-            print(f"Error: HTTP {response.status_code} - {response.text}")
-            return None
+        response = bridge.client().post(url, payload, timeout=bridge.DOWNLOAD_TIMEOUT, idempotent=True)
+        return parse_download_response(response.status_code, response.text)
             
     except requests.RequestException as e:
         print(f"Request error: {str(e)}")
         return None
-    except json.JSONDecodeError:
-        print(f"Error parsing response: {response.text}")
-        return None
     except Exception as e:
         print(f"Unexpected error: {str(e)}")
         return None
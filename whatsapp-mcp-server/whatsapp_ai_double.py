@@ -1,6 +1,6 @@
 import time
 import os
-import json
+from functools import partial
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 from openai import OpenAI
@@ -9,67 +9,57 @@ from whatsapp import (
     list_messages,
     send_message,
     Message,
-    get_contact_chats,
     get_message_context
 )
+from events import MessageListener
+from feed import ChangeFeed
+from seen_store import SeenStore
+from state_store import StateStore
+from scheduler import BackgroundRefresher, Debouncer, ReplyScheduler
+from prompt_builder import build_prompt, trim_history, usage_report
 
 # === CONFIG ===
 GROUP_NAMES = ["SRH Forever 🔥", "None"]
 CONTACT_NUMBERS = ["161XXXXX", "18322XXXXX", "91800844XXX"]
-SEEN_FILE = "seen.json"
-MEMORY_FILE = "memory.json"
-TONE_FILE = "tone_map.json"
+SEEN_DB = "seen.db"
+FEED_STATE = "feed.json"  # how far the poll fallback has read, kept across restarts
+SEEN_TTL = 7 * 24 * 3600  # seconds a handled message id is remembered
+STATE_DIR = "state"  # one file per chat under state/memory and state/tone
+STATE_CACHE_SIZE = int(os.getenv("BOT_STATE_CACHE_SIZE", "256"))  # chats kept in memory
+MEMORY_FILE = "memory.json"  # imported into STATE_DIR once
+TONE_FILE = "tone_map.json"  # imported into STATE_DIR once
 RESPONSE_DELAY = 3
+REPLY_WORKERS = int(os.getenv("BOT_REPLY_WORKERS", "4"))  # chats answered in parallel
+DEBOUNCE_WINDOW = float(os.getenv("BOT_DEBOUNCE_SECONDS", "2.5"))  # quiet time that ends a burst of messages
 TONE_REFRESH_COUNT = 100
+PROMPT_BUDGET = int(os.getenv("BOT_PROMPT_BUDGET", "2000"))  # prompt tokens per reply
+TONE_WORKERS = 2  # tone profiles generated at once, in the background
+DEFAULT_TONE = "You are Abhinav. Respond casually with wit and sarcasm in Tenglish."
+MAX_MESSAGE_AGE = 30  # seconds between a message being sent and reaching us
+USE_PUSH_EVENTS = os.getenv("WHATSAPP_PUSH_EVENTS", "1") != "0"
 
 # === Load ENV ===
 load_dotenv()
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-# === Seen Tracking ===
-def load_seen_ids():
-    if os.path.exists(SEEN_FILE):
-        with open(SEEN_FILE, "r") as f:
-            return set(json.load(f).get("seen", []))
-    return set()
+# === Memory and Tone Handling ===
+# Both are loaded a chat at a time when needed and saved in the background (see state_store.py)
+conversation_memory = StateStore(os.path.join(STATE_DIR, "memory"), STATE_CACHE_SIZE, legacy_path=MEMORY_FILE)
+tone_map = StateStore(os.path.join(STATE_DIR, "tone"), STATE_CACHE_SIZE, legacy_path=TONE_FILE)
 
-def save_seen_ids(seen_ids):
-    with open(SEEN_FILE, "w") as f:
-        json.dump({"seen": list(seen_ids)}, f)
-
-# === Memory Handling ===
-def load_memory():
-    if os.path.exists(MEMORY_FILE):
-        with open(MEMORY_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_memory(memory):
-    with open(MEMORY_FILE, "w") as f:
-        json.dump(memory, f, indent=2)
-
-conversation_memory = load_memory()
-
-# === Tone Handling ===
-def load_tone_map():
-    if os.path.exists(TONE_FILE):
-        with open(TONE_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_tone_map(tone_map):
-    with open(TONE_FILE, "w") as f:
-        json.dump(tone_map, f, indent=2)
-
-tone_map = load_tone_map()
+# === Recent History ===
+def recent_chat_messages(jid, limit):
+    # Newest first, read straight off the (chat_jid, timestamp) index
+    messages = list_messages(chat_jid=jid, limit=limit, include_context=False)
+    return [m for m in messages if isinstance(m, Message)]
 
 # === Generate Tone ===
 def generate_tone_prompt(jid):
-    chats = get_contact_chats(jid, limit=100)
-    messages = [chat.last_message for chat in chats if chat.last_is_from_me and chat.last_message]
+    recent = recent_chat_messages(jid, limit=100)
+    messages = [m.content for m in recent if m.is_from_me and m.content]
 
     if not messages:
-        return "You are Abhinav. Respond casually with wit and sarcasm in Tenglish."
+        return DEFAULT_TONE
 
     prompt = (
         "Based on the following WhatsApp messages by Abhinav, "
@@ -89,15 +79,24 @@ def generate_tone_prompt(jid):
         return response.choices[0].message.content.strip()
     except Exception as e:
         print(f"⚠️ Tone analysis failed: {e}")
-        return "You are Abhinav. Respond casually with wit and sarcasm in Tenglish."
+        return DEFAULT_TONE
+
+def needs_tone_refresh(tone_data):
+    return not tone_data or tone_data.get("count", 0) >= TONE_REFRESH_COUNT
+
+def store_tone(jid, prompt, tone_refresher=None):
+    # Runs as a job on the chat's queue, so it can't interleave with a reply updating the count
+    tone_map.set(jid, {"prompt": prompt, "count": 0})
+    if tone_refresher is not None:
+        # Only now can replies see the profile; until here their requests were no-ops
+        tone_refresher.release(jid)
 
 # === Bootstrap memory ===
 def initialize_memory_from_history(jid):
     history = []
-    chat_history = get_contact_chats(jid, limit=10)
-    for chat in reversed(chat_history):
-        role = "assistant" if chat.last_is_from_me else "user"
-        content = chat.last_message or ""
+    for message in reversed(recent_chat_messages(jid, limit=10)):
+        role = "assistant" if message.is_from_me else "user"
+        content = message.content or ""
         if content.strip():
             history.append({"role": role, "content": content.strip()})
     return history[-10:]
@@ -118,21 +117,25 @@ def get_target_chat_jids(group_names=None, contact_numbers=None):
     return target_jids if target_jids else [chat.jid for chat in chats]
 
 # === Response Generator ===
-def generate_openai_reply(prompt, jid, msg_id=None):
-    if jid not in conversation_memory:
-        conversation_memory[jid] = initialize_memory_from_history(jid)
-
-    history = conversation_memory.get(jid, [])
+def generate_openai_reply(prompt, jid, msg_id=None, tone_refresher=None):
+    history = conversation_memory.get(jid)
+    if history is None:
+        history = initialize_memory_from_history(jid)
+        conversation_memory.set(jid, history)
 
-    # Tone cache refresh
+    # Tone cache refresh. With a refresher the profile is (re)generated in the
+    # background and this reply uses what is cached, or DEFAULT_TONE.
     tone_data = tone_map.get(jid, {})
-    if not tone_data or tone_data.get("count", 0) >= TONE_REFRESH_COUNT:
-        new_prompt = generate_tone_prompt(jid)
-        tone_map[jid] = {"prompt": new_prompt, "count": 0}
-        save_tone_map(tone_map)
+    if needs_tone_refresh(tone_data):
+        if tone_refresher is not None:
+            tone_refresher.request(jid)
+        else:
+            tone_data = {"prompt": generate_tone_prompt(jid), "count": 0}
 
-    tone_map[jid]["count"] += 1
-    save_tone_map(tone_map)
+    if tone_data:
+        tone_data["count"] += 1
+        tone_map.set(jid, tone_data)
+    tone_prompt = tone_data.get("prompt", DEFAULT_TONE)
 
     # Short-term context from recent messages
     context = []
@@ -143,25 +146,84 @@ def generate_openai_reply(prompt, jid, msg_id=None):
                 role = "assistant" if m.is_from_me else "user"
                 context.append({"role": role, "content": m.content.strip()})
 
-    messages = [{"role": "system", "content": tone_map[jid]["prompt"]}] + context[-3:] + history[-10:] + [{"role": "user", "content": prompt}]
+    # Stable order (tone, history, recent messages, new message) so consecutive
+    # requests share a cacheable prefix; see prompt_builder.py
+    model = os.getenv("OPENAI_MODEL_REPLY", "gpt-4o")
+    built = build_prompt(tone_prompt, history, context[-3:], prompt, budget=PROMPT_BUDGET, model=model)
 
     try:
         response = client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL_REPLY", "gpt-4o"),
-            messages=messages,
+            model=model,
+            messages=built.messages,
             temperature=0.7,
             max_tokens=250
         )
         reply = response.choices[0].message.content.strip()
+        print(f"🧮 {built.report()}; used {usage_report(getattr(response, 'usage', None)) or 'n/a'}")
         history.append({"role": "user", "content": prompt})
         history.append({"role": "assistant", "content": reply})
-        conversation_memory[jid] = history[-25:]
-        save_memory(conversation_memory)
+        conversation_memory.set(jid, trim_history(history))
         return reply
     except Exception as e:
         print(f"⚠️ OpenAI error: {e}")
         return None
 
+# === Message Handling ===
+def handle_message(msg, jid, seen, debouncer, received_at=None):
+    """Queue a reply to one incoming message unless it was already seen or is stale.
+
+    Staleness is judged by when the message reached the bot (``received_at``),
+    not when we get around to it, so a slow reply doesn't drop the next one.
+    Messages sent in a row are answered together once the chat has been quiet
+    for DEBOUNCE_WINDOW seconds. Replies are generated on the scheduler's
+    workers, in order with the chat's other replies but in parallel with
+    other chats.
+    """
+    msg_id = getattr(msg, "id", None)
+    msg_text = getattr(msg, "content", "")
+    sender = getattr(msg, "sender", "Unknown")
+    received_at = received_at or datetime.now(timezone.utc)
+    msg_time = getattr(msg, "timestamp", received_at)
+    if msg_time.tzinfo is None:
+        msg_time = msg_time.replace(tzinfo=timezone.utc)
+    if seen.is_seen(msg_id, jid, msg_time) or (received_at - msg_time).total_seconds() > MAX_MESSAGE_AGE:
+        seen.add(msg_id, jid, msg_time)
+        return
+    # Marked now so a poll or event arriving while the reply is in flight doesn't queue it twice
+    seen.add(msg_id, jid, msg_time)
+    print(f"📨 {sender}: {msg_text}")
+    debouncer.add(jid, (msg, time.monotonic()))
+
+def reply_to_burst(scheduler, tone_refresher, jid, burst):
+    """Reply once to a burst of (message, picked up at) pairs, as if it were one message."""
+    msg_text = "\n".join(msg.content for msg, _ in burst if msg.content)
+    # Context is what came before the burst
+    reply = generate_openai_reply(msg_text, jid, burst[0][0].id, tone_refresher)
+    if not reply or len(reply.strip()) < 3:
+        return
+    # Keep the human-looking pause after the last message without holding a
+    # worker; the debounce window and the completion count towards it
+    delay = max(0.0, burst[-1][1] + RESPONSE_DELAY - time.monotonic())
+    scheduler.submit_after(delay, jid, send_reply, jid, reply)
+
+def send_reply(jid, reply):
+    success, status_msg = send_message(jid, reply)
+    if success:
+        print(f"🤖 Sent reply: {reply}")
+
+def poll_target_chats(feed, seen, debouncer):
+    # Every message stored in the target chats since the last poll, in the
+    # order the bridge stored them, so bursts reach the debouncer whole
+    received_at = datetime.now(timezone.utc)
+    while True:
+        messages = feed.poll()
+        for msg in messages:
+            if not msg.is_from_me:
+                handle_message(msg, msg.chat_jid, seen, debouncer, received_at)
+        feed.commit()
+        if len(messages) < feed.batch_size:
+            return
+
 # === Main Bot Loop ===
 def main():
     target_jids = get_target_chat_jids(GROUP_NAMES, CONTACT_NUMBERS)
@@ -171,43 +233,58 @@ def main():
     print("✅ Auto-replying to:")
     for jid in target_jids:
         print(f"  ➤ {jid}")
-    seen_ids = load_seen_ids()
-    while True:
-        try:
-            for jid in target_jids:
-                messages = list_messages(chat_jid=jid, limit=5, include_context=False)
-                if not messages or not isinstance(messages[0], Message):
-                    continue
-                messages = [m for m in messages if not m.is_from_me]
-                if not messages:
-                    continue
-                msg = messages[0]
-                msg_id = getattr(msg, "id", None)
-                msg_text = getattr(msg, "content", "")
-                sender = getattr(msg, "sender", "Unknown")
-                msg_time = getattr(msg, "timestamp", datetime.now(timezone.utc))
-                if msg_time.tzinfo is None:
-                    msg_time = msg_time.replace(tzinfo=timezone.utc)
-                if msg_id in seen_ids or (datetime.now(timezone.utc) - msg_time).total_seconds() > 30:
-                    seen_ids.add(msg_id)
-                    save_seen_ids(seen_ids)
-                    continue
-                print(f"📨 {sender}: {msg_text}")
-                time.sleep(RESPONSE_DELAY)
-                reply = generate_openai_reply(msg_text, jid, msg_id)
-                if not reply or len(reply.strip()) < 3:
-                    seen_ids.add(msg_id)
-                    save_seen_ids(seen_ids)
+    seen = SeenStore(SEEN_DB, ttl=SEEN_TTL)
+    feed = ChangeFeed(FEED_STATE, chat_jids=target_jids)
+    scheduler = ReplyScheduler(REPLY_WORKERS)
+    tone_refresher = BackgroundRefresher(
+        generate_tone_prompt,
+        lambda jid, prompt: scheduler.submit(jid, store_tone, jid, prompt, tone_refresher),
+        TONE_WORKERS,
+        release_on_result=False
+    )
+    debouncer = Debouncer(scheduler, partial(reply_to_burst, scheduler, tone_refresher), DEBOUNCE_WINDOW)
+    listener = None
+    try:
+        # Prewarm, so replies rarely have to fall back to DEFAULT_TONE
+        for jid in target_jids:
+            if needs_tone_refresh(tone_map.get(jid)):
+                tone_refresher.request(jid)
+
+        # Replies are driven by messages pushed from the bridge; the database is
+        # polled instead whenever the event stream is down.
+        if USE_PUSH_EVENTS:
+            listener = MessageListener(chat_jids=target_jids)
+            listener.start()
+        synced_generation = 0
+
+        while True:
+            try:
+                if listener is not None and listener.connected.is_set():
+                    if listener.generation != synced_generation:
+                        # Pick up anything stored before the stream (re)connected
+                        synced_generation = listener.generation
+                        poll_target_chats(feed, seen, debouncer)
+                    event = listener.get(timeout=1)
+                    if event is not None:
+                        handle_message(event.message, event.message.chat_jid, seen, debouncer, event.received_at)
                     continue
-                success, status_msg = send_message(jid, reply)
-                if success:
-                    print(f"🤖 Sent reply: {reply}")
-                seen_ids.add(msg_id)
-                save_seen_ids(seen_ids)
-            time.sleep(1)
-        except Exception as e:
-            print(f"⚠️ Error: {e}")
-            time.sleep(3)
+                poll_target_chats(feed, seen, debouncer)
+                time.sleep(1)
+            except Exception as e:
+                print(f"⚠️ Error: {e}")
+                time.sleep(3)
+    except KeyboardInterrupt:
+        print("👋 Stopping")
+    finally:
+        # Stop taking in messages, drop replies not started yet but let the ones
+        # being generated finish, then save state while every thread is still alive
+        if listener is not None:
+            listener.stop()
+        scheduler.close(wait=False)
+        tone_refresher.close(wait=False)
+        conversation_memory.close()
+        tone_map.close()
+        seen.close()
 
 if __name__ == "__main__":
-    main()
+    main()
\ No newline at end of file
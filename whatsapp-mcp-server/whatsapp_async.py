@@ -0,0 +1,161 @@
+"""Asyncio versions of the whatsapp.py API.
+
+Database reads run the synchronous functions on a dedicated thread pool sized
+to the connection pool, so the event loop never blocks on SQLite and up to
+``db.POOL_SIZE`` queries run side by side. Calls to the bridge go through
+``bridge.async_client()``, which keeps its connections open and applies the
+same timeouts, retry rules and latency stats as the synchronous client.
+
+Validation and response handling are shared with whatsapp.py, so both APIs
+return the same results.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar, Union
+
+import httpx
+
+import bridge
+import db
+import whatsapp
+from whatsapp import Chat, Message
+
+T = TypeVar("T")
+
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=db.POOL_SIZE, thread_name_prefix="whatsapp-db")
+
+
+async def run_in_db_executor(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking database function on the DB thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(DB_EXECUTOR, functools.partial(func, *args, **kwargs))
+
+
+def _in_db_executor(func: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+        return await run_in_db_executor(func, *args, **kwargs)
+    return wrapper
+
+
+# === Database reads ===
+get_sender_name = _in_db_executor(whatsapp.get_sender_name)
+get_sender_names = _in_db_executor(whatsapp.get_sender_names)
+list_messages = _in_db_executor(whatsapp.list_messages)
+get_message_context = _in_db_executor(whatsapp.get_message_context)
+get_message_contexts = _in_db_executor(whatsapp.get_message_contexts)
+list_chats = _in_db_executor(whatsapp.list_chats)
+search_contacts = _in_db_executor(whatsapp.search_contacts)
+search_messages = _in_db_executor(whatsapp.search_messages)
+get_contact_chats = _in_db_executor(whatsapp.get_contact_chats)
+get_last_interaction = _in_db_executor(whatsapp.get_last_interaction)
+get_change_watermark = _in_db_executor(whatsapp.get_change_watermark)
+get_new_messages = _in_db_executor(whatsapp.get_new_messages)
+get_new_inbound_messages = _in_db_executor(whatsapp.get_new_inbound_messages)
+get_chat = _in_db_executor(whatsapp.get_chat)
+get_direct_chat_by_contact = _in_db_executor(whatsapp.get_direct_chat_by_contact)
+
+
+async def iter_messages(
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    sender_phone_number: Optional[str] = None,
+    chat_jid: Optional[str] = None,
+    query: Optional[str] = None,
+    oldest_first: bool = False,
+    chunk_size: int = whatsapp.ITER_CHUNK_SIZE
+) -> AsyncIterator[Message]:
+    """Async counterpart of whatsapp.iter_messages; each chunk is fetched on the DB pool."""
+    cursor = ""
+    while cursor is not None:
+        rows, cursor = await run_in_db_executor(
+            whatsapp._select_messages,
+            after, before, sender_phone_number, chat_jid, query, chunk_size, 0, cursor, oldest_first
+        )
+        for row in rows:
+            yield Message.from_row(row)
+
+
+async def iter_chats(
+    query: Optional[str] = None,
+    include_last_message: bool = True,
+    sort_by: str = "last_active",
+    chunk_size: int = whatsapp.ITER_CHUNK_SIZE
+) -> AsyncIterator[Chat]:
+    """Async counterpart of whatsapp.iter_chats."""
+    cursor = ""
+    while cursor is not None:
+        rows, cursor = await run_in_db_executor(
+            whatsapp._select_chats, query, chunk_size, 0, include_last_message, sort_by, cursor
+        )
+        for row in rows:
+            yield Chat.from_row(row)
+
+
+# === Bridge API ===
+async def _post_send(payload: Union[Dict[str, str], str]) -> Tuple[bool, str]:
+    if isinstance(payload, str):
+        return False, payload
+    try:
+        # Never retried once it may have reached the bridge, so a message isn't sent twice
+        response = await bridge.async_client().post(
+            f"{whatsapp.WHATSAPP_API_BASE_URL}/send", payload, timeout=bridge.SEND_TIMEOUT
+        )
+        return whatsapp.parse_send_response(response.status_code, response.text)
+    except httpx.HTTPError as e:
+        return False, f"Request error: {str(e)}"
+    except Exception as e:
+        return False, f"Unexpected error: {str(e)}"
+
+
+async def send_message(recipient: str, message: str) -> Tuple[bool, str]:
+    return await _post_send(whatsapp.build_send_payload(recipient, message=message))
+
+
+async def send_file(recipient: str, media_path: str) -> Tuple[bool, str]:
+    return await _post_send(whatsapp.build_send_payload(recipient, media_path=media_path or ""))
+
+
+async def send_audio_message(recipient: str, media_path: str) -> Tuple[bool, str]:
+    # Converting to Opus shells out to ffmpeg, so keep it off the event loop
+    payload = await asyncio.to_thread(whatsapp.build_send_payload, recipient, media_path=media_path or "", as_audio=True)
+    return await _post_send(payload)
+
+
+async def send_messages_batch(
+    recipients: Sequence[str],
+    message: str,
+    max_concurrency: int = whatsapp.SEND_BATCH_CONCURRENCY,
+    rate_limit: Optional[float] = whatsapp.SEND_BATCH_RATE
+) -> List[whatsapp.SendResult]:
+    """Async counterpart of whatsapp.send_messages_batch, with the same limits."""
+    recipients, workers = whatsapp.prepare_send_batch(recipients, max_concurrency)
+    slots = asyncio.Semaphore(max(workers, 1))
+    limiter = bridge.AsyncRateLimiter(rate_limit, burst=workers) if rate_limit else None
+
+    async def send(recipient: str) -> whatsapp.SendResult:
+        async with slots:
+            if limiter is not None:
+                await limiter.acquire()
+            return whatsapp.SendResult(recipient, *await send_message(recipient, message))
+
+    return list(await asyncio.gather(*(send(recipient) for recipient in recipients)))
+
+
+async def download_media(message_id: str, chat_jid: str) -> Optional[str]:
+    """Download media from a message and return the local file path (None on failure)."""
+    try:
+        response = await bridge.async_client().post(
+            f"{whatsapp.WHATSAPP_API_BASE_URL}/download",
+            {"message_id": message_id, "chat_jid": chat_jid},
+            timeout=bridge.DOWNLOAD_TIMEOUT,
+            idempotent=True
+        )
+        return whatsapp.parse_download_response(response.status_code, response.text)
+    except httpx.HTTPError as e:
+        print(f"Request error: {str(e)}")
+        return None
+    except Exception as e:
+        print(f"Unexpected error: {str(e)}")
+        return None